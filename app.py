@@ -2,13 +2,25 @@
 from __future__ import annotations
 
 import os
-import traceback
+import atexit
+import logging
+import threading
 import time
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context, url_for
+from werkzeug.http import http_date, parse_date
 
 # ────────────────────────────────────────────────────────────────
 # IMPORTS FLEXIBLES (funciona con o sin carpetas "services"/"bot")
 # ────────────────────────────────────────────────────────────────
+try:
+    from services.logs import configure_logging
+except ImportError:
+    from logs import configure_logging
+
+# Antes que el resto: los módulos ya registran mensajes al importarse
+configure_logging()
+log = logging.getLogger("app")
+
 try:
     from services.waha import Waha
 except ImportError:
@@ -24,17 +36,110 @@ try:
 except ImportError:
     from database import Database
 
+try:
+    from services.response_cache import ResponseCache
+except ImportError:
+    from response_cache import ResponseCache
+
+try:
+    from services.export import iter_postulantes, prefetch, ndjson_chunks, csv_chunks, gzip_chunks
+except ImportError:
+    from export import iter_postulantes, prefetch, ndjson_chunks, csv_chunks, gzip_chunks
+
+try:
+    from services.metrics import REGISTRY, WEBHOOK_SECONDS, ACTIVE_SESSIONS, QUEUE_DEPTH
+except ImportError:
+    from metrics import REGISTRY, WEBHOOK_SECONDS, ACTIVE_SESSIONS, QUEUE_DEPTH
+
+try:
+    from services.tracing import EXPORTER, trace, span, annotate, chat_ref
+except ImportError:
+    from tracing import EXPORTER, trace, span, annotate, chat_ref
+
+try:
+    from services.profiler import PROFILER, tag as profile_tag
+except ImportError:
+    from profiler import PROFILER, tag as profile_tag
+
+
+# Pausa tras "escribiendo..." antes de procesar (estabilidad en WAHA; 0 en pruebas de carga)
+TYPING_DELAY_S = float(os.getenv("TYPING_DELAY_S", "2"))
 
 # ────────────────────────────────────────────────────────────────
 # INICIALIZACIÓN DE SERVICIOS
 # ────────────────────────────────────────────────────────────────
 app = Flask(__name__)
 
-print("🚀 Inicializando servicios...", flush=True)
-DB = Database()            # 1) Base de datos (Supabase o JSON local)
-BOT = AIBot(db=DB)         # 2) Bot con IA (Gemini opcional) + DB inyectada
-WAHA = Waha()              # 3) Cliente WAHA
-print("✅ Servicios iniciados correctamente", flush=True)
+log.info("🚀 Inicializando servicios...")
+# Los constructores no tocan la red: el arranque acepta webhooks en milisegundos
+DB = Database()            # 1) Base de datos (Supabase o local; conecta en segundo plano)
+BOT = AIBot(db=DB)         # 2) Bot con IA (Gemini opcional, SDK perezoso) + DB inyectada
+WAHA = Waha()              # 3) Cliente WAHA (verificación de conexión en segundo plano)
+log.info("✅ Servicios iniciados correctamente")
+
+# Calentamiento en paralelo (readiness): conexión Supabase, SDK/modelo Gemini, WAHA
+WARMUP: dict = {}
+_WARMUP_WAIT_S = 30.0
+
+
+def _warm(name, fn):
+    t0 = time.perf_counter()
+    try:
+        ok = bool(fn())
+    except Exception as e:
+        log.warning("⚠️ Calentamiento %s falló: %s", name, e)
+        ok = False
+    WARMUP[name] = {"done": True, "ok": ok, "seconds": round(time.perf_counter() - t0, 3)}
+
+
+for _name, _fn in (
+    ("database", lambda: DB.wait_ready(_WARMUP_WAIT_S) and DB.use_supabase or DB.supabase_state == "disabled"),
+    ("gemini", lambda: BOT.gemini.warm_up() if BOT.gemini and hasattr(BOT.gemini, "warm_up") else False),
+    ("waha", lambda: WAHA.probed.wait(_WARMUP_WAIT_S) and WAHA.status == "ok"),
+):
+    WARMUP[_name] = {"done": False, "ok": False, "seconds": None}
+    threading.Thread(target=_warm, args=(_name, _fn), name=f"warmup-{_name}", daemon=True).start()
+
+atexit.register(DB.close)  # detiene la sonda de Supabase y la outbox
+if BOT.writer is not None:
+    atexit.register(BOT.writer.close)  # vacía el buffer de escritura al apagar (corre antes que DB.close)
+
+# Caché de respuestas de lectura, invalidada por la versión de escritura de la BD
+# Gauges: se leen al hacer scrape de /metrics (cero costo por mensaje)
+ACTIVE_SESSIONS.set_function(lambda: len(BOT.sessions))
+QUEUE_DEPTH.set_function(lambda: {
+    ("write_behind",): len(BOT.writer) if BOT.writer is not None else None,
+    ("outbox",): len(DB.outbox) if DB.outbox is not None else None,
+    ("rehydrate_lookups",): len(BOT._lookups),
+})
+
+CACHE = ResponseCache(lambda: DB.version)
+
+
+class NotFound(Exception):
+    """`compute` no encontró el recurso: 404 (y nada que cachear)."""
+
+
+def _cached_json(compute):
+    """
+    Responde desde la caché con ETag / Last-Modified; 304 si el cliente ya tiene esta versión.
+    `compute` debe lanzar ante un error de la BD (no se cachea) y NotFound si no hay datos (404).
+    """
+    entry = CACHE.get(request.full_path, compute)
+    headers = {
+        "ETag": entry["etag"],
+        "Last-Modified": http_date(entry["last_modified"]),
+        "Cache-Control": "no-cache",  # el cliente siempre revalida (barato: 304)
+    }
+    inm = request.headers.get("If-None-Match")
+    if inm:
+        if entry["etag"] in [t.strip() for t in inm.split(",")] or inm.strip() == "*":
+            return Response(status=304, headers=headers)
+    else:
+        ims = parse_date(request.headers.get("If-Modified-Since"))
+        if ims is not None and int(entry["last_modified"]) <= ims.timestamp():
+            return Response(status=304, headers=headers)
+    return Response(entry["body"], status=200, mimetype="application/json", headers=headers)
 
 
 # ────────────────────────────────────────────────────────────────
@@ -50,6 +155,7 @@ def root():
 
 @app.route("/health", methods=["GET"])
 def health():
+    # Liveness: el proceso responde (no depende de servicios externos)
     return jsonify({
         "status": "ok",
         "service": "WhatsApp Bot API",
@@ -57,6 +163,87 @@ def health():
     }), 200
 
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    # Readiness: 503 mientras el calentamiento no termina; luego 200 con el estado de cada servicio
+    done = all(w["done"] for w in WARMUP.values())
+    return jsonify({
+        "ready": done,
+        "services": WARMUP,
+        "database": DB.health(),
+    }), 200 if done else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Formato de texto de Prometheus
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/traces", methods=["GET"])
+def traces():
+    # Trazas recientes (una por mensaje) con el desglose de ms por span; ?chat_id= filtra por teléfono
+    limit = request.args.get("limit", 20, type=int)
+    min_ms = request.args.get("min_ms", 0.0, type=float)
+    chat_id = request.args.get("chat_id")
+    return jsonify({"traces": EXPORTER.recent(limit=limit, min_ms=min_ms, chat=chat_ref(chat_id) if chat_id else None)}), 200
+
+
+@app.route("/traces/<trace_id>", methods=["GET"])
+def trace_detail(trace_id: str):
+    found = EXPORTER.get(trace_id)
+    if found is None:
+        return jsonify({"error": "traza no encontrada (fuera del buffer)"}), 404
+    return jsonify({**found, "breakdown": EXPORTER.breakdown(trace_id)}), 200
+
+
+@app.route("/profiles", methods=["GET"])
+def profiles():
+    # Turnos perfilados más lentos (PROFILE_ENABLED=1), con enlace a sus pilas colapsadas
+    limit = request.args.get("limit", 20, type=int)
+    items = [
+        {**p, "url": url_for("profile_detail", profile_id=p["id"]),
+         "trace_url": url_for("trace_detail", trace_id=p["trace_id"]) if p.get("trace_id") else None}
+        for p in PROFILER.slowest(limit)
+    ]
+    return jsonify({"enabled": PROFILER.enabled, "slow_ms": PROFILER.slow_ms, "profiles": items}), 200
+
+
+@app.route("/profiles/<profile_id>", methods=["GET"])
+def profile_detail(profile_id: str):
+    # Formato de pilas colapsadas: flamegraph.pl o speedscope.app lo abren directo
+    folded = PROFILER.read(profile_id)
+    if folded is None:
+        return jsonify({"error": "perfil no encontrado"}), 404
+    return Response(folded, mimetype="text/plain")
+
+
+@app.route("/persistence", methods=["GET"])
+def persistence():
+    # Backlog y latencia de flush del buffer de escritura diferida
+    return jsonify({
+        "write_behind": BOT.writer.stats() if BOT.writer is not None else None,
+        "outbox": DB.outbox.stats() if DB.outbox is not None else None,
+        "database": DB.health(),
+    }), 200
+
+
+@app.route("/outbox", methods=["GET"])
+def outbox():
+    # Postulaciones rechazadas por Supabase pendientes de reintento
+    if DB.outbox is None:
+        return jsonify({"enabled": False}), 200
+    try:
+        limit = request.args.get("limit", 50, type=int)
+        return jsonify({
+            "enabled": True,
+            **DB.outbox.stats(),
+            "pending": DB.outbox.pending(limit=limit),
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # ────────────────────────────────────────────────────────────────
 # UTIL: EXTRACCIÓN ROBUSTA DE TEXTO Y CHAT_ID DESDE WAHA
 # ────────────────────────────────────────────────────────────────
@@ -112,6 +299,22 @@ def _extract_chat_and_text(payload: dict) -> tuple[str | None, str]:
 @app.route("/chatbot/webhook", methods=["POST"])
 @app.route("/chatbot/webhook/", methods=["POST"])
 def webhook():
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        # Una traza por mensaje entrante: WAHA, bot, Gemini, agenda y BD quedan como spans hijos
+        # PROFILE_ENABLED=1: muestreo de pilas del turno (se guarda si es lento o le toca 1 de N)
+        with trace("webhook") as root, PROFILER.turn():
+            profile_tag(trace_id=getattr(root, "trace_id", None))
+            response = _webhook()
+            status = response[1]
+            root.set(status=status)
+        return response
+    finally:
+        WEBHOOK_SECONDS.observe(time.perf_counter() - t0, str(status))
+
+
+def _webhook():
     data = request.json or {}
     chat_id = None
 
@@ -122,7 +325,7 @@ def webhook():
         chat_id, received_message = _extract_chat_and_text(payload)
 
         if not chat_id:
-            print("⚠️ Webhook sin chat_id. Payload=", payload, flush=True)
+            log.warning("⚠️ Webhook sin chat_id", extra={"payload": payload})
             return jsonify({"status": "ignored", "reason": "no chat_id"}), 200
 
         if "@g.us" in chat_id or "@broadcast" in chat_id:
@@ -135,25 +338,22 @@ def webhook():
         if event and not any(event.startswith(p) for p in allowed_prefixes):
             return jsonify({'status': 'ignored', 'reason': f'event {event} not handled'}), 200
 
-        print("\n" + "=" * 60, flush=True)
-        print("📨 MENSAJE RECIBIDO", flush=True)
-        print(f"Event: {event or '(no-event)'}", flush=True)
-        print(f"Chat ID: {chat_id}", flush=True)
-        print(f"Mensaje: {received_message}", flush=True)
-        print("=" * 60 + "\n", flush=True)
+        log.info("📨 Mensaje recibido", extra={"event": event or None, "chat_id": chat_id, "text": received_message})
+        annotate(chat=chat_ref(chat_id), event=event or None)
+        profile_tag(chat_id=chat_id)
 
         # ─────── CAMBIO #1: QUITAMOS sendSeen ───────
         try:
             WAHA.start_typing(chat_id=chat_id)
-            time.sleep(2)   # <-- CAMBIO #2: delay para estabilidad
+            with span("typing_delay"):
+                time.sleep(TYPING_DELAY_S)   # <-- CAMBIO #2: delay para estabilidad
         except Exception:
             pass
 
         try:
             response_message = BOT.process(chat_id, received_message)
         except Exception as bot_error:
-            print(f"❌ Error en BOT.process: {bot_error}", flush=True)
-            print(traceback.format_exc(), flush=True)
+            log.exception("❌ Error en BOT.process: %s", bot_error, extra={"chat_id": chat_id})
             response_message = (
                 "⚠️ Disculpa, tuve un problema procesando tu mensaje.\n"
                 "Por favor intenta nuevamente o escribe *ayuda*."
@@ -165,14 +365,13 @@ def webhook():
                 "Escribe *ayuda* o *empezar* para iniciar tu postulación."
             )
 
-        print(f"🤖 RESPUESTA BOT: {response_message[:200]}...", flush=True)
+        log.info("🤖 Respuesta del bot", extra={"chat_id": chat_id, "text": response_message[:200]})
 
         try:
             WAHA.send_message(chat_id=chat_id, message=response_message)
-            print("✅ Respuesta enviada exitosamente", flush=True)
+            log.debug("✅ Respuesta enviada exitosamente")
         except Exception as send_error:
-            print(f"❌ Error al enviar mensaje: {send_error}", flush=True)
-            print(traceback.format_exc(), flush=True)
+            log.exception("❌ Error al enviar mensaje: %s", send_error, extra={"chat_id": chat_id})
 
             try:
                 WAHA.send_message(
@@ -185,8 +384,7 @@ def webhook():
         return jsonify({'status': 'ok', 'processed': True}), 200
 
     except Exception as e:
-        print(f"❌ Error general en webhook: {e}", flush=True)
-        print(traceback.format_exc(), flush=True)
+        log.exception("❌ Error general en webhook: %s", e, extra={"chat_id": chat_id})
         if chat_id:
             try:
                 WAHA.send_message(
@@ -216,18 +414,74 @@ def get_postulantes():
         if es_apto is not None:
             es_apto = es_apto.lower() == "true"
 
-        postulantes = DB.get_all_postulantes(limit=limit, es_apto=es_apto)
-        return jsonify({"total": len(postulantes), "postulantes": postulantes}), 200
+        fields = request.args.get("fields")
+        params = dict(
+            limit=max(1, min(limit, 1000)),
+            es_apto=es_apto,
+            puesto_id=request.args.get("puesto_id", type=int),
+            start_date=request.args.get("desde"),
+            end_date=request.args.get("hasta"),
+            cursor=request.args.get("cursor"),
+            order_by=request.args.get("order_by", "id"),
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+        )
+
+        def compute():
+            postulantes, next_cursor = DB.list_postulantes(**params)
+            return {"total": len(postulantes), "postulantes": postulantes, "next_cursor": next_cursor}
+        return _cached_json(compute)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/postulantes/export", methods=["GET"])
+def export_postulantes():
+    """Exportación completa en streaming: ?format=csv|ndjson&gzip=1 (+ filtros, cursor y order_by de /postulantes)."""
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "format debe ser csv o ndjson"}), 400
+    es_apto = request.args.get("es_apto")
+    filters = dict(
+        es_apto=(es_apto.lower() == "true") if es_apto is not None else None,
+        puesto_id=request.args.get("puesto_id", type=int),
+        start_date=request.args.get("desde"),
+        end_date=request.args.get("hasta"),
+        cursor=request.args.get("cursor"),
+        order_by=request.args.get("order_by", "id"),
+    )
+    try:
+        # La primera página se pide antes del Response: los errores salen como 400/500, no a mitad del archivo
+        pages = prefetch(iter_postulantes(DB, **filters))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    chunks = csv_chunks(pages, BOT.questions_flow) if fmt == "csv" else ndjson_chunks(pages)
+    filename = f"postulantes.{fmt}"
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    if request.args.get("gzip") == "1":
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @app.route("/postulantes/<phone>", methods=["GET"])
 def get_postulante(phone: str):
+    def compute():
+        row = DB.get_postulante(phone, strict=True)
+        if row is None:
+            raise NotFound(phone)  # 404 antes de cachear y antes del chequeo de 304
+        return row
     try:
-        postulante = DB.get_postulante(phone)
-        if postulante:
-            return jsonify(postulante), 200
+        return _cached_json(compute)
+    except NotFound:
         return jsonify({"error": "Postulante no encontrado"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -236,8 +490,12 @@ def get_postulante(phone: str):
 @app.route("/postulantes/stats", methods=["GET"])
 def get_stats():
     try:
-        stats = DB.get_stats()
-        return jsonify(stats), 200
+        return _cached_json(lambda: DB.get_stats(
+            start_date=request.args.get("desde"),
+            end_date=request.args.get("hasta"),
+            puesto_id=request.args.get("puesto_id", type=int),
+            strict=True,
+        ))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,123 @@
+# agenda.py
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger("bot.agenda")
+
+# --------------------------------------------------------------------------------
+# Parámetros (ajustables por variables de entorno)
+# --------------------------------------------------------------------------------
+CAPACIDAD_DIARIA = int(os.getenv("INTERVIEW_DAILY_CAPACITY", "40"))
+HORIZONTE_DIAS_HABILES = int(os.getenv("INTERVIEW_HORIZON_DAYS", "30"))
+CALENDAR_TTL_S = float(os.getenv("INTERVIEW_CALENDAR_TTL", "300"))  # refresco para ver escrituras de otros procesos
+
+
+def business_days(start: date, n: int) -> List[date]:
+    """Los próximos `n` días hábiles (Lun-Vie) desde `start` inclusive."""
+    out: List[date] = []
+    d = start
+    while len(out) < n:
+        if d.weekday() < 5:
+            out.append(d)
+        d += timedelta(days=1)
+    return out
+
+
+class CapacityCalendar:
+    """
+    Calendario de aforo de entrevistas en memoria.
+
+    Una sola consulta por rango (db.get_confirmed_counts) trae los confirmados de
+    los próximos N días hábiles; luego buscar el siguiente día libre es recorrer
+    un arreglo chico. Las confirmaciones de este proceso lo actualizan en el acto
+    (record); el TTL recoge las de otros procesos.
+    """
+
+    def __init__(self, db: Any = None, capacity: int = CAPACIDAD_DIARIA,
+                 horizon: int = HORIZONTE_DIAS_HABILES, ttl_s: float = CALENDAR_TTL_S) -> None:
+        self.db = db
+        self.capacity = capacity
+        self.horizon = horizon
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._days: List[date] = []
+        self._counts: List[int] = []
+        self._pos: Dict[date, int] = {}
+        self._loaded_at = 0.0
+
+    # ------------- Carga -------------
+    def _fetch_counts(self, start: date, end: date) -> Dict[str, int]:
+        if self.db is None:
+            return {}
+        if hasattr(self.db, "get_confirmed_counts"):
+            return self.db.get_confirmed_counts(start.isoformat(), end.isoformat())
+        # Compatibilidad con DBs sin consulta por rango (una consulta por día)
+        if hasattr(self.db, "get_count_for_date"):
+            return {d.isoformat(): self.db.get_count_for_date(d.isoformat())
+                    for d in business_days(start, self.horizon)}
+        return {}
+
+    def _reload(self, today: date) -> None:
+        days = business_days(today + timedelta(days=1), self.horizon)
+        try:
+            counts = self._fetch_counts(days[0], days[-1])
+        except Exception as e:
+            log.error("❌ Error cargando aforo de entrevistas: %s", e)
+            counts = {}
+        self._days = days
+        self._counts = [int(counts.get(d.isoformat(), 0)) for d in days]
+        self._pos = {d: i for i, d in enumerate(days)}
+        self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self) -> None:
+        tomorrow = date.today() + timedelta(days=1)
+        stale = not self._days or time.monotonic() - self._loaded_at > self.ttl_s
+        if stale or self._days[0] < tomorrow:
+            self._reload(date.today())
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = 0.0
+            self._days = []
+
+    # ------------- Consulta / actualización -------------
+    def available_days(self) -> List[date]:
+        """Días hábiles con aforo (< capacity), en orden."""
+        with self._lock:
+            self._ensure_fresh()
+            return [d for d, c in zip(self._days, self._counts) if c < self.capacity]
+
+    def next_available(self) -> Optional[date]:
+        """Primer día hábil con aforo (< capacity), o None si el horizonte está lleno."""
+        days = self.available_days()
+        return days[0] if days else None
+
+    def count(self, day: date) -> int:
+        with self._lock:
+            self._ensure_fresh()
+            i = self._pos.get(day)
+            return self._counts[i] if i is not None else 0
+
+    def record(self, fecha_iso: str, delta: int = 1) -> None:
+        """Suma (o resta) una confirmación para el día de `fecha_iso`."""
+        try:
+            day = datetime.fromisoformat(fecha_iso).date()
+        except Exception:
+            return
+        with self._lock:
+            i = self._pos.get(day)
+            if i is not None:
+                self._counts[i] = max(0, self._counts[i] + delta)
+
+    def mark_full(self, day: date) -> None:
+        """Marca el día como lleno (p. ej. cuando la reserva atómica lo rechazó)."""
+        with self._lock:
+            i = self._pos.get(day)
+            if i is not None:
+                self._counts[i] = max(self._counts[i], self.capacity)
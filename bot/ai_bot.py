@@ -1,12 +1,17 @@
 # ai_bot.py
 from __future__ import annotations
 
+import logging
+import math
 import os
 import re
+import threading
+import time
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
-from difflib import get_close_matches
+from difflib import SequenceMatcher, get_close_matches
 
 # --------------------------------------------------------------------------------
 # Imports flexibles para GeminiClient y Database
@@ -19,6 +24,31 @@ except Exception:
     except Exception:
         GeminiClient = None  # opcional
 
+try:
+    from .gemini_cassette import Cassette  # dentro de /bot
+except Exception:
+    from gemini_cassette import Cassette
+
+try:
+    from .intent_classifier import IntentClassifier  # dentro de /bot
+except Exception:
+    try:
+        from intent_classifier import IntentClassifier
+    except Exception:
+        IntentClassifier = None  # opcional
+
+try:
+    from .agenda import CapacityCalendar, CAPACIDAD_DIARIA  # dentro de /bot
+except Exception:
+    from agenda import CapacityCalendar, CAPACIDAD_DIARIA
+
+try:
+    from services.reservations import InMemoryReservations  # dentro de /services
+    from services.write_behind import WriteBehindBuffer, WRITE_BEHIND_ENABLED
+except Exception:
+    from reservations import InMemoryReservations
+    from write_behind import WriteBehindBuffer, WRITE_BEHIND_ENABLED
+
 try:
     from services.database import Database  # dentro de /services
 except Exception:
@@ -27,11 +57,30 @@ except Exception:
     except Exception:
         Database = None  # fallback opcional
 
+try:
+    from services.phone_cache import MISSING
+except Exception:
+    from phone_cache import MISSING
+
+try:
+    from services.metrics import METRICS_ENABLED, BOT_PROCESS_SECONDS, EXTRACTIONS, RETRIES, FORCED_ADVANCES
+    from services.tracing import current_span, span, traced
+    from services.profiler import tag as profile_tag
+except Exception:
+    from metrics import METRICS_ENABLED, BOT_PROCESS_SECONDS, EXTRACTIONS, RETRIES, FORCED_ADVANCES
+    from tracing import current_span, span, traced
+    from profiler import tag as profile_tag
+
+log = logging.getLogger("bot.ai_bot")
+
 # --------------------------------------------------------------------------------
 # Parámetros (ajustables por variables de entorno)
 # --------------------------------------------------------------------------------
 SESSION_TIMEOUT_MINUTES = int(os.getenv("SESSION_TIMEOUT_MINUTES", "60"))
 COOLDOWN_HOURS = int(os.getenv("COOLDOWN_HOURS", "24"))
+# Espera máxima (ms) por la consulta a BD al rehidratar un chat desconocido con la caché fría.
+# Con 0 la respuesta nunca espera a la BD: el resultado se aplica en el siguiente mensaje.
+REHYDRATE_WAIT_MS = int(os.getenv("REHYDRATE_WAIT_MS", "0"))
 
 # Catálogo de puestos (ids estables)
 PUESTOS: List[Dict[str, Any]] = [
@@ -55,6 +104,9 @@ PUESTOS: List[Dict[str, Any]] = [
     {"id": 18, "name": "Otros"},
 ]
 
+# Acceso directo por id (evita recorrer PUESTOS en cada respuesta)
+PUESTOS_BY_ID: Dict[int, Dict[str, Any]] = {p["id"]: p for p in PUESTOS}
+
 # Mapeo de Ubicación por Puesto (Regla de Negocio)
 PUESTO_UBICACION = {
     1: "Lima",       # Agentes de Seguridad Chorrillos
@@ -98,6 +150,27 @@ PUESTOS_KEYWORDS = {
     "provincia": 4,
 }
 
+# Sinónimos coloquiales por puesto (se indexan junto al nombre oficial)
+PUESTOS_SINONIMOS: Dict[int, List[str]] = {
+    1: ["vigilante chorrillos"],
+    2: ["traslado de valores", "valores", "blindado"],
+    3: ["vigilante", "guardia", "bancos", "banco"],
+    4: ["vigilante provincia"],
+    5: ["estibador", "almacen"],
+    6: ["caja", "atencion al cliente", "cajera"],
+    7: ["jefe de caja", "encargada"],
+    8: ["chofer", "manejo", "camion", "licencia a2b"],
+    9: ["moto", "motociclista", "delivery"],
+    10: ["limpiadora", "conserje", "limpiar"],
+    11: ["despacho"],
+    12: ["vigilante mineria", "mina", "minera"],
+    13: ["supervision mineria", "supervisora"],
+    14: ["electronica"],
+    15: ["mecanica", "mecanico"],
+    16: ["electricista", "electricidad"],
+    17: ["digitacion", "digitadora", "tipeo"],
+}
+
 # --------------------------------------------------------------------------------
 # Utilidades de menú de puestos e intención de inicio
 # --------------------------------------------------------------------------------
@@ -213,34 +286,165 @@ def _detect_licencia_categoria(s: str) -> Optional[str]:
     return m.group(1).upper().replace(" ", "").replace("-", "") if m else None
 
 
+# --------------------------------------------------------------------------------
+# Índice invertido de puestos (tokens + bigramas + fuzzy)
+# --------------------------------------------------------------------------------
+_PUESTO_STOPWORDS = {
+    "de", "del", "la", "las", "el", "los", "para", "en", "y", "a", "al", "o", "u",
+    "quiero", "deseo", "postular", "postulo", "puesto", "cargo", "como", "me", "mi",
+    "interesa", "soy", "ser", "trabajar", "trabajo", "un", "una", "por", "favor",
+}
+_PUESTO_KEYWORD_WEIGHT = 1.0   # bonus de PUESTOS_KEYWORDS (mantiene los "defaults" históricos)
+_PUESTO_BIGRAM_WEIGHT = 1.0    # bonus por bigrama exacto ("traslado valores")
+_PUESTO_FUZZY_CUTOFF = 0.8     # similitud mínima (difflib) para tokens con typos
+_PUESTO_MIN_SCORE = 1.0        # debajo de esto no hay match
+_PUESTO_AMBIGUITY_RATIO = 0.75 # 2º/1º >= ratio → ambiguo (se pide desambiguar)
+
+
+def _puesto_tokens(s: str) -> List[str]:
+    """Tokeniza texto normalizado: sin stopwords y con plural simple recortado."""
+    tokens: List[str] = []
+    for tok in re.findall(r"[a-z0-9]+", _norm_text(s)):
+        if tok in _PUESTO_STOPWORDS:
+            continue
+        if len(tok) > 4 and tok.endswith("s"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+class _PuestoIndex:
+    """
+    Índice invertido sobre nombres oficiales, keywords y sinónimos de puestos.
+    Se construye una sola vez al importar el módulo; cada consulta es un par de
+    lookups en dict (+ difflib solo para tokens desconocidos).
+    """
+
+    def __init__(self) -> None:
+        postings: Dict[str, set] = {}
+        bigrams: Dict[str, set] = {}
+
+        def _add(pid: int, text: str) -> None:
+            toks = _puesto_tokens(text)
+            for tok in toks:
+                postings.setdefault(tok, set()).add(pid)
+            for a, b in zip(toks, toks[1:]):
+                bigrams.setdefault(f"{a} {b}", set()).add(pid)
+
+        for p in PUESTOS:
+            if p["id"] == 18:  # "Otros" se resuelve aparte
+                continue
+            _add(p["id"], p["name"])
+            for syn in PUESTOS_SINONIMOS.get(p["id"], []):
+                _add(p["id"], syn)
+
+        n = len(PUESTOS)
+        # Peso tipo IDF: tokens que aparecen en pocos puestos discriminan más
+        self.postings: Dict[str, Dict[int, float]] = {
+            tok: {pid: math.log(1 + n / len(pids)) for pid in pids}
+            for tok, pids in postings.items()
+        }
+        self.bigrams = bigrams
+        self.keywords: Dict[str, int] = {}
+        for key, pid in PUESTOS_KEYWORDS.items():
+            for tok in _puesto_tokens(key):
+                self.keywords[tok] = pid
+        self.vocab: List[str] = sorted(set(self.postings) | set(self.keywords))
+        self._fuzzy_cache: Dict[str, List[tuple[str, float]]] = {}
+
+    def _expand(self, tok: str) -> List[tuple[str, float]]:
+        """Devuelve [(token_indexado, similitud)] para un token de la consulta."""
+        if tok in self.postings or tok in self.keywords:
+            return [(tok, 1.0)]
+        if len(tok) < 4 or tok.isdigit():
+            return []
+        hits = self._fuzzy_cache.get(tok)
+        if hits is None:
+            close = get_close_matches(tok, self.vocab, n=2, cutoff=_PUESTO_FUZZY_CUTOFF)
+            # El ratio de difflib pondera el acierto parcial
+            hits = [(c, SequenceMatcher(None, tok, c).ratio()) for c in close]
+            if len(self._fuzzy_cache) < 2048:
+                self._fuzzy_cache[tok] = hits
+        return hits
+
+    def search(self, text: str, k: int = 3) -> List[tuple[int, float]]:
+        """Ranking top-k [(puesto_id, score)] ordenado de mayor a menor."""
+        toks = _puesto_tokens(text)
+        if not toks:
+            return []
+        scores: Dict[int, float] = {}
+        resolved: List[str] = []
+        for tok in toks:
+            best = None
+            for hit, sim in self._expand(tok):
+                for pid, w in self.postings.get(hit, {}).items():
+                    scores[pid] = scores.get(pid, 0.0) + w * sim
+                kw_pid = self.keywords.get(hit)
+                if kw_pid is not None:
+                    scores[kw_pid] = scores.get(kw_pid, 0.0) + _PUESTO_KEYWORD_WEIGHT * sim
+                if best is None:
+                    best = hit
+            resolved.append(best or tok)
+        for a, b in zip(resolved, resolved[1:]):
+            for pid in self.bigrams.get(f"{a} {b}", ()):
+                scores[pid] = scores.get(pid, 0.0) + _PUESTO_BIGRAM_WEIGHT
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [(pid, round(sc, 3)) for pid, sc in ranked[:k] if sc >= _PUESTO_MIN_SCORE]
+
+    def head_keyword(self, text: str) -> Optional[int]:
+        """
+        Puesto de la primera keyword de la consulta (palabra núcleo: "supervisor
+        de minería" → supervisor). Desempata candidatos con puntaje parecido.
+        """
+        for tok in _puesto_tokens(text):
+            for hit, _ in self._expand(tok):
+                if hit in self.keywords:
+                    return self.keywords[hit]
+        return None
+
+
+_PUESTO_INDEX = _PuestoIndex()
+
+
+def _puesto_info(pid: int) -> Dict[str, Any]:
+    p = PUESTOS_BY_ID[pid]
+    return {"puesto_id": p["id"], "puesto_name": p["name"]}
+
+
+def _puesto_candidates(s: str, k: int = 3) -> List[tuple[int, float]]:
+    """
+    Top-k de puestos para texto libre (para desambiguación de un toque).
+    Los empatados con el k-ésimo también entran: un empate no se corta por id.
+    """
+    ranked = _PUESTO_INDEX.search(s, k=len(PUESTOS))
+    if len(ranked) > k:
+        ranked = ranked[:k] + [c for c in ranked[k:] if c[1] == ranked[k - 1][1]]
+    return ranked
+
+
 def _puesto_from_text(s: str) -> Optional[Dict[str, Any]]:
     """
     Intenta mapear texto libre a un puesto específico.
     Devuelve None si no encuentra match claro (no fuerza 'Otros').
+    Si hay empate cercano entre candidatos decide la palabra núcleo (primera
+    keyword); si tampoco, devuelve None: usar _puesto_candidates() para
+    ofrecer las opciones.
     """
     sx = _norm_text(s)
 
     # Caso explícito "otros"
     if "otro" in sx or "otros" in sx:
-        match = next((p for p in PUESTOS if p["id"] == 18), None)
-        if match:
-            return {"puesto_id": match["id"], "puesto_name": match["name"]}
-
-    # Keywords directas
-    for key, pid in PUESTOS_KEYWORDS.items():
-        if key in sx:
-            match = next((p for p in PUESTOS if p["id"] == pid), None)
-            if match:
-                return {"puesto_id": match["id"], "puesto_name": match["name"]}
-
-    # Caso particular seguridad + provincia
-    if "seguridad" in sx and "provincia" in sx:
-        match = next((p for p in PUESTOS if p["id"] == 4), None)
-        if match:
-            return {"puesto_id": match["id"], "puesto_name": match["name"]}
-
-    # Si no se reconoce, devolvemos None para que IA o repregunta entren
-    return None
+        return _puesto_info(18)
+
+    ranked = _PUESTO_INDEX.search(s, k=len(PUESTOS))
+    if not ranked:
+        # Si no se reconoce, devolvemos None para que IA o repregunta entren
+        return None
+    close = [pid for pid, score in ranked if score >= ranked[0][1] * _PUESTO_AMBIGUITY_RATIO]
+    if len(close) == 1:
+        return _puesto_info(close[0])
+    head = _PUESTO_INDEX.head_keyword(s)
+    return _puesto_info(head) if head in close else None
 
 
 # --------------------------------------------------------------------------------
@@ -250,14 +454,29 @@ class AIBot:
     """
     Bot conversacional para preselección de personal con enfoque híbrido:
     1) Reglas deterministas suaves para casos esperados (rápido y barato),
+    1b) Clasificador local entrenado con respuestas históricas (sin red),
     2) IA (Gemini) cuando la respuesta se sale del carril o es ambigua,
     3) Reglas deterministas finales para la decisión de aptitud (auditables).
     """
 
-    def __init__(self, db: Any = None, gemini: Any = None) -> None:
+    def __init__(self, db: Any = None, gemini: Any = None, intent: Any = None, writer: Any = None) -> None:
         self.sessions: Dict[str, Dict[str, Any]] = {}
         self.gemini = gemini if gemini is not None else (GeminiClient() if GeminiClient else None)
         self.db = db if db is not None else (Database() if Database else None)
+        # Clasificador local (capa entre reglas y Gemini); None si no hay modelo entrenado
+        self.intent = intent if intent is not None else (IntentClassifier.load() if IntentClassifier else None)
+        # Aforo de entrevistas en memoria (una consulta por rango, no una por día)
+        self.calendar = CapacityCalendar(self.db)
+        # Reservas atómicas de cupos (hold al proponer, conversión al confirmar)
+        self.reservations = self._make_reservations()
+        # Persistencia diferida: el cierre de sesión no espera el INSERT (ver services/write_behind.py)
+        if writer is None and WRITE_BEHIND_ENABLED and hasattr(self.db, "save_postulantes_batch"):
+            writer = WriteBehindBuffer(self.db)
+        self.writer = None if writer is None else writer  # (no "or": un buffer vacío es falsy)
+        # Rehidratación perezosa: consultas de "¿ya postuló?" en curso por chat
+        self._lookups: Dict[str, Any] = {}
+        self._lookups_lock = threading.Lock()
+        self._lookup_pool: Optional[ThreadPoolExecutor] = None
 
         self.company_info = {
             "nombre": "Hermes Transportes Blindados",
@@ -293,9 +512,23 @@ class AIBot:
             "confirmacion_entrevista",   # Nuevo: Solo si APTO, reemplaza a horario_entrevista
         ]
 
+    def _make_reservations(self) -> Any:
+        if self.db is not None and hasattr(self.db, "make_reservations"):
+            try:
+                return self.db.make_reservations(CAPACIDAD_DIARIA)
+            except Exception as e:
+                log.warning("⚠️ Reservas en BD no disponibles (usando memoria): %s", e)
+        # Confirmados ya guardados de cada día: se leen una vez, en el primer hold del día
+        return InMemoryReservations(CAPACIDAD_DIARIA, baseline=getattr(self.db, "get_count_for_date", None))
+
     # ------------- Gestión de sesiones -------------
     def _init_session(self, chat_id: str) -> None:
+        prev = self.sessions.get(chat_id)
+        if prev and prev["data"].get("propuesta_fecha") and prev["data"].get("confirmacion_asistencia") is None:
+            # Sesión abandonada/reiniciada con un cupo retenido: lo liberamos ya (sin esperar al TTL)
+            self._release_slot(chat_id)
         self.sessions[chat_id] = {
+            "chat_id": chat_id,
             "step": 0,
             "data": {
                 # Campos básicos
@@ -346,6 +579,64 @@ class AIBot:
     def _reset_session(self, chat_id: str) -> None:
         self._init_session(chat_id)
 
+    # ------------- Rehidratación desde la BD -------------
+    def _previous_application(self, chat_id: str, wait_s: float) -> Any:
+        """
+        Última postulación del chat: la fila, None si no postuló, o MISSING si
+        la BD no respondió dentro de `wait_s`. La consulta sigue en segundo plano
+        y su resultado queda en la caché de teléfonos para el próximo mensaje.
+        """
+        if self.db is None or not hasattr(self.db, "peek_postulante"):
+            return MISSING
+        try:
+            row = self.db.peek_postulante(chat_id)
+        except Exception:
+            return MISSING
+        if row is not MISSING:
+            return row
+        with self._lookups_lock:
+            fut = self._lookups.get(chat_id)
+            if fut is None:
+                if self._lookup_pool is None:
+                    self._lookup_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rehydrate")
+                fut = self._lookup_pool.submit(self.db.get_postulante, chat_id)
+                self._lookups[chat_id] = fut
+                fut.add_done_callback(lambda _f, c=chat_id: self._lookups.pop(c, None))
+        if wait_s <= 0 and not fut.done():
+            return MISSING
+        try:
+            return fut.result(timeout=wait_s)
+        except FutureTimeout:
+            return MISSING
+        except Exception as e:
+            log.warning("⚠️ No se pudo consultar postulación previa: %s", e)
+            return None
+
+    def _rehydrate_session(self, chat_id: str, row: Dict[str, Any]) -> bool:
+        """Reconstruye una sesión completada desde la BD si sigue dentro del cooldown."""
+        raw_time = row.get("fecha_postulacion") or row.get("created_at")
+        try:
+            completion_time = datetime.fromisoformat(str(raw_time).replace("Z", "+00:00"))
+            if completion_time.tzinfo is not None:
+                completion_time = completion_time.astimezone().replace(tzinfo=None)
+        except Exception:
+            return False
+        if datetime.now() - completion_time > timedelta(hours=COOLDOWN_HOURS):
+            return False
+
+        self._init_session(chat_id)
+        s = self.sessions[chat_id]
+        for key in ("puesto_id", "puesto_name", "nombre_completo", "fecha_entrevista", "confirmacion_asistencia"):
+            s["data"][key] = row.get(key)
+        s["step"] = len(self.questions_flow)
+        s["completed"] = True
+        s["completion_time"] = completion_time
+        s["is_apto"] = bool(row.get("es_apto"))
+        s["rehydrated"] = True
+        s["final_response"] = self._final_message(s)
+        log.info("♻️ Sesión rehidratada desde BD", extra={"chat_id": chat_id})
+        return True
+
     def _is_session_expired(self, chat_id: str) -> bool:
         s = self.sessions.get(chat_id)
         if not s:
@@ -358,6 +649,10 @@ class AIBot:
             return True
         return (datetime.now() - s["completion_time"]) > timedelta(hours=COOLDOWN_HOURS)
 
+    def _cooldown_message(self, s: Dict[str, Any]) -> str:
+        hours_left = int(COOLDOWN_HOURS - (datetime.now() - s["completion_time"]).total_seconds() / 3600)
+        return f"Ya completaste tu postulación. Podrás volver a postular en {max(hours_left, 0)} horas."
+
     def _update_activity(self, chat_id: str) -> None:
         if chat_id in self.sessions:
             self.sessions[chat_id]["last_activity"] = datetime.now()
@@ -372,6 +667,41 @@ class AIBot:
 
     # ------------- Núcleo de procesamiento -------------
     def process(self, chat_id: str, text: str) -> str:
+        # El label (pregunta respondida) solo se calcula si alguien lo usa: métrica, traza o perfil
+        in_trace = current_span() is not None  # el profiler solo corre dentro de la traza del webhook
+        if not (METRICS_ENABLED or in_trace):
+            return self._turn(chat_id, text)
+        t0 = time.perf_counter()
+        metric_key = self._metric_key(chat_id)
+        try:
+            if not in_trace:
+                return self._turn(chat_id, text)
+            profile_tag(question_key=metric_key)
+            with span("bot.process", question_key=metric_key):
+                return self._turn(chat_id, text)
+        finally:
+            if METRICS_ENABLED:
+                BOT_PROCESS_SECONDS.observe(time.perf_counter() - t0, metric_key)
+
+    def _turn(self, chat_id: str, text: str) -> str:
+        # Con GEMINI_CASSETTE_MODE activo, el turno queda grabado con sus llamadas a Gemini
+        cassette = getattr(self.gemini, "cassette", None)
+        if not isinstance(cassette, Cassette):
+            return self._process(chat_id, text)
+        with cassette.turn(chat_id, text):
+            return self._process(chat_id, text)
+
+    def _metric_key(self, chat_id: str) -> str:
+        """Pregunta que responde este mensaje (label de la métrica de latencia)."""
+        s = self.sessions.get(chat_id)
+        if s is None:
+            return "inicio"
+        if s["completed"]:
+            return "completado"
+        step = s["step"]
+        return self.questions_flow[step - 1] if 0 < step <= len(self.questions_flow) else "inicio"
+
+    def _process(self, chat_id: str, text: str) -> str:
         if not text or not text.strip():
             return "¿Me puedes escribir tu consulta o respuesta? 😊"
 
@@ -388,19 +718,30 @@ class AIBot:
                 "• *estado* — ver progreso"
             )
 
-        # Crear/renovar sesión
+        # Crear/renovar sesión (si ya postuló hace poco, se rehidrata desde la BD)
         if chat_id not in self.sessions or self._is_session_expired(chat_id):
-            self._init_session(chat_id)
-            if start_intent:
-                self.sessions[chat_id]["step"] = 1
-                return self._ask_next(self.sessions[chat_id]) # Pregunta 1: Nombre
-
-            return (
-                f"¡Hola! 👋 Soy el asistente virtual de *{self.company_info['nombre']}*.\n"
-                "Para iniciar tu postulación, escribe *empezar* o *quiero postular*."
-            )
+            prev = self._previous_application(chat_id, REHYDRATE_WAIT_MS / 1000)
+            if not (isinstance(prev, dict) and self._rehydrate_session(chat_id, prev)):
+                self._init_session(chat_id)
+                # Caché fría y BD lenta: se vuelve a mirar en los siguientes mensajes
+                self.sessions[chat_id]["rehydrate_pending"] = prev is MISSING
+                if start_intent:
+                    self.sessions[chat_id]["step"] = 1
+                    return self._ask_next(self.sessions[chat_id]) # Pregunta 1: Nombre
+
+                return (
+                    f"¡Hola! 👋 Soy el asistente virtual de *{self.company_info['nombre']}*.\n"
+                    "Para iniciar tu postulación, escribe *empezar* o *quiero postular*."
+                )
 
         s = self.sessions[chat_id]
+        if s.get("rehydrate_pending"):
+            prev = self._previous_application(chat_id, 0)
+            if prev is not MISSING:
+                s["rehydrate_pending"] = False
+                if isinstance(prev, dict) and self._rehydrate_session(chat_id, prev):
+                    # Ya había postulado (la BD respondió tarde): se corta el flujo nuevo
+                    return self._cooldown_message(self.sessions[chat_id])
         self._update_activity(chat_id)
         self._add_to_history(chat_id, "user", text)
 
@@ -412,8 +753,7 @@ class AIBot:
                     s = self.sessions[chat_id]
                     s["step"] = 1
                     return self._ask_next(s)
-                hours_left = int(COOLDOWN_HOURS - (datetime.now() - s["completion_time"]).total_seconds() / 3600)
-                return f"Ya completaste tu postulación. Podrás volver a postular en {max(hours_left, 0)} horas."
+                return self._cooldown_message(s)
 
             if "estado" in text_norm:
                 return s.get("final_response") or "Tu postulación está registrada."
@@ -494,15 +834,32 @@ class AIBot:
 
         # 1. Determinista
         det_valid, det_data, det_msg = self._validate_and_extract_soft(current_key, text, s["data"])
+        # Desambiguación local de puesto: no hace falta IA, basta con un número
+        puesto_opciones = det_data.pop("puesto_opciones", None) if det_data else None
         if det_data:
             normalized_data.update(det_data)
+        source = "none"
         if det_valid:
             valid = True
+            source = "deterministic"
         else:
             need_clarify_msg = det_msg
 
-        # 2. IA (si falla determinista)
-        if not valid and self.gemini:
+        # 2. Clasificador local (si falla determinista y el modelo está seguro)
+        if not valid and self.intent and not puesto_opciones:
+            try:
+                pred = self.intent.predict(current_key, text)
+                if pred:
+                    normalized_data.update(pred[0])
+                    valid = True
+                    source = "classifier"
+                    need_clarify_msg = None
+            except Exception as e:
+                log.warning("Clasificador local error: %s", e)
+
+        # 3. IA (si fallan reglas y clasificador)
+        if not valid and self.gemini and not puesto_opciones:
+            source = "ai"
             try:
                 # Contexto extra para IA (opciones de enums)
                 extra_context = ""
@@ -556,15 +913,17 @@ class AIBot:
                 if not valid and not need_clarify_msg:
                     need_clarify_msg = (extraction or {}).get("bot_response")
             except Exception as e:
-                print(f"[AIBot] Gemini error: {e}", flush=True)
+                log.warning("Gemini error: %s", e)
 
-        # 3. Reintentos y Manejo de Errores (Humanizado)
+        EXTRACTIONS.inc(source if valid else "none")
+
+        # 4. Reintentos y Manejo de Errores (Humanizado)
         if not valid:
             # -[ SOFT RETRY LOGIC FOR AGE ]------------------------
             # Si es la 2da vez que falla en edad, lo dejamos pasar con lo que haya (o 0)
             if current_key == "edad" and s["retry_count"] >= 1:
                 # Recuperar cualquier int que hayamos podido sacar, o el raw
-                print(f"[AIBot] Soft Retry triggered for Age. Accepting input: {text}")
+                log.info("Soft retry de edad: se acepta la respuesta", extra={"text": text})
                 # Intentar re-extract simple
                 forced_age = _extract_int(text)
                 if forced_age:
@@ -576,14 +935,17 @@ class AIBot:
                      pass
 
                 # Forzar avance
+                FORCED_ADVANCES.inc("edad_soft_retry")
                 s["retry_count"] = 0
                 s["step"] += 1
                 return self._ask_next(s)
             # -----------------------------------------------------
 
             s["retry_count"] += 1
+            RETRIES.inc(current_key)
             if s["same_answer_count"] >= 2:
                 # Forzar avance si se atasca repitiendo lo mismo
+                FORCED_ADVANCES.inc("repeated_answer")
                 s["retry_count"] = 0
                 s["step"] += 1
                 return self._ask_next(s)
@@ -592,7 +954,7 @@ class AIBot:
             # En lugar de solo "El DNI debe tener 8 dígitos", le pedimos a Gemini que lo diga amable.
             clarify = need_clarify_msg or "No entendí tu respuesta."
 
-            if self.gemini and need_clarify_msg:
+            if self.gemini and need_clarify_msg and not puesto_opciones:
                 try:
                     # Prompt para parafrasear el error amablemente
                     error_ctx = (
@@ -610,13 +972,21 @@ class AIBot:
                     if human_error:
                         clarify = human_error
                 except Exception as e:
-                    print(f"Error generando error dinámico: {e}")
+                    log.warning("Error generando error dinámico: %s", e)
 
             self._add_to_history(chat_id, "assistant", clarify)
             return clarify
 
         # Respuesta válida
         s["retry_count"] = 0
+        if current_key == "confirmacion_entrevista":
+            if normalized_data.get("confirmacion_asistencia") is True:
+                if not self._confirm_slot(chat_id, normalized_data.get("fecha_entrevista")):
+                    # El hold expiró y el día se llenó mientras tanto: proponemos otra fecha
+                    s["data"].pop("propuesta_fecha", None)
+                    return "😔 Lo sentimos, ese día acaba de llenarse.\n\n" + self._ask_next(s)
+            else:
+                self._release_slot(chat_id)
         if normalized_data:
             s["data"].update(normalized_data)
 
@@ -754,7 +1124,7 @@ class AIBot:
             msg = "Por favor especifica el medio por el cual te enteraste."
         elif key == "confirmacion_entrevista":
             # Calcular fecha con AFORO y DÍAS HÁBILES
-            fecha_iso, dia_esp, fecha_fmt_short = self._get_next_valid_slot()
+            fecha_iso, dia_esp, fecha_fmt_short = self._get_next_valid_slot(s.get("chat_id"))
 
             # Guardamos la fecha propuesta en sesión temporal data por si confirma
             s["data"]["propuesta_fecha"] = fecha_iso
@@ -776,11 +1146,23 @@ class AIBot:
         s["is_apto"] = es_apto
 
         # Guardar en DB
-        if self.db and hasattr(self.db, "save_postulante"):
-            self.db.save_postulante(chat_id, s)
+        if self.writer is not None:
+            saved = self.writer.enqueue(chat_id, s)
+        elif self.db and hasattr(self.db, "save_postulante"):
+            saved = self.db.save_postulante(chat_id, s)
+        else:
+            saved = False
+        if saved and s["data"].get("confirmacion_asistencia") and s["data"].get("fecha_entrevista"):
+            self.calendar.record(s["data"]["fecha_entrevista"])
 
-        final_msg = ""
-        if es_apto:
+        final_msg = self._final_message(s)
+        s["final_response"] = final_msg
+        self._add_to_history(chat_id, "assistant", final_msg)
+        return final_msg
+
+    def _final_message(self, s: Dict[str, Any]) -> str:
+        """Mensaje de cierre según aptitud y confirmación de entrevista (también al rehidratar)."""
+        if s.get("is_apto"):
             # Mensaje de éxito si confirmó
             confirmed = s["data"].get("confirmacion_asistencia")
             fecha_iso = s["data"].get("fecha_entrevista")
@@ -792,30 +1174,22 @@ class AIBot:
                 except:
                     fecha_fmt = "la fecha indicada"
 
-                final_msg = (
+                return (
                     f"🎉 ¡Excelente! Tu entrevista ha sido agendada para el *{fecha_fmt}*.\n"
                     "📍 Te esperamos en: *Av. Prol. Huaylas 1720, Chorrillos*.\n"
                     "No olvides llevar tu DNI y CV impreso. ¡Éxitos! 💪"
                 )
-            else:
-                final_msg = (
-                    "Entendido. Lamentamos que no puedas asistir en este horario. 😊\n"
-                    "Dejaremos tus datos registrados y te contactaremos si se abre otra fecha. ¡Gracias!"
-                )
-        else:
-            razones_txt = ", ".join(razones) if razones else "perfil no ajustado"
-            # Mensaje suave de rechazo
-            final_msg = (
-                "Muchas gracias por completar tu postulación. ✅\n"
-                "Hemos registrado correctamente tu información.\n"
-                "Tu perfil será evaluado y considerado en los procesos correspondientes.\n"
-                "¡Gracias por tu interés en Hermes Transportes Blindados!"
-                     )
-
-
-        s["final_response"] = final_msg
-        self._add_to_history(chat_id, "assistant", final_msg)
-        return final_msg
+            return (
+                "Entendido. Lamentamos que no puedas asistir en este horario. 😊\n"
+                "Dejaremos tus datos registrados y te contactaremos si se abre otra fecha. ¡Gracias!"
+            )
+        # Mensaje suave de rechazo
+        return (
+            "Muchas gracias por completar tu postulación. ✅\n"
+            "Hemos registrado correctamente tu información.\n"
+            "Tu perfil será evaluado y considerado en los procesos correspondientes.\n"
+            "¡Gracias por tu interés en Hermes Transportes Blindados!"
+        )
 
     # -------------------------------------------------------------
     # Validación heurística
@@ -1023,8 +1397,8 @@ class AIBot:
             if num_match:
                 try:
                     num = int(num_match.group(1))
-                    if 1 <= num <= len(PUESTOS):
-                        p = next(x for x in PUESTOS if x["id"] == num)
+                    if num in PUESTOS_BY_ID:
+                        p = PUESTOS_BY_ID[num]
                         out["puesto_id"] = p["id"]
                         out["puesto_name"] = p["name"]
                         # Auto-fill destino based on puesto
@@ -1042,6 +1416,17 @@ class AIBot:
                     puesto_loc = PUESTO_UBICACION.get(pid, "Ambos")
                     out["destino"] = puesto_loc.lower() if puesto_loc != "Ambos" else "ambos"
                 return True, out, None
+
+            # Ambiguo: ofrecemos los candidatos del índice (responde con un número)
+            candidatos = _puesto_candidates(t, k=3)
+            if candidatos:
+                top = candidatos[0][1]
+                candidatos = [c for c in candidatos if c[1] >= top * _PUESTO_AMBIGUITY_RATIO]
+            if len(candidatos) > 1:
+                opciones = "\n".join(f"{pid}. {PUESTOS_BY_ID[pid]['name']}" for pid, _ in candidatos)
+                return False, {"puesto_opciones": [pid for pid, _ in candidatos]}, (
+                    "¿A cuál de estos puestos te refieres? Responde con el número:\n" + opciones
+                )
             return False, {}, "Elige una opción del menú (número)."
 
         if key == "disponibilidad":
@@ -1237,51 +1622,62 @@ class AIBot:
     # -------------------------------------------------------------
     # Lógica de Aforo / Fechas Validás
     # -------------------------------------------------------------
-    def _get_next_valid_slot(self) -> tuple[str, str, str]:
+    @traced("agenda.next_valid_slot")
+    def _get_next_valid_slot(self, chat_id: Optional[str] = None) -> tuple[str, str, str]:
         """
         Busca el siguiente día hábil (Lun-Vie) con aforo disponible (<40).
+        Si se pasa chat_id, además retiene el cupo (hold) de forma atómica.
         Retorna (iso_full_datetime, dia_semana_esp, fecha_corta_dd_mm).
         """
-        candidate = datetime.now() + timedelta(days=1)
-
-        # Límite de búsqueda para evitar loop infinito (ej. 30 días)
-        for _ in range(30):
-            # 1. Ajuste Fin de Semana (Lunes a Viernes solamente)
-            wd = candidate.weekday() # 0=Mon ... 6=Sun
-            if wd == 5: # Sábado -> Lunes
-                candidate += timedelta(days=2)
-            elif wd == 6: # Domingo -> Lunes
-                candidate += timedelta(days=1)
-
-            # Ahora candidate es Mon-Fri
-
-            # 2. Check Capacity en DB
-            # Formato ISO base para la query
-            iso_check = candidate.strftime("%Y-%m-%d")
-
-            count = 0
-            if self.db and hasattr(self.db, "get_count_for_date"):
-                count = self.db.get_count_for_date(iso_check)
-
-            if count < 40:
-                # Slot encontrado!
-                candidate = candidate.replace(hour=8, minute=30, second=0, microsecond=0)
-
-                # Formatear
-                dia_str = candidate.strftime("%A")
-                dias = {"Monday": "Lunes", "Tuesday": "Martes", "Wednesday": "Miércoles", "Thursday": "Jueves", "Friday": "Viernes"}
-                dia_esp = dias.get(dia_str, dia_str)
-                fecha_fmt_short = candidate.strftime("%d/%m")
-
-                return candidate.isoformat(), dia_esp, fecha_fmt_short
-
-            else:
-                # Día lleno, probar siguiente
-                candidate += timedelta(days=1)
+        # Recorre el calendario de aforo en memoria (ver bot/agenda.py)
+        day = None
+        for candidate_day in self.calendar.available_days():
+            if chat_id is None or self._hold_slot(chat_id, candidate_day.isoformat()):
+                day = candidate_day
+                break
+            # Otro chat tomó el último cupo: el calendario lo marca lleno hasta el próximo refresco
+            self.calendar.mark_full(candidate_day)
+
+        if day is not None:
+            # Slot encontrado!
+            candidate = datetime(day.year, day.month, day.day, 8, 30)
+
+            # Formatear
+            dia_str = candidate.strftime("%A")
+            dias = {"Monday": "Lunes", "Tuesday": "Martes", "Wednesday": "Miércoles", "Thursday": "Jueves", "Friday": "Viernes"}
+            dia_esp = dias.get(dia_str, dia_str)
+            fecha_fmt_short = candidate.strftime("%d/%m")
+
+            return candidate.isoformat(), dia_esp, fecha_fmt_short
 
         # Fallback (si todo lleno por 1 mes, devolvemos mañana igual para no romper, o log error)
         fallback = datetime.now() + timedelta(days=1)
         return fallback.isoformat(), "mañana", fallback.strftime("%d/%m")
 
+    @traced("agenda.hold_slot")
+    def _hold_slot(self, chat_id: str, day_iso: str) -> bool:
+        try:
+            return self.reservations.hold(day_iso, chat_id)
+        except Exception as e:
+            # Sin backend de reservas no bloqueamos el flujo (comportamiento previo)
+            log.error("❌ Error reservando cupo %s: %s", day_iso, e)
+            return True
+
+    @traced("agenda.confirm_slot")
+    def _confirm_slot(self, chat_id: str, fecha_iso: Optional[str]) -> bool:
+        if not fecha_iso:
+            return True
+        try:
+            return self.reservations.confirm(fecha_iso[:10], chat_id)
+        except Exception as e:
+            log.error("❌ Error confirmando cupo %s: %s", fecha_iso, e)
+            return True
+
+    def _release_slot(self, chat_id: str) -> None:
+        try:
+            self.reservations.release(chat_id)
+        except Exception as e:
+            log.error("❌ Error liberando cupo: %s", e, extra={"chat_id": chat_id})
+
     def _forced_options_question(self, key: str) -> str:
         return f"Por favor responde la pregunta ({key}) de forma clara."
@@ -0,0 +1,351 @@
+# gemini_cassette.py
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    from services.logs import redact
+    from services.tracing import chat_ref
+except ImportError:
+    from logs import redact
+    from tracing import chat_ref
+
+log = logging.getLogger("bot.gemini_cassette")
+
+# --------------------------------------------------------------------------------
+# Cassette de llamadas a Gemini (grabar / reproducir)
+# - record: cada llamada a GeminiClient._generate se guarda como
+#   (hash del prompt, modelo, respuesta, latencia, tokens), junto con los turnos
+#   de conversación que la originaron (texto del usuario, chat anonimizado).
+#   Texto y respuesta pasan por logs.redact: correos, celulares y DNIs quedan
+#   enmascarados en el cassette (se puede compartir). Los originales van a un
+#   archivo privado aparte (<cassette>.raw.jsonl, permisos 0600), enlazados por `raw`.
+# - replay: sirve las respuestas grabadas sin red, de forma determinista
+#   (misma secuencia por prompt), opcionalmente con la latencia grabada. Si está
+#   el archivo privado, las respuestas salen sin enmascarar (extracciones reales).
+# - Laboratorio: `rerun` vuelve a pasar los turnos grabados por el bot con los
+#   prompts actuales y compara llamadas por turno, tokens y latencia. Usa el
+#   texto original del archivo privado: con el enmascarado, los prompts (y las
+#   validaciones de DNI/celular/correo) ya no son los de la grabación.
+# --------------------------------------------------------------------------------
+GEMINI_CASSETTE_MODE = os.getenv("GEMINI_CASSETTE_MODE", "off").strip().lower()  # off | record | replay
+GEMINI_CASSETTE_FILE = os.getenv("GEMINI_CASSETTE_FILE", "data/gemini_cassette.jsonl")
+GEMINI_CASSETTE_RAW = os.getenv("GEMINI_CASSETTE_RAW", "1") == "1"  # guardar originales en <cassette>.raw.jsonl
+GEMINI_CASSETTE_LATENCY = float(os.getenv("GEMINI_CASSETTE_LATENCY", "0"))  # factor sobre la latencia grabada (0 = sin espera)
+
+MODES = ("off", "record", "replay")
+
+_current_turn: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("gemini_cassette_turn", default=None)
+_NO_TURN = nullcontext()
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:24]
+
+
+def raw_path(path: str) -> str:
+    """Archivo privado con el texto y las respuestas sin enmascarar de un cassette."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.raw{ext or '.jsonl'}"
+
+
+def read_raw(path: str) -> Dict[str, Dict[str, Any]]:
+    """Originales del cassette `path` por referencia (vacío si no hay archivo privado)."""
+    if not os.path.exists(raw_path(path)):
+        return {}
+    return {e["ref"]: e for e in read_entries(raw_path(path)) if e.get("ref")}
+
+
+def _estimate_tokens(text: Optional[str]) -> int:
+    return math.ceil(len(text or "") / 4)  # ~4 caracteres por token (español)
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Cassette:
+    """Graba o reproduce las llamadas de GeminiClient._generate."""
+
+    def __init__(self, mode: str = GEMINI_CASSETTE_MODE, path: str = GEMINI_CASSETTE_FILE,
+                 latency: float = GEMINI_CASSETTE_LATENCY, raw: bool = GEMINI_CASSETTE_RAW) -> None:
+        if mode not in MODES:
+            log.warning("⚠️ GEMINI_CASSETTE_MODE desconocido: %r (uso off)", mode)
+            mode = "off"
+        self.mode = mode
+        self.path = path
+        self.latency = latency
+        self.raw = raw
+        self._lock = threading.Lock()
+        self._turns = itertools.count(1)
+        self._tapes: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._cursor: Dict[str, int] = {}
+        self.counters = {"turns": 0, "calls": 0, "hits": 0, "misses": 0,
+                         "tokens_in": 0, "tokens_out": 0, "latency_s": 0.0}
+        if mode != "off":
+            log.info("📼 Cassette Gemini en modo %s: %s", mode, path)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    # ------------- Turnos -------------
+    def turn(self, chat_id: str, text: str):
+        """Contexto de un turno del bot: las llamadas dentro se asocian a él."""
+        if self.mode == "off":
+            return _NO_TURN
+        return self._turn(chat_id, text)
+
+    @contextmanager
+    def _turn(self, chat_id: str, text: str) -> Iterator[None]:
+        state = {"turn": next(self._turns), "calls": 0}
+        token = _current_turn.set(state)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            _current_turn.reset(token)
+            with self._lock:
+                self.counters["turns"] += 1
+            if self.recording:
+                entry = {
+                    "type": "turn", "turn": state["turn"], "chat": chat_ref(chat_id), "text": redact(text),
+                    "calls": state["calls"], "ms": round((time.perf_counter() - t0) * 1000, 2),
+                }
+                if self.raw and text:
+                    entry["raw"] = self._append_raw({"text": text})
+                self._append(entry)
+
+    # ------------- Llamadas -------------
+    def record(self, model: str, prompt: str, response: Optional[str], latency_s: float,
+               usage: Optional[Dict[str, int]] = None, answered_by: Optional[str] = None) -> None:
+        tokens_in = (usage or {}).get("tokens_in") or _estimate_tokens(prompt)
+        tokens_out = (usage or {}).get("tokens_out") or _estimate_tokens(response)
+        entry = {
+            "type": "call", "key": prompt_key(model, prompt), "model": model,
+            "answered_by": answered_by or model, "response": redact(response) if response else response,
+            "ms": round(latency_s * 1000, 2), "tokens_in": tokens_in, "tokens_out": tokens_out,
+            "tokens_estimated": not usage, "turn": self._note_call(),
+        }
+        if self.raw and response:
+            entry["raw"] = self._append_raw({"response": response})
+        self._count(entry, hit=True)
+        self._append(entry)
+
+    def play(self, model: str, prompt: str) -> Optional[str]:
+        """Respuesta grabada para este prompt (en orden de grabación; la última se repite). None si no hay."""
+        key = prompt_key(model, prompt)
+        self._note_call()
+        with self._lock:
+            if self._tapes is None:
+                self._tapes = self._load_tapes()
+            tape = self._tapes.get(key)
+            if not tape:
+                entry = None
+            else:
+                i = self._cursor.get(key, 0)
+                self._cursor[key] = i + 1
+                entry = tape[min(i, len(tape) - 1)]
+        if entry is None:
+            self._count({"tokens_in": _estimate_tokens(prompt), "tokens_out": 0, "ms": 0}, hit=False)
+            return None
+        self._count(entry, hit=True)
+        if self.latency > 0 and entry.get("ms"):
+            time.sleep(entry["ms"] / 1000 * self.latency)
+        return entry.get("response")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            c = dict(self.counters)
+        c["latency_s"] = round(c["latency_s"], 3)
+        c["calls_per_turn"] = round(c["calls"] / c["turns"], 3) if c["turns"] else None
+        return {"mode": self.mode, "path": self.path, **c}
+
+    # ------------- Internos -------------
+    def _note_call(self) -> Optional[int]:
+        state = _current_turn.get()
+        if state is None:
+            return None
+        state["calls"] += 1
+        return state["turn"]
+
+    def _count(self, entry: Dict[str, Any], hit: bool) -> None:
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["hits" if hit else "misses"] += 1
+            self.counters["tokens_in"] += entry.get("tokens_in") or 0
+            self.counters["tokens_out"] += entry.get("tokens_out") or 0
+            self.counters["latency_s"] += (entry.get("ms") or 0) / 1000
+
+    def _load_tapes(self) -> Dict[str, List[Dict[str, Any]]]:
+        tapes: Dict[str, List[Dict[str, Any]]] = {}
+        originals = read_raw(self.path)
+        for entry in read_entries(self.path):
+            if entry.get("type") == "call":
+                original = originals.get(entry.get("raw"))
+                if original is not None:
+                    entry["response"] = original.get("response")
+                tapes.setdefault(entry["key"], []).append(entry)
+        log.info("📼 Cassette cargado: %s respuestas, %s prompts", sum(len(t) for t in tapes.values()), len(tapes))
+        return tapes
+
+    def _append_raw(self, original: Dict[str, Any]) -> str:
+        """Guarda el original en el archivo privado (0600) y devuelve su referencia."""
+        ref = os.urandom(8).hex()
+        line = json.dumps({"ref": ref, **original}, ensure_ascii=False) + "\n"
+        path = raw_path(self.path)
+        with self._lock:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            with os.fdopen(fd, "a", encoding="utf-8") as f:
+                f.write(line)
+        return ref
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        entry["ts"] = round(time.time(), 3)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def read_entries(path: str) -> List[Dict[str, Any]]:
+    entries: List[Dict[str, Any]] = []
+    if not os.path.exists(path):
+        log.warning("⚠️ Cassette no encontrado: %s", path)
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # línea truncada (proceso cortado a mitad de escritura)
+    return entries
+
+
+# --------------------------------------------------------------------------------
+# Laboratorio de rendimiento
+# --------------------------------------------------------------------------------
+def summarize(path: str) -> Dict[str, Any]:
+    """Llamadas por turno, tokens y latencias de un cassette grabado."""
+    entries = read_entries(path)
+    calls = [e for e in entries if e.get("type") == "call"]
+    turns = [e for e in entries if e.get("type") == "turn"]
+    call_ms = [e.get("ms") or 0 for e in calls]
+    turn_ms = [e.get("ms") or 0 for e in turns]
+    return {
+        "path": path,
+        "turns": len(turns),
+        "calls": len(calls),
+        "calls_per_turn": round(len(calls) / len(turns), 3) if turns else None,
+        "turns_with_ai": sum(1 for t in turns if t.get("calls")),
+        "tokens_in": sum(e.get("tokens_in") or 0 for e in calls),
+        "tokens_out": sum(e.get("tokens_out") or 0 for e in calls),
+        "fallback_calls": sum(1 for e in calls if e.get("answered_by") not in (None, e.get("model"))),
+        "empty_responses": sum(1 for e in calls if not e.get("response")),
+        "call_ms": {"p50": _percentile(call_ms, 50), "p95": _percentile(call_ms, 95), "total": round(sum(call_ms), 1)},
+        "turn_ms": {"p50": _percentile(turn_ms, 50), "p95": _percentile(turn_ms, 95)},
+    }
+
+
+def recorded_turns(path: str) -> List[Dict[str, Any]]:
+    """Turnos grabados en orden (chat anonimizado + texto): el tráfico a re-ejecutar."""
+    return [e for e in read_entries(path) if e.get("type") == "turn"]
+
+
+def rerun(path: str, record_to: Optional[str] = None, latency: float = 0.0) -> Dict[str, Any]:
+    """
+    Re-ejecuta los turnos grabados en `path` con los prompts actuales.
+
+    Sin `record_to` las respuestas salen del mismo cassette (sin red): los
+    `misses` son prompts que cambiaron desde la grabación. Con `record_to` se
+    llama a Gemini de verdad y se graba un cassette nuevo para comparar.
+    Los turnos se re-ejecutan con su texto original (archivo privado); sin él
+    solo queda el enmascarado y los turnos con datos personales no coinciden.
+    """
+    try:
+        from .gemini_client import GeminiClient
+        from .ai_bot import AIBot
+    except ImportError:
+        from gemini_client import GeminiClient  # type: ignore
+        from ai_bot import AIBot  # type: ignore
+
+    cassette = Cassette("record", record_to) if record_to else Cassette("replay", path, latency)
+    bot = AIBot(db=False, gemini=GeminiClient(cassette=cassette), intent=False)
+    turns = recorded_turns(path)
+    originals = read_raw(path)
+    if any(t.get("raw") not in originals for t in turns if t.get("text")):
+        log.warning("⚠️ Sin el texto original de algunos turnos (%s): se re-ejecutan enmascarados", raw_path(path))
+    t0 = time.perf_counter()
+    for turn in turns:
+        text = originals.get(turn.get("raw"), {}).get("text", turn.get("text"))
+        bot.process(turn["chat"], text or "")
+    result = cassette.stats()
+    result["wall_s"] = round(time.perf_counter() - t0, 3)
+    return {"recorded": _flat(summarize(path)), "rerun": result}
+
+
+def _print_table(rows: Dict[str, List[Any]], headers: List[str]) -> None:
+    print(f"{'métrica':18}" + "".join(f"{h:>22}" for h in headers), flush=True)
+    for name, values in rows.items():
+        print(f"{name:18}" + "".join(f"{str(v):>22}" for v in values), flush=True)
+
+
+def _flat(summary: Dict[str, Any]) -> Dict[str, Any]:
+    keys = ("turns", "calls", "calls_per_turn", "turns_with_ai", "tokens_in", "tokens_out",
+            "fallback_calls", "empty_responses")
+    flat = {k: summary.get(k) for k in keys}
+    flat.update({"call_ms_p50": summary["call_ms"]["p50"], "call_ms_p95": summary["call_ms"]["p95"],
+                 "turn_ms_p50": summary["turn_ms"]["p50"], "turn_ms_p95": summary["turn_ms"]["p95"]})
+    return flat
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    python -m bot.gemini_cassette stats A.jsonl [B.jsonl]     # resumen / comparación de versiones de prompts
+    python -m bot.gemini_cassette rerun A.jsonl [--record B.jsonl] [--latencia 1]
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2 or argv[0] not in ("stats", "rerun"):
+        print(main.__doc__, flush=True)
+        return 2
+    command, path, rest = argv[0], argv[1], argv[2:]
+    if command == "stats":
+        summaries = [_flat(summarize(p)) for p in [path] + rest[:1]]
+        _print_table({k: [s[k] for s in summaries] for k in summaries[0]}, [os.path.basename(p) for p in [path] + rest[:1]])
+        return 0
+    record_to = rest[rest.index("--record") + 1] if "--record" in rest else None
+    latency = float(rest[rest.index("--latencia") + 1]) if "--latencia" in rest else 0.0
+    result = rerun(path, record_to, latency)
+    print(json.dumps(result, ensure_ascii=False, indent=2), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
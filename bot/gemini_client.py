@@ -4,26 +4,37 @@ from __future__ import annotations
 import os
 import re
 import json
+import logging
 import time
+import threading
 from typing import Any, Dict, Optional, List
 
 from dotenv import load_dotenv
 
-# Gemini es opcional: si no hay API KEY, el bot sigue con fallback determinista
 try:
-    import google.generativeai as genai
-except Exception:
-    genai = None
+    from .gemini_cassette import Cassette  # dentro de /bot
+except ImportError:
+    from gemini_cassette import Cassette
 
-# Enums opcionales (SDKs nuevos). Si no existen, los manejamos con fallback.
 try:
-    from google.generativeai.types import HarmCategory, HarmBlockThreshold
-except Exception:
-    HarmCategory = None
-    HarmBlockThreshold = None
+    from services.metrics import GEMINI_SECONDS, FALLBACKS
+    from services.tracing import span, traced
+except ImportError:
+    from metrics import GEMINI_SECONDS, FALLBACKS
+    from tracing import span, traced
+
+# Gemini es opcional: si no hay API KEY, el bot sigue con fallback determinista.
+# El SDK (~1 s de import) se carga en el primer uso, no al importar este módulo.
+genai = None
+HarmCategory = None
+HarmBlockThreshold = None
+_genai_lock = threading.Lock()
+_genai_loaded = False
 
 load_dotenv()
 
+log = logging.getLogger("bot.gemini_client")
+
 API_KEY = os.getenv("GOOGLE_API_KEY")
 # Modelo principal (rápido)
 MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
@@ -36,13 +47,36 @@ MAX_TOKENS = int(os.getenv("GEMINI_MAX_TOKENS", "600"))
 USE_SAFETY = os.getenv("GEMINI_SAFETY_RELAXED", "false").lower() == "true"
 
 if not API_KEY:
-    print("⚠️ GOOGLE_API_KEY no configurada (modo básico sin IA)", flush=True)
+    log.warning("⚠️ GOOGLE_API_KEY no configurada (modo básico sin IA)")
 
-if API_KEY and genai:
-    try:
-        genai.configure(api_key=API_KEY)
-    except Exception as e:
-        print(f"⚠️ No se pudo configurar Gemini: {e}", flush=True)
+
+
+def _load_genai():
+    """Importa y configura google.generativeai una sola vez. None si no está disponible."""
+    global genai, HarmCategory, HarmBlockThreshold, _genai_loaded
+    if _genai_loaded:
+        return genai
+    with _genai_lock:
+        if _genai_loaded:
+            return genai
+        try:
+            import google.generativeai as _genai
+        except Exception:
+            _genai = None
+        # Enums opcionales (SDKs nuevos). Si no existen, los manejamos con fallback.
+        try:
+            from google.generativeai.types import HarmCategory as _hc, HarmBlockThreshold as _hbt
+            HarmCategory, HarmBlockThreshold = _hc, _hbt
+        except Exception:
+            pass
+        if API_KEY and _genai:
+            try:
+                _genai.configure(api_key=API_KEY)
+            except Exception as e:
+                log.warning("⚠️ No se pudo configurar Gemini: %s", e)
+        genai = _genai
+        _genai_loaded = True
+    return genai
 
 
 def _clean_json_block(s: str) -> str:
@@ -85,6 +119,16 @@ def _safe_json_loads(s: str) -> Optional[Dict[str, Any]]:
             return None
 
 
+def _usage_metadata(resp) -> Optional[Dict[str, int]]:
+    """Tokens reales de la respuesta (usage_metadata), si el SDK los expone."""
+    usage = getattr(resp, "usage_metadata", None)
+    tokens_in = getattr(usage, "prompt_token_count", None)
+    tokens_out = getattr(usage, "candidates_token_count", None)
+    if not tokens_in and not tokens_out:
+        return None
+    return {"tokens_in": int(tokens_in or 0), "tokens_out": int(tokens_out or 0)}
+
+
 def _mk_safety_settings():
     """
     Devuelve safety_settings compatibles con SDKs nuevos (enums).
@@ -107,8 +151,44 @@ def _mk_safety_settings():
 class GeminiClient:
     """Cliente de IA conversacional para el bot de RRHH (cálido + robusto)."""
 
-    def __init__(self):
-        self.model = None
+    def __init__(self, cassette: Optional[Cassette] = None):
+        # El modelo se construye en el primer uso (o en warm_up, desde un hilo al arrancar)
+        self._model = None
+        self._model_ready = not API_KEY
+        self._model_lock = threading.Lock()
+        # Grabación / reproducción de llamadas (GEMINI_CASSETTE_MODE); "off" no cuesta nada
+        self.cassette = cassette if cassette is not None else Cassette()
+        self._last_call = threading.local()
+
+    @property
+    def model(self):
+        if not self._model_ready:
+            self._init_model()
+        return self._model
+
+    @model.setter
+    def model(self, value) -> None:
+        self._model = value
+        self._model_ready = True
+
+    @property
+    def available(self) -> bool:
+        """Hay IA: modelo real, o cassette en replay (sin red ni API key)."""
+        return self.cassette.replaying or self.model is not None
+
+    def warm_up(self) -> bool:
+        """Importa el SDK y construye el modelo ya (se llama en segundo plano al arrancar)."""
+        return self.model is not None
+
+    def _init_model(self) -> None:
+        with self._model_lock:
+            if self._model_ready:
+                return
+            self._model = self._build_model()
+            self._model_ready = True
+
+    def _build_model(self):
+        genai = _load_genai()
         if API_KEY and genai:
             try:
                 safety_settings = _mk_safety_settings()  # None si el SDK no soporta enums o no se pidió
@@ -137,18 +217,18 @@ class GeminiClient:
                 if safety_settings:
                     kwargs["safety_settings"] = safety_settings  # solo si seguro
 
-                self.model = genai.GenerativeModel(**kwargs)
+                model = genai.GenerativeModel(**kwargs)
 
-                print(
-                    f"✅ Gemini inicializado: {MODEL_NAME} (temp={TEMPERATURE}, max={MAX_TOKENS})"
-                    + (" con safety relajado" if safety_settings else " sin safety explícito"),
-                    flush=True,
+                log.info(
+                    "✅ Gemini inicializado: %s (temp=%s, max=%s) %s", MODEL_NAME, TEMPERATURE, MAX_TOKENS,
+                    "con safety relajado" if safety_settings else "sin safety explícito",
                 )
+                return model
             except Exception as e:
-                print(f"❌ Error inicializando Gemini: {e}", flush=True)
-                self.model = None
-        else:
-            print("⚠️ Gemini no disponible - operando con fallback determinista", flush=True)
+                log.error("❌ Error inicializando Gemini: %s", e)
+                return None
+        log.warning("⚠️ Gemini no disponible - operando con fallback determinista")
+        return None
 
     # ─────────────────────────────────────────────────────────────
     # Núcleo de generación (robusto ante cambios del SDK)
@@ -169,10 +249,9 @@ class GeminiClient:
             fr = getattr(cand, "finish_reason", None)
             fr_val = str(fr).lower() if fr is not None else ""
             if any(k in fr_val for k in ["safety", "blocklist", "prohibited", "spii"]):
-                print(
-                    f"[Gemini] Bloqueado por finish_reason={fr}. "
-                    f"prompt_feedback={getattr(resp, 'prompt_feedback', None)}",
-                    flush=True,
+                log.warning(
+                    "Gemini bloqueado por finish_reason=%s. prompt_feedback=%s",
+                    fr, getattr(resp, "prompt_feedback", None),
                 )
                 return None
 
@@ -188,7 +267,26 @@ class GeminiClient:
 
         return None
 
+    @traced("gemini.generate")
     def _generate(self, prompt: str, retries: int = 2) -> Optional[str]:
+        """
+        Genera texto con Gemini, pasando por el cassette si está activo:
+        replay responde desde lo grabado; record graba el resultado de la llamada real.
+        """
+        cassette = self.cassette
+        if cassette.replaying:
+            return cassette.play(MODEL_NAME, prompt)
+        if not cassette.recording:
+            return self._generate_live(prompt, retries)
+
+        self._last_call.usage, self._last_call.model = None, MODEL_NAME
+        t0 = time.perf_counter()
+        text = self._generate_live(prompt, retries)
+        cassette.record(MODEL_NAME, prompt, text, time.perf_counter() - t0,
+                        usage=self._last_call.usage, answered_by=self._last_call.model)
+        return text
+
+    def _generate_live(self, prompt: str, retries: int = 2) -> Optional[str]:
         """
         Genera texto con Gemini. Incluye retry y fallback a modelo robusto.
         Flujo: Flash (retry) → Pro (fallback) → None
@@ -198,36 +296,49 @@ class GeminiClient:
 
         last_error = None
         for attempt in range(retries):
-            try:
-                resp = self.model.generate_content(prompt)
-                text = self._extract_text_from_response(resp)
-                if text:
-                    return text
-            except Exception as e:
-                last_error = e
-                error_msg = str(e).lower()
-                print(f"[Gemini Flash] Intento {attempt + 1}/{retries} falló: {e}", flush=True)
-
-                # Si la API key es inválida, no reintentar
-                if "leaked" in error_msg or "403" in error_msg or "invalid api key" in error_msg:
-                    print("[Gemini] API key inválida/revocada. Desactivando.", flush=True)
-                    self.model = None
-                    return None
+            with span("gemini.attempt", model=MODEL_NAME, attempt=attempt + 1) as sp:
+                t0, outcome = time.perf_counter(), "error"
+                try:
+                    resp = self.model.generate_content(prompt)
+                    self._last_call.usage = _usage_metadata(resp)
+                    text = self._extract_text_from_response(resp)
+                    outcome = "ok" if text else "empty"
+                    if text:
+                        return text
+                except Exception as e:
+                    last_error = e
+                    error_msg = str(e).lower()
+                    log.warning("Gemini %s: intento %d/%d falló: %s", MODEL_NAME, attempt + 1, retries, e)
+                    sp.set(error=str(e)[:200])
+
+                    # Si la API key es inválida, no reintentar
+                    if "leaked" in error_msg or "403" in error_msg or "invalid api key" in error_msg:
+                        log.error("Gemini: API key inválida/revocada. Desactivando.")
+                        self.model = None
+                        return None
+                finally:
+                    GEMINI_SECONDS.observe(time.perf_counter() - t0, MODEL_NAME, outcome)
+                    sp.set(outcome=outcome)
 
             # Pausa antes de reintentar (solo si no es el último intento)
             if attempt < retries - 1:
-                time.sleep(1.5)
+                with span("gemini.retry_wait"):
+                    time.sleep(1.5)
 
         # Si flash falló, intentar con modelo robusto
-        print(f"[Gemini] Flash agotó reintentos. Intentando con {FALLBACK_MODEL_NAME}...", flush=True)
-        return self._generate_fallback(prompt)
+        log.warning("Gemini: %s agotó reintentos. Intentando con %s...", MODEL_NAME, FALLBACK_MODEL_NAME)
+        FALLBACKS.inc("gemini_fallback_model")
+        with span("gemini.fallback", model=FALLBACK_MODEL_NAME):
+            return self._generate_fallback(prompt)
 
     def _generate_fallback(self, prompt: str) -> Optional[str]:
         """
         Modelo de respaldo: gemini-2.5-pro (más robusto, sin JSON mode forzado).
         """
+        genai = _load_genai()
         if not genai:
             return None
+        t0, outcome = time.perf_counter(), "error"
         try:
             fallback = genai.GenerativeModel(
                 model_name=FALLBACK_MODEL_NAME,
@@ -237,13 +348,17 @@ class GeminiClient:
                 },
             )
             resp = fallback.generate_content(prompt)
+            self._last_call.usage, self._last_call.model = _usage_metadata(resp), FALLBACK_MODEL_NAME
             text = self._extract_text_from_response(resp)
+            outcome = "ok" if text else "empty"
             if text:
-                print(f"[Gemini] ✅ Respaldo {FALLBACK_MODEL_NAME} respondió OK.", flush=True)
+                log.info("Gemini: ✅ respaldo %s respondió OK.", FALLBACK_MODEL_NAME)
             return text
         except Exception as e:
-            print(f"[Gemini Fallback Error] {e}", flush=True)
+            log.error("Gemini: error en respaldo %s: %s", FALLBACK_MODEL_NAME, e)
             return None
+        finally:
+            GEMINI_SECONDS.observe(time.perf_counter() - t0, FALLBACK_MODEL_NAME, outcome)
 
     # ─────────────────────────────────────────────────────────────
     # Extracción + Validación (primero IA, luego fallback amable)
@@ -265,7 +380,7 @@ class GeminiClient:
         }
         """
         # La IA es la primera capa
-        if self.model:
+        if self.available:
             history_text = ""
             if conversation_history:
                 for msg in conversation_history[-3:]:
@@ -278,10 +393,9 @@ class GeminiClient:
             
             if prompt:
                 result = self._generate(prompt)
-                print(
-                    f"[DEBUG-IA] {question_key} - USER: {user_response}  | RAW: {result[:200] if result else ''}",
-                    flush=True,
-                )
+                # Volumen alto y con PII: DEBUG (muestreado y redactado por services/logs.py)
+                log.debug("Respuesta IA para %s", question_key,
+                          extra={"text": user_response, "raw": result[:200] if result else ""})
 
                 if result:
                     data = _safe_json_loads(result)
@@ -301,9 +415,10 @@ class GeminiClient:
                             "bot_response": bot_response,
                         }
 
-                print("[DEBUG] IA no retornó JSON usable. Uso fallback determinista.", flush=True)
+                log.info("IA no retornó JSON usable. Uso fallback determinista.", extra={"question_key": question_key})
 
         # Fallback determinista (amable, entiende “sip/sep/ok/obvio/de una”, etc.)
+        FALLBACKS.inc("deterministic")
         return self._fallback_extraction(question_key, user_response, current_data)
 
     def _build_prompt(
@@ -568,7 +683,7 @@ JSON ESPERADO:
     # Conversación libre (post-completado)
     # ─────────────────────────────────────────────────────────────
     def respuesta_conversacional(self, user_message: str, context: str, company_info: dict) -> str:
-        if not self.model:
+        if not self.available:
             return (
                 "Gracias por escribirnos. Tu información ya fue registrada. "
                 "Nuestro equipo se comunicará contigo a la brevedad. 🙏"
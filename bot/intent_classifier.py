@@ -0,0 +1,338 @@
+# intent_classifier.py
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger("bot.intent_classifier")
+
+# --------------------------------------------------------------------------------
+# Clasificador local (TF-IDF de n-gramas de caracteres + regresión logística)
+# Capa intermedia entre las reglas deterministas y Gemini: resuelve en
+# microsegundos las respuestas "conocidas" que los regex no capturan.
+# --------------------------------------------------------------------------------
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "data/intent_model.json")
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.85"))
+INTENT_MIN_EXAMPLES = int(os.getenv("INTENT_MIN_EXAMPLES", "20"))
+
+_NGRAM_RANGE = (2, 4)
+_EPOCHS = 15
+_LEARNING_RATE = 0.5
+_L2 = 1e-4
+
+
+def _norm(s: str) -> str:
+    s = (s or "").strip().lower()
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    return re.sub(r"\s+", " ", s)
+
+
+def _ngrams(text: str) -> Dict[str, int]:
+    """Cuenta n-gramas de caracteres por palabra (con bordes ' ')."""
+    counts: Dict[str, int] = {}
+    lo, hi = _NGRAM_RANGE
+    for word in _norm(text).split(" "):
+        if not word:
+            continue
+        w = f" {word} "
+        for n in range(lo, hi + 1):
+            for i in range(len(w) - n + 1):
+                g = w[i:i + n]
+                counts[g] = counts.get(g, 0) + 1
+    return counts
+
+
+def _bool(v: Any) -> Optional[str]:
+    if v is True:
+        return "true"
+    if v is False:
+        return "false"
+    return None
+
+
+def _puesto_fields(label: str) -> Dict[str, Any]:
+    # Import diferido: ai_bot importa este módulo
+    try:
+        from .ai_bot import PUESTOS_BY_ID, PUESTO_UBICACION
+    except Exception:
+        from ai_bot import PUESTOS_BY_ID, PUESTO_UBICACION  # type: ignore
+    pid = int(label)
+    loc = PUESTO_UBICACION.get(pid, "Ambos")
+    return {
+        "puesto_id": pid,
+        "puesto_name": PUESTOS_BY_ID[pid]["name"],
+        "destino": loc.lower() if loc != "Ambos" else "ambos",
+    }
+
+
+# question_key -> (columna en postulantes, etiqueta desde la fila, campos de sesión desde etiqueta)
+LabelSpec = Tuple[str, Callable[[Any], Optional[str]], Callable[[str], Dict[str, Any]]]
+
+LABEL_SPECS: Dict[str, LabelSpec] = {
+    "genero": (
+        "genero",
+        lambda v: v if v in ("M", "F", "O") else None,
+        lambda l: {"genero": l},
+    ),
+    "tipo_documento": (
+        "tipo_documento",
+        lambda v: v if v in ("dni", "ce") else None,
+        lambda l: {"tipo_documento": l, "dni": l == "dni"},
+    ),
+    "secundaria": (
+        "secundaria_completa",
+        _bool,
+        lambda l: {"secundaria": l == "true"},
+    ),
+    "trabajo_hermes": (
+        "ha_trabajado_en_hermes",
+        _bool,
+        lambda l: {"ha_trabajado_en_hermes": l == "true"},
+    ),
+    "modalidad": (
+        "modalidad_trabajo",
+        lambda v: v if v in ("tiempo_completo", "medio_tiempo", "intermitente") else None,
+        lambda l: {"modalidad_trabajo": l},
+    ),
+    "lugar_residencia": (
+        "origen",
+        lambda v: v if v in ("lima", "provincia") else None,
+        lambda l: (
+            {"lugar_residencia": "Lima", "origen": "lima", "ciudad_residencia": "Lima"}
+            if l == "lima" else {"lugar_residencia": "Provincia", "origen": "provincia"}
+        ),
+    ),
+    "licencia": (
+        "tiene_licencia",
+        _bool,
+        lambda l: {"licencia": l == "true"},
+    ),
+    "puesto": (
+        "puesto_id",
+        lambda v: str(v) if isinstance(v, int) and 1 <= v <= 18 else None,
+        _puesto_fields,
+    ),
+    "disponibilidad": (
+        "disponibilidad_inmediata",
+        _bool,
+        lambda l: {"disponibilidad": l == "true"},
+    ),
+    "medio_captacion": (
+        "medio_captacion",
+        lambda v: v if v in (
+            "tiktok", "canal_whatsapp", "correo", "volante", "qr",
+            "facebook", "referido", "instagram", "otros",
+        ) else None,
+        lambda l: {"medio_captacion": l},
+    ),
+}
+
+
+class _KeyModel:
+    """Modelo lineal (softmax) sobre TF-IDF disperso para un question_key."""
+
+    def __init__(self, classes: List[str], idf: Dict[str, float], weights: Dict[str, Dict[str, float]],
+                 bias: Dict[str, float]) -> None:
+        self.classes = classes
+        self.idf = idf
+        self.weights = weights  # ngram -> {clase: peso}
+        self.bias = bias
+
+    def _vector(self, text: str) -> Dict[str, float]:
+        vec: Dict[str, float] = {}
+        for g, c in _ngrams(text).items():
+            idf = self.idf.get(g)
+            if idf is not None:
+                vec[g] = (1.0 + math.log(c)) * idf
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        if norm:
+            for g in vec:
+                vec[g] /= norm
+        return vec
+
+    def _scores(self, vec: Dict[str, float]) -> Dict[str, float]:
+        scores = dict(self.bias)
+        for g, x in vec.items():
+            for cls, w in self.weights.get(g, {}).items():
+                scores[cls] += w * x
+        return scores
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        vec = self._vector(text)
+        if not vec:
+            return {}
+        scores = self._scores(vec)
+        m = max(scores.values())
+        exp = {c: math.exp(s - m) for c, s in scores.items()}
+        z = sum(exp.values())
+        return {c: e / z for c, e in exp.items()}
+
+    @classmethod
+    def train(cls, samples: List[Tuple[str, str]], seed: int = 7) -> "_KeyModel":
+        classes = sorted({y for _, y in samples})
+        df: Dict[str, int] = {}
+        for text, _ in samples:
+            for g in _ngrams(text):
+                df[g] = df.get(g, 0) + 1
+        n = len(samples)
+        idf = {g: math.log((1 + n) / (1 + d)) + 1.0 for g, d in df.items()}
+        model = cls(classes, idf, {}, {c: 0.0 for c in classes})
+
+        data = [(model._vector(t), y) for t, y in samples]
+        rng = random.Random(seed)
+        for epoch in range(_EPOCHS):
+            rng.shuffle(data)
+            lr = _LEARNING_RATE / (1 + epoch * 0.5)
+            for vec, y in data:
+                scores = model._scores(vec)
+                m = max(scores.values())
+                exp = {c: math.exp(s - m) for c, s in scores.items()}
+                z = sum(exp.values())
+                for c in classes:
+                    grad = exp[c] / z - (1.0 if c == y else 0.0)
+                    if abs(grad) < 1e-6:
+                        continue
+                    model.bias[c] -= lr * grad
+                    for g, x in vec.items():
+                        row = model.weights.setdefault(g, {})
+                        w = row.get(c, 0.0)
+                        row[c] = w - lr * (grad * x + _L2 * w)
+
+        # Poda de pesos despreciables (modelo más chico y predicción más rápida)
+        for g in list(model.weights):
+            row = {c: round(w, 5) for c, w in model.weights[g].items() if abs(w) > 1e-3}
+            if row:
+                model.weights[g] = row
+            else:
+                del model.weights[g]
+        return model
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"classes": self.classes, "idf": self.idf, "weights": self.weights, "bias": self.bias}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "_KeyModel":
+        return cls(d["classes"], d["idf"], d["weights"], d["bias"])
+
+
+class IntentClassifier:
+    """Colección de modelos por question_key, entrenados con respuestas_raw almacenadas."""
+
+    def __init__(self, models: Optional[Dict[str, _KeyModel]] = None,
+                 min_confidence: float = INTENT_MIN_CONFIDENCE) -> None:
+        self.models: Dict[str, _KeyModel] = models or {}
+        self.min_confidence = min_confidence
+
+    def __len__(self) -> int:
+        return len(self.models)
+
+    def predict(self, question_key: str, text: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Devuelve (campos_de_sesión, confianza) si el modelo está seguro; None si no.
+        """
+        model = self.models.get(question_key)
+        if model is None or not text:
+            return None
+        proba = model.predict_proba(text)
+        if not proba:
+            return None
+        label, conf = max(proba.items(), key=lambda kv: kv[1])
+        if conf < self.min_confidence:
+            return None
+        return LABEL_SPECS[question_key][2](label), conf
+
+    # ------------- Entrenamiento -------------
+    @staticmethod
+    def samples_from_rows(rows: Iterable[Dict[str, Any]]) -> Dict[str, List[Tuple[str, str]]]:
+        """Arma (texto, etiqueta) por question_key desde filas de postulantes."""
+        out: Dict[str, List[Tuple[str, str]]] = {k: [] for k in LABEL_SPECS}
+        for row in rows:
+            raw = row.get("respuestas_raw")
+            if isinstance(raw, str):
+                try:
+                    raw = json.loads(raw)
+                except Exception:
+                    continue
+            if not isinstance(raw, dict):
+                continue
+            for key, (column, to_label, _) in LABEL_SPECS.items():
+                text = raw.get(key)
+                label = to_label(row.get(column))
+                if text and label is not None:
+                    out[key].append((str(text), label))
+        return out
+
+    @classmethod
+    def train(cls, rows: Iterable[Dict[str, Any]], min_examples: int = INTENT_MIN_EXAMPLES) -> "IntentClassifier":
+        models: Dict[str, _KeyModel] = {}
+        for key, samples in cls.samples_from_rows(rows).items():
+            if len(samples) < min_examples or len({y for _, y in samples}) < 2:
+                continue
+            models[key] = _KeyModel.train(samples)
+        return cls(models)
+
+    # ------------- Persistencia -------------
+    def save(self, path: str = INTENT_MODEL_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({k: m.to_dict() for k, m in self.models.items()}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = INTENT_MODEL_PATH) -> Optional["IntentClassifier"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            return cls({k: _KeyModel.from_dict(v) for k, v in raw.items() if k in LABEL_SPECS})
+        except Exception as e:
+            log.warning("⚠️ No se pudo cargar clasificador local (%s): %s", path, e)
+            return None
+
+
+# --------------------------------------------------------------------------------
+# CLI: python -m bot.intent_classifier [limite]
+# Entrena con los postulantes almacenados y guarda el modelo en INTENT_MODEL_PATH.
+# --------------------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    limit = int(argv[0]) if argv else 100000
+    try:
+        from database import Database, SUPABASE_TIMEOUT_S
+    except ImportError:
+        from services.database import Database, SUPABASE_TIMEOUT_S  # type: ignore
+    try:
+        from services.export import iter_postulantes
+    except ImportError:
+        from export import iter_postulantes  # type: ignore
+
+    t0 = time.perf_counter()
+    # Por páginas con cursor: PostgREST corta cada respuesta en 1000 filas
+    rows: List[Dict[str, Any]] = []
+    for page in iter_postulantes(Database(wait_s=SUPABASE_TIMEOUT_S)):
+        rows.extend(page[:limit - len(rows)])
+        if len(rows) >= limit:
+            break
+    clf = IntentClassifier.train(rows)
+    clf.save()
+    print(
+        f"✅ Clasificador local entrenado con {len(rows)} postulantes "
+        f"({', '.join(sorted(clf.models)) or 'sin modelos'}) en {time.perf_counter() - t0:.1f}s → {INTENT_MODEL_PATH}",
+        flush=True,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
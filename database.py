@@ -1,69 +1,259 @@
 # database.py
 from __future__ import annotations
 
+import logging
 import os
 import json
+import time
+import base64
+import hashlib
+import threading
+import importlib.util
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+log = logging.getLogger("database")
+
 # Config Supabase (lazy)
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_AVAILABLE = bool(SUPABASE_URL and SUPABASE_KEY)
 
+# El SDK de Supabase (~0.4 s de import) se carga en el hilo de conexión, no al importar
+SUPABASE_SDK = importlib.util.find_spec("supabase") is not None
+
 try:
-    from supabase import create_client, Client
-except Exception:
-    Client = None  # type: ignore
+    from services.local_log import AppendLog, LOCAL_LOG_FILE, LEGACY_JSON_FILE
+    from services.sqlite_store import SQLiteStore, COLUMN_TYPES
+    from services.reservations import InMemoryReservations, SQLiteReservations, SupabaseReservations, FailoverReservations
+    from services.outbox import Outbox
+    from services.phone_cache import PhoneCache, MISSING
+    from services.metrics import DB_SECONDS, timed
+    from services.tracing import traced
+except ImportError:
+    from local_log import AppendLog, LOCAL_LOG_FILE, LEGACY_JSON_FILE
+    from sqlite_store import SQLiteStore, COLUMN_TYPES
+    from reservations import InMemoryReservations, SQLiteReservations, SupabaseReservations, FailoverReservations
+    from outbox import Outbox
+    from phone_cache import PhoneCache, MISSING
+    from metrics import DB_SECONDS, timed
+    from tracing import traced
 
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+# Backend local cuando no hay Supabase: "sqlite" (por defecto) o "jsonl"
+LOCAL_BACKEND = os.getenv("LOCAL_BACKEND", "sqlite").lower()
+# Pool HTTP del cliente Supabase (conexiones reutilizadas entre requests)
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "10"))
+SUPABASE_KEEPALIVE_S = float(os.getenv("SUPABASE_KEEPALIVE", "60"))
+SUPABASE_TIMEOUT_S = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+# Sonda de salud: mantiene viva la conexión y detecta caída / recuperación
+SUPABASE_HEALTH_INTERVAL_S = float(os.getenv("SUPABASE_HEALTH_INTERVAL", "30"))
 
-class Database:
-    """Gestor de base de datos para postulantes (Supabase ↔ JSON local fallback)."""
 
-    def __init__(self) -> None:
+class Database:
+    """Gestor de base de datos para postulantes (Supabase ↔ SQLite / log JSONL local fallback)."""
+
+    def __init__(self, wait_s: float = 0.0) -> None:
+        """
+        No toca la red: la conexión a Supabase se abre y valida en un hilo
+        (sonda de salud). Mientras no responde se usa el almacén local;
+        `wait_s` permite a los scripts CLI esperar a la primera sonda.
+        """
         self.use_supabase = False
-        self.client: Optional[Client] = None
-
-        if SUPABASE_AVAILABLE and Client is not None:
-            try:
-                self.client = create_client(SUPABASE_URL, SUPABASE_KEY)  # type: ignore
-                # ping simple para validar acceso
-                self.client.table("postulantes").select("phone_number").limit(1).execute()  # type: ignore
-                self.use_supabase = True
-                print("✅ Supabase conectado", flush=True)
-            except Exception as e:
-                print(f"⚠️ Error conectando Supabase (modo local): {e}", flush=True)
-                self._init_local_storage()
+        self.client: Optional[Any] = None
+        self.outbox: Optional[Outbox] = None
+        # Versión de escritura: la sube cada guardado; invalida la caché de respuestas (app.py)
+        self.version = 0
+        self._version_lock = threading.Lock()
+        # teléfono → última postulación (se consulta en cada mensaje entrante)
+        self.phones = PhoneCache()
+        self._local_lock = threading.Lock()
+        self._reservations: Dict[str, Any] = {}
+        self._failover: Optional[FailoverReservations] = None
+        # Últimos confirmados por día vistos en Supabase: base del aforo local mientras no responde
+        self._known_counts: Dict[str, int] = {}
+        # Estado de Supabase: disabled | connecting | up | down
+        self.supabase_state = "disabled"
+        self.last_probe: Optional[float] = None
+        self.last_probe_error: Optional[str] = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+
+        if SUPABASE_AVAILABLE and SUPABASE_SDK:
+            self.supabase_state = "connecting"
+            # Escrituras rechazadas por Supabase se reintentan desde aquí (no van al store local)
+            self.outbox = Outbox(push=self._replay_to_supabase)
+            threading.Thread(target=self._health_loop, name="supabase-health", daemon=True).start()
+            if wait_s:
+                self._ready.wait(wait_s)
         else:
-            print("⚠️ Supabase no configurado - usando almacenamiento local", flush=True)
+            log.warning("⚠️ Supabase no configurado - usando almacenamiento local")
             self._init_local_storage()
+            self._ready.set()
+
+    # ─────────────────────────────────────────────────────────────
+    # Conexión Supabase (perezosa, con pool y sonda de salud)
+    # ─────────────────────────────────────────────────────────────
+    @staticmethod
+    def _create_client() -> Any:
+        """Cliente Supabase sobre un httpx.Client con pool y keep-alive explícitos."""
+        from supabase import create_client
+        try:
+            import httpx
+            from supabase import ClientOptions
+        except Exception:
+            httpx = ClientOptions = None  # type: ignore
+        if httpx is not None and ClientOptions is not None:
+            http = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=SUPABASE_POOL_SIZE,
+                    max_keepalive_connections=SUPABASE_POOL_SIZE,
+                    keepalive_expiry=SUPABASE_KEEPALIVE_S,
+                ),
+                timeout=SUPABASE_TIMEOUT_S,
+            )
+            try:
+                return create_client(SUPABASE_URL, SUPABASE_KEY, ClientOptions(httpx_client=http))  # type: ignore
+            except TypeError:
+                http.close()  # supabase sin httpx_client en ClientOptions: pool por defecto
+        return create_client(SUPABASE_URL, SUPABASE_KEY)  # type: ignore
+
+    def _probe(self) -> bool:
+        """Ping a Supabase; cambia de backend solo en las transiciones arriba/abajo."""
+        try:
+            if self.client is None:
+                self.client = self._create_client()
+            self.client.table("postulantes").select("phone_number").limit(1).execute()  # type: ignore
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+        self.last_probe = time.time()
+        self.last_probe_error = error
+        if ok and not self.use_supabase:
+            self.use_supabase = True
+            self.supabase_state = "up"
+            log.info("✅ Supabase conectado")
+            self._backend_changed()
+            if self._failover is not None:
+                # Antes que la outbox: el contador del día se siembra sin esas filas y no cuenta dos veces
+                self._failover.replay(self._failover.pick())
+            if self.outbox is not None:
+                self.outbox.replay(force=True)
+        elif not ok and self.supabase_state != "down":
+            self.use_supabase = False
+            self.supabase_state = "down"
+            log.warning("⚠️ Supabase no disponible (modo local): %s", error)
+            self._ensure_local_ready()
+            self._backend_changed()
+        return ok
+
+    def _health_loop(self) -> None:
+        while not self._stop.is_set():
+            self._probe()
+            self._ready.set()
+            # La sonda periódica también mantiene caliente la conexión del pool (< keepalive)
+            self._stop.wait(SUPABASE_HEALTH_INTERVAL_S)
+
+    def _backend_changed(self) -> None:
+        # Lo cacheado vino del otro backend
+        self.phones.invalidate()
+        self._bump_version()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """True cuando ya se resolvió la primera sonda (o no hay Supabase configurado)."""
+        return self._ready.wait(timeout)
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "backend": "supabase" if self.use_supabase else "local",
+            "supabase": self.supabase_state,
+            "last_probe": self.last_probe,
+            "last_error": self.last_probe_error,
+        }
+
+    def close(self) -> None:
+        self._stop.set()
+        if self.outbox is not None:
+            self.outbox.close()
 
     # ─────────────────────────────────────────────────────────────
-    # Local JSON fallback
+    # Local fallback (services/sqlite_store.py o services/local_log.py)
     # ─────────────────────────────────────────────────────────────
     def _init_local_storage(self) -> None:
-        self.local_file = "data/postulantes.json"
-        os.makedirs("data", exist_ok=True)
-        if not os.path.exists(self.local_file):
-            with open(self.local_file, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False)
+        if LOCAL_BACKEND == "jsonl":
+            self.local = AppendLog()
+        else:
+            self.local = SQLiteStore(import_from=self._previous_local_rows)
+        self.local_file = self.local.path
+
+    @staticmethod
+    def _previous_local_rows() -> List[Dict[str, Any]]:
+        """Filas del almacén local previo (JSON legado o log JSONL) para migrar a SQLite."""
+        if not (os.path.exists(LOCAL_LOG_FILE) or os.path.exists(LEGACY_JSON_FILE)):
+            return []
+        legacy = AppendLog()
+        try:
+            return legacy.rows()
+        finally:
+            legacy.close()
 
     def _ensure_local_ready(self) -> None:
-        if not hasattr(self, "local_file"):
-            self._init_local_storage()
-        if not os.path.exists(self.local_file):
-            with open(self.local_file, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False)
+        if not hasattr(self, "local"):
+            with self._local_lock:  # la sonda de salud puede llegar a la vez que un request
+                if not hasattr(self, "local"):
+                    self._init_local_storage()
+
+    def make_reservations(self, capacity: int) -> Any:
+        """Reservas atómicas de cupos de entrevista sobre el mismo backend que los postulantes."""
+        if self.supabase_state == "disabled":
+            return self._reservations_backend(capacity)
+        if self._failover is None:
+            self._failover = FailoverReservations(lambda: self._reservations_backend(capacity))
+        return self._failover
+
+    def _reservations_backend(self, capacity: int) -> Any:
+        if self.supabase_state == "connecting":
+            self._ready.wait(SUPABASE_TIMEOUT_S)  # sin la primera sonda no sabemos qué aforo vale
+        kind = "supabase" if self.use_supabase and self.client is not None else "local"
+        backend = self._reservations.get(kind)
+        if backend is None:
+            if kind == "supabase":
+                backend = SupabaseReservations(self.client, capacity)
+            else:
+                self._ensure_local_ready()
+                if isinstance(self.local, SQLiteStore):
+                    backend = SQLiteReservations(self.local.path, capacity)
+                else:
+                    backend = InMemoryReservations(capacity, baseline=self.local.count_confirmed_for_date)
+                # El almacén local no tiene las filas de Supabase: partimos de lo último que vimos allí
+                for day, n in list(self._known_counts.items()):
+                    backend.seed(day, n)
+            self._reservations[kind] = backend
+        return backend
+
+    def _note_counts(self, counts: Dict[str, int]) -> None:
+        """Recuerda los confirmados leídos de Supabase (y los propaga al aforo local si ya existe)."""
+        self._known_counts.update(counts)
+        local = self._reservations.get("local")
+        if local is not None:
+            for day, n in counts.items():
+                local.seed(day, n)
 
     # ─────────────────────────────────────────────────────────────
     # Esquema de payload
     # ─────────────────────────────────────────────────────────────
+    @staticmethod
+    def _clean_phone(phone_number: str) -> str:
+        return phone_number.replace("@c.us", "").replace("@s.whatsapp.net", "").replace("@lid", "")
+
     def _build_payload(self, phone_number: str, session_data: Dict[str, Any]) -> Dict[str, Any]:
-        clean_phone = phone_number.replace("@c.us", "").replace("@s.whatsapp.net", "").replace("@lid", "")
+        clean_phone = self._clean_phone(phone_number)
 
         data = session_data.get("data", {}) or {}
         raw_answers = session_data.get("raw_answers", {}) or {}
@@ -109,6 +299,10 @@ class Database:
             "fecha_postulacion": (session_data.get("completion_time") or datetime.now()).isoformat(),
             # created_at lo pone la DB (DEFAULT now())
         }
+        # Misma postulación ⇒ misma clave: los reintentos (outbox / journal) no duplican filas
+        payload["idempotency_key"] = hashlib.sha1(
+            f"{clean_phone}|{payload['fecha_postulacion']}".encode("utf-8")
+        ).hexdigest()
         return payload
 
     # ─────────────────────────────────────────────────────────────
@@ -140,81 +334,177 @@ class Database:
     # ─────────────────────────────────────────────────────────────
     # Escritura
     # ─────────────────────────────────────────────────────────────
+    @timed(DB_SECONDS, "save_postulante")
+    @traced("db.save_postulante")
     def save_postulante(self, phone_number: str, session_data: Dict[str, Any]) -> bool:
         try:
             payload = self._build_payload(phone_number, session_data)
 
             if self.use_supabase and self.client is not None:
                 try:
-                    self.client.table("postulantes").insert(payload).execute()  # type: ignore
-                    print(f"✅ Postulante guardado en Supabase: {payload['phone_number']}", flush=True)
+                    self._upsert_supabase([payload])
+                    self.remember_postulante(payload)
+                    log.info("✅ Postulante guardado en Supabase: %s", payload['phone_number'])
                     return True
                 except Exception as e:
-                    print(f"❌ Error en Supabase INSERT (fallback local): {e}", flush=True)
+                    if self.outbox is not None:
+                        log.error("❌ Error en Supabase INSERT (a outbox): %s", e)
+                        self.outbox.add([payload], str(e))
+                        self.remember_postulante(payload)
+                        return True
+                    log.error("❌ Error en Supabase INSERT (fallback local): %s", e)
+            elif self.outbox is not None:
+                # Supabase configurado pero conectando / caído: llega cuando vuelva
+                self.outbox.add([payload], f"supabase {self.supabase_state}")
+                self.remember_postulante(payload)
+                return True
 
             # Fallback local
             self._ensure_local_ready()
             return self._save_to_local(payload)
 
         except Exception as e:
-            print(f"❌ Error guardando postulante: {e}", flush=True)
+            log.error("❌ Error guardando postulante: %s", e)
             return False
 
+    @timed(DB_SECONDS, "save_postulantes_batch")
+    @traced("db.save_postulantes_batch")
+    def save_postulantes_batch(self, payloads: List[Dict[str, Any]]) -> bool:
+        """Inserta varios payloads ya armados (_build_payload) en una sola operación."""
+        if not payloads:
+            return True
+        if self.use_supabase and self.client is not None:
+            try:
+                self._upsert_supabase(payloads)
+                for p in payloads:
+                    self.remember_postulante(p)
+                log.info("✅ %s postulantes guardados en Supabase", len(payloads))
+                return True
+            except Exception as e:
+                if self.outbox is not None:
+                    log.error("❌ Error en Supabase INSERT por lote (a outbox): %s", e)
+                    self.outbox.add(payloads, str(e))
+                    for p in payloads:
+                        self.remember_postulante(p)
+                    return True
+                log.error("❌ Error en Supabase INSERT por lote (fallback local): %s", e)
+        elif self.outbox is not None:
+            self.outbox.add(payloads, f"supabase {self.supabase_state}")
+            for p in payloads:
+                self.remember_postulante(p)
+            return True
+
+        self._ensure_local_ready()
+        try:
+            self.local.insert_many(payloads)
+            for p in payloads:
+                self.remember_postulante(p)
+            log.info("✅ %s postulantes guardados localmente", len(payloads))
+            return True
+        except Exception as e:
+            log.error("❌ Error guardando lote local: %s", e)
+            return False
+
+    @timed(DB_SECONDS, "update_es_apto")
+    @traced("db.update_es_apto")
+    def update_es_apto(self, row_ids: List[int], es_apto: bool) -> int:
+        """Fija es_apto en bloque para `row_ids` (re-evaluación masiva). Devuelve filas afectadas."""
+        if not row_ids:
+            return 0
+        if self.use_supabase and self.client is not None:
+            n = 0
+            for i in range(0, len(row_ids), 500):
+                chunk = row_ids[i:i + 500]
+                res = self.client.table("postulantes").update({"es_apto": es_apto}).in_("id", chunk).execute()  # type: ignore
+                n += len(getattr(res, "data", None) or [])  # filas que existían (las borradas no cuentan)
+        else:
+            self._ensure_local_ready()
+            n = self.local.update_many(row_ids, {"es_apto": es_apto})
+        self._bump_version()
+        self.phones.invalidate()
+        return n
+
+    def _bump_version(self) -> None:
+        with self._version_lock:
+            self.version += 1
+
+    def _replay_to_supabase(self, payloads: List[Dict[str, Any]]) -> None:
+        if self.client is None:
+            raise ConnectionError("Supabase aún no conectado")
+        self._upsert_supabase(payloads)
+        self._bump_version()
+
+    def _upsert_supabase(self, payloads: List[Dict[str, Any]]) -> None:
+        """INSERT idempotente: una fila con idempotency_key ya existente se ignora."""
+        self.client.table("postulantes").upsert(  # type: ignore
+            payloads, on_conflict="idempotency_key", ignore_duplicates=True
+        ).execute()
+
     def _save_to_local(self, postulante: Dict[str, Any]) -> bool:
         try:
-            with open(self.local_file, "r", encoding="utf-8") as f:
-                rows = json.load(f)
-            rows.append(postulante)
-            with open(self.local_file, "w", encoding="utf-8") as f:
-                json.dump(rows, f, indent=2, ensure_ascii=False)
-            print(f"✅ Postulante guardado localmente: {postulante['phone_number']}", flush=True)
+            self.local.insert(postulante)
+            self.remember_postulante(postulante)
+            log.info("✅ Postulante guardado localmente: %s", postulante['phone_number'])
             return True
         except Exception as e:
-            print(f"❌ Error guardando local: {e}", flush=True)
+            log.error("❌ Error guardando local: %s", e)
             return False
 
     # ─────────────────────────────────────────────────────────────
     # Lectura
     # ─────────────────────────────────────────────────────────────
-    def get_postulante(self, phone_number: str) -> Optional[Dict[str, Any]]:
-        clean_phone = phone_number.replace("@c.us", "").replace("@s.whatsapp.net", "")
+    @timed(DB_SECONDS, "get_postulante")
+    @traced("db.get_postulante")
+    def get_postulante(self, phone_number: str, strict: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Última postulación del teléfono (vía caché LRU; una sola consulta indexada si no está).
+        Con `strict`, un error de la BD se propaga en vez de devolver None ("no postuló").
+        """
+        clean_phone = self._clean_phone(phone_number)
+        cached = self.phones.get(clean_phone)
+        if cached is not MISSING:
+            return cached
+        generation = self.phones.generation
         try:
             if self.use_supabase and self.client is not None:
-                # Preferir orden por id (robusto)
-                try:
-                    res = (
-                        self.client.table("postulantes")
-                        .select("*")
-                        .eq("phone_number", clean_phone)
-                        .order("id", desc=True)  # type: ignore
-                        .limit(1)
-                        .execute()
-                    )
-                except Exception:
-                    res = (
-                        self.client.table("postulantes")
-                        .select("*")
-                        .eq("phone_number", clean_phone)
-                        .order("created_at", desc=True)  # type: ignore
-                        .limit(1)
-                        .execute()
-                    )
+                res = (
+                    self.client.table("postulantes")
+                    .select("*")
+                    .eq("phone_number", clean_phone)
+                    .order("id", desc=True)  # type: ignore
+                    .limit(1)
+                    .execute()
+                )
                 data = getattr(res, "data", None) or []
-                return data[0] if data else None
-
-            # Local
-            self._ensure_local_ready()
-            with open(self.local_file, "r", encoding="utf-8") as f:
-                rows: List[Dict[str, Any]] = json.load(f)
-            for p in reversed(rows):
-                if p.get("phone_number") == clean_phone:
-                    return p
-            return None
-
+                row = data[0] if data else None
+            else:
+                # Local (consulta indexada por teléfono)
+                self._ensure_local_ready()
+                row = self.local.get_latest(clean_phone)
         except Exception as e:
-            print(f"❌ Error obteniendo postulante: {e}", flush=True)
+            log.error("❌ Error obteniendo postulante: %s", e)
+            if strict:
+                raise
             return None
-
+        self.phones.put(clean_phone, row, generation)
+        return row
+
+    def peek_postulante(self, phone_number: str) -> Any:
+        """Solo caché, sin E/S: la fila, None (no postuló) o MISSING (no se sabe aún)."""
+        return self.phones.get(self._clean_phone(phone_number))
+
+    def remember_postulante(self, payload: Dict[str, Any]) -> None:
+        """
+        Actualiza la caché de teléfonos con una postulación recién guardada/encolada
+        (outbox y write-behind incluidos) y sube la versión: las respuestas cacheadas
+        (ETag) de /postulantes/<phone> dejan de valer aunque la fila aún no esté en la BD.
+        """
+        if payload.get("phone_number"):
+            self.phones.put(payload["phone_number"], payload)
+        self._bump_version()
+
+    @timed(DB_SECONDS, "get_count_for_date")
+    @traced("db.get_count_for_date")
     def get_count_for_date(self, date_iso: str) -> int:
         """Cuenta postulantes confirmados para una fecha específica (YYYY-MM-DD)."""
         try:
@@ -238,58 +528,175 @@ class Database:
 
             # Local
             self._ensure_local_ready()
-            with open(self.local_file, "r", encoding="utf-8") as f:
-                rows: List[Dict[str, Any]] = json.load(f)
-
-            count = 0
-            for r in rows:
-                if r.get("confirmacion_asistencia") is True:
-                    fecha = r.get("fecha_entrevista")
-                    if fecha and fecha.startswith(target_date):
-                        count += 1
-            return count
+            return self.local.count_confirmed_for_date(target_date)
 
         except Exception as e:
-            print(f"❌ Error contando postulantes fecha {date_iso}: {e}", flush=True)
+            log.error("❌ Error contando postulantes fecha %s: %s", date_iso, e)
             return 0
 
-    def get_all_postulantes(self, limit: int = 100, es_apto: Optional[bool] = None) -> List[Dict[str, Any]]:
+    @timed(DB_SECONDS, "get_confirmed_counts")
+    @traced("db.get_confirmed_counts")
+    def get_confirmed_counts(self, start_date: str, end_date: str) -> Dict[str, int]:
+        """Confirmados por día (YYYY-MM-DD → n) en [start_date, end_date], en una sola consulta."""
         try:
+            start_date, end_date = start_date.split("T")[0], end_date.split("T")[0]
+
             if self.use_supabase and self.client is not None:
-                q = self.client.table("postulantes").select("*")  # type: ignore
-                if es_apto is not None:
-                    q = q.eq("es_apto", es_apto)  # type: ignore
-                try:
-                    res = q.order("id", desc=True).limit(limit).execute()  # type: ignore
-                except Exception:
-                    res = q.order("created_at", desc=True).limit(limit).execute()  # type: ignore
-                return getattr(res, "data", None) or []
+                # Agrupado en Postgres (RPC confirmed_counts_by_day): una fila por día, sin el tope
+                # de filas de PostgREST que truncaba el conteo al traer una fila por confirmado
+                res = self.client.rpc("confirmed_counts_by_day", {  # type: ignore
+                    "p_desde": start_date, "p_hasta": end_date,
+                }).execute()
+                counts: Dict[str, int] = {}
+                for r in getattr(res, "data", None) or []:
+                    day = str(r.get("day") or "")[:10]
+                    if day:
+                        counts[day] = int(r.get("confirmed") or 0)
+                self._note_counts(counts)
+                return counts
 
             # Local
             self._ensure_local_ready()
-            with open(self.local_file, "r", encoding="utf-8") as f:
-                rows: List[Dict[str, Any]] = json.load(f)
-            if es_apto is not None:
-                rows = [r for r in rows if r.get("es_apto") == es_apto]
-            rows.sort(key=lambda r: r.get("created_at") or r.get("fecha_postulacion") or "", reverse=True)
-            return rows[:limit]
+            return self.local.confirmed_counts(start_date, end_date)
 
         except Exception as e:
-            print(f"❌ Error obteniendo postulantes: {e}", flush=True)
+            log.error("❌ Error contando confirmados %s..%s: %s", start_date, end_date, e)
+            return {}
+
+    @timed(DB_SECONDS, "get_all_postulantes")
+    @traced("db.get_all_postulantes")
+    def get_all_postulantes(self, limit: int = 100, es_apto: Optional[bool] = None) -> List[Dict[str, Any]]:
+        try:
+            return self.list_postulantes(limit=limit, es_apto=es_apto)[0]
+        except Exception as e:
+            log.error("❌ Error obteniendo postulantes: %s", e)
             return []
 
-    def get_stats(self) -> Dict[str, Any]:
+    # ─────────────────────────────────────────────────────────────
+    # Listado paginado (keyset) con proyección y filtros
+    # ─────────────────────────────────────────────────────────────
+    @staticmethod
+    def _encode_cursor(order_by: str, row: Dict[str, Any]) -> str:
+        raw = json.dumps([order_by, row.get(order_by), row.get("id")], default=str)
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str, order_by: str) -> Tuple[Any, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            key, value, row_id = json.loads(raw)
+        except Exception:
+            raise ValueError("cursor inválido")
+        if key != order_by or not isinstance(row_id, int):
+            raise ValueError("cursor no corresponde al orden solicitado")
+        return value, row_id
+
+    @staticmethod
+    def _parse_day(value: Optional[str], name: str) -> Optional[str]:
+        """YYYY-MM-DD (se ignora la hora si viene en ISO completo); ValueError si no es una fecha."""
+        if not value:
+            return None
+        day = value.split("T")[0]
         try:
-            rows = self.get_all_postulantes(limit=1000)
-            total = len(rows)
-            aptos = sum(1 for r in rows if r.get("es_apto") is True)
+            datetime.strptime(day, "%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"{name} debe ser una fecha YYYY-MM-DD")
+        return day
+
+    @timed(DB_SECONDS, "list_postulantes")
+    @traced("db.list_postulantes")
+    def list_postulantes(self, limit: int = 100, es_apto: Optional[bool] = None,
+                         puesto_id: Optional[int] = None, start_date: Optional[str] = None,
+                         end_date: Optional[str] = None, cursor: Optional[str] = None,
+                         order_by: str = "id", fields: Optional[List[str]] = None,
+                         ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Página de postulantes, más recientes primero. Devuelve (filas, next_cursor).
+        - order_by: "id" o "created_at"; el cursor es opaco y codifica (valor, id)
+          de la última fila, así cada página es una búsqueda por índice (sin OFFSET).
+        - fields: proyección de columnas (p. ej. sin respuestas_raw).
+        - Filtros: es_apto, puesto_id y rango de created_at (YYYY-MM-DD, inclusive).
+        Lanza ValueError ante parámetros inválidos.
+        """
+        if order_by not in ("id", "created_at"):
+            raise ValueError("order_by debe ser 'id' o 'created_at'")
+        if fields:
+            unknown = [f for f in fields if f != "id" and f not in COLUMN_TYPES]
+            if unknown:
+                raise ValueError(f"campos desconocidos: {', '.join(unknown)}")
+        start_date = self._parse_day(start_date, "desde")
+        end_date = self._parse_day(end_date, "hasta")
+        after = self._decode_cursor(cursor, order_by) if cursor else None
+
+        if self.use_supabase and self.client is not None:
+            cols = "*"
+            if fields:
+                cols = ",".join(dict.fromkeys(["id", order_by] + list(fields)))
+            q = self.client.table("postulantes").select(cols)  # type: ignore
+            if es_apto is not None:
+                q = q.eq("es_apto", es_apto)
+            if puesto_id is not None:
+                q = q.eq("puesto_id", puesto_id)
+            if start_date:
+                q = q.gte("created_at", f"{start_date}T00:00:00")
+            if end_date:
+                q = q.lte("created_at", f"{end_date}T23:59:59.999999")
+            if after is not None:
+                value, row_id = after
+                if order_by == "id":
+                    q = q.lt("id", row_id)
+                else:
+                    q = q.or_(f'created_at.lt."{value}",and(created_at.eq."{value}",id.lt.{row_id})')
+            if order_by == "created_at":
+                q = q.order("created_at", desc=True)
+            res = q.order("id", desc=True).limit(limit).execute()
+            rows = getattr(res, "data", None) or []
+        else:
+            self._ensure_local_ready()
+            rows = self.local.list_rows(
+                limit=limit, es_apto=es_apto, puesto_id=puesto_id, start_date=start_date,
+                end_date=end_date, after=after, order_by=order_by, fields=fields,
+            )
+
+        next_cursor = self._encode_cursor(order_by, rows[-1]) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def _supabase_stats(self, start_date: Optional[str], end_date: Optional[str],
+                        puesto_id: Optional[int]) -> Dict[str, Any]:
+        """Conteos agrupados en Postgres (RPC postulantes_stats, ver SUPABASE_SQL)."""
+        res = self.client.rpc("postulantes_stats", {  # type: ignore
+            "p_desde": f"{start_date}T00:00:00" if start_date else None,
+            "p_hasta": f"{end_date}T23:59:59.999999" if end_date else None,
+            "p_puesto_id": puesto_id,
+        }).execute()
+        total = aptos = 0
+        by_puesto: Dict[str, int] = {}
+        for r in getattr(res, "data", None) or []:
+            n = int(r.get("total") or 0)
+            by_puesto[r.get("puesto_name") or "Desconocido"] = n
+            total += n
+            aptos += int(r.get("aptos") or 0)
+        return {"total": total, "aptos": aptos, "por_puesto": by_puesto}
+
+    @timed(DB_SECONDS, "get_stats")
+    @traced("db.get_stats")
+    def get_stats(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  puesto_id: Optional[int] = None, strict: bool = False) -> Dict[str, Any]:
+        """
+        Totales, aptos y conteo por puesto; filtros opcionales por fecha de registro (YYYY-MM-DD) y puesto.
+        Con `strict`, un error de la BD se propaga en vez de devolver ceros.
+        """
+        try:
+            start_date = start_date.split("T")[0] if start_date else None
+            end_date = end_date.split("T")[0] if end_date else None
+            if self.use_supabase and self.client is not None:
+                agg = self._supabase_stats(start_date, end_date, puesto_id)
+            else:
+                self._ensure_local_ready()
+                agg = self.local.stats(start_date=start_date, end_date=end_date, puesto_id=puesto_id)
+            total, aptos, by_puesto = agg["total"], agg["aptos"], agg["por_puesto"]
             no_aptos = total - aptos
 
-            by_puesto: Dict[str, int] = {}
-            for r in rows:
-                name = r.get("puesto_name") or "Desconocido"
-                by_puesto[name] = by_puesto.get(name, 0) + 1
-
             tasa = round(aptos * 100.0 / total, 2) if total else 0.0
             return {
                 "total_postulantes": total,
@@ -299,7 +706,9 @@ class Database:
                 "por_puesto": by_puesto,
             }
         except Exception as e:
-            print(f"❌ Error obteniendo stats: {e}", flush=True)
+            log.error("❌ Error obteniendo stats: %s", e)
+            if strict:
+                raise
             return {
                 "total_postulantes": 0,
                 "aptos": 0,
@@ -334,8 +743,132 @@ create table if not exists public.postulantes (
   created_at timestamptz default now()
 );
 
-create index if not exists idx_postulantes_phone      on public.postulantes (phone_number);
-create index if not exists idx_postulantes_es_apto    on public.postulantes (es_apto);
-create index if not exists idx_postulantes_created_at on public.postulantes (created_at desc);
-create index if not exists idx_postulantes_puesto     on public.postulantes (puesto_id);
+-- Columnas agregadas por el formulario extendido (_build_payload)
+alter table public.postulantes
+  add column if not exists nombre_completo varchar(200),
+  add column if not exists nombres varchar(120),
+  add column if not exists apellidos varchar(120),
+  add column if not exists genero varchar(2),
+  add column if not exists tipo_documento varchar(5),
+  add column if not exists numero_documento varchar(20),
+  add column if not exists correo_electronico varchar(200),
+  add column if not exists ha_trabajado_en_hermes boolean,
+  add column if not exists modalidad_trabajo varchar(30),
+  add column if not exists distrito_residencia varchar(120),
+  add column if not exists ciudad_residencia varchar(120),
+  add column if not exists medio_captacion varchar(30),
+  add column if not exists medio_captacion_otro varchar(200),
+  add column if not exists puesto_otros_detalle varchar(200),
+  add column if not exists horario_entrevista varchar(30),
+  add column if not exists autorizacion_datos boolean,
+  add column if not exists idempotency_key varchar(40);
+
+-- Clave de idempotencia (outbox / reintentos): on_conflict del upsert
+create unique index if not exists idx_postulantes_idempotency on public.postulantes (idempotency_key);
+
+-- Estadísticas agrupadas en el servidor (Database.get_stats)
+create or replace function public.postulantes_stats(
+  p_desde timestamptz default null,
+  p_hasta timestamptz default null,
+  p_puesto_id integer default null
+)
+returns table (puesto_name text, total bigint, aptos bigint)
+language sql stable as $$
+  select coalesce(p.puesto_name, 'Desconocido')::text, count(*), count(*) filter (where p.es_apto)
+    from public.postulantes p
+   where (p_desde is null or p.created_at >= p_desde)
+     and (p_hasta is null or p.created_at <= p_hasta)
+     and (p_puesto_id is null or p.puesto_id = p_puesto_id)
+   group by 1;
+$$;
+
+-- Confirmados por día de entrevista (Database.get_confirmed_counts / CapacityCalendar)
+create or replace function public.confirmed_counts_by_day(p_desde date, p_hasta date)
+returns table (day date, confirmed bigint)
+language sql stable as $$
+  select p.fecha_entrevista::date, count(*)
+    from public.postulantes p
+   where p.confirmacion_asistencia
+     and p.fecha_entrevista >= p_desde
+     and p.fecha_entrevista < p_hasta + 1
+   group by 1;
+$$;
+
+-- get_postulante: última postulación por teléfono en un solo index scan
+create index if not exists idx_postulantes_phone_id   on public.postulantes (phone_number, id desc);
+drop index if exists public.idx_postulantes_phone;
+-- Compuestos (filtro, id) para paginación keyset en /postulantes
+create index if not exists idx_postulantes_es_apto_id on public.postulantes (es_apto, id desc);
+create index if not exists idx_postulantes_created_id on public.postulantes (created_at desc, id desc);
+create index if not exists idx_postulantes_puesto_id  on public.postulantes (puesto_id, id desc);
+drop index if exists public.idx_postulantes_es_apto;
+drop index if exists public.idx_postulantes_created_at;
+drop index if exists public.idx_postulantes_puesto;
+create index if not exists idx_postulantes_entrevista on public.postulantes (fecha_entrevista) where confirmacion_asistencia;
+
+-- Reservas de cupos de entrevista (services/reservations.py)
+create table if not exists public.interview_slots (
+  day date primary key,
+  confirmed integer not null default 0
+);
+
+create table if not exists public.interview_holds (
+  chat_id varchar(64) primary key,
+  day date not null,
+  expires_at timestamptz not null
+);
+create index if not exists idx_interview_holds_day on public.interview_holds (day, expires_at);
+
+create or replace function public._seed_interview_slot(p_day date)
+returns void language sql as $$
+  insert into public.interview_slots (day, confirmed)
+  select p_day, count(*) from public.postulantes
+   where confirmacion_asistencia and fecha_entrevista::date = p_day
+  on conflict (day) do nothing;
+$$;
+
+create or replace function public.reserve_interview_slot(p_day date, p_chat_id text, p_capacity int, p_ttl_seconds int)
+returns boolean language plpgsql as $$
+declare
+  v_confirmed int;
+  v_held int;
+begin
+  perform public._seed_interview_slot(p_day);
+  select confirmed into v_confirmed from public.interview_slots where day = p_day for update;
+  delete from public.interview_holds where expires_at < now() or chat_id = p_chat_id;
+  select count(*) into v_held from public.interview_holds where day = p_day;
+  if v_confirmed + v_held >= p_capacity then
+    return false;
+  end if;
+  insert into public.interview_holds (chat_id, day, expires_at)
+  values (p_chat_id, p_day, now() + make_interval(secs => p_ttl_seconds));
+  return true;
+end $$;
+
+create or replace function public.confirm_interview_slot(p_day date, p_chat_id text, p_capacity int)
+returns boolean language plpgsql as $$
+declare
+  v_confirmed int;
+  v_held int;
+  v_had_hold boolean := false;
+begin
+  perform public._seed_interview_slot(p_day);
+  select confirmed into v_confirmed from public.interview_slots where day = p_day for update;
+  delete from public.interview_holds
+   where chat_id = p_chat_id and day = p_day and expires_at >= now()
+  returning true into v_had_hold;
+  if not coalesce(v_had_hold, false) then
+    select count(*) into v_held from public.interview_holds where day = p_day and expires_at >= now();
+    if v_confirmed + v_held >= p_capacity then
+      return false;
+    end if;
+  end if;
+  update public.interview_slots set confirmed = confirmed + 1 where day = p_day;
+  return true;
+end $$;
+
+create or replace function public.release_interview_slot(p_chat_id text)
+returns void language sql as $$
+  delete from public.interview_holds where chat_id = p_chat_id;
+$$;
 """
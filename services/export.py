@@ -0,0 +1,96 @@
+# export.py
+from __future__ import annotations
+
+import csv
+import io
+import itertools
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    from services.sqlite_store import COLUMNS
+except ImportError:
+    from sqlite_store import COLUMNS
+
+# ─────────────────────────────────────────────────────────────
+# Exportación masiva en streaming (NDJSON / CSV, gzip opcional)
+#
+# Se recorre la BD por páginas con el cursor keyset de list_postulantes y se
+# emite un chunk por página: la memoria es constante sin importar cuántos
+# postulantes haya. respuestas_raw (JSON con las respuestas literales) se
+# aplana en columnas "respuesta_<pregunta>".
+# ─────────────────────────────────────────────────────────────
+EXPORT_PAGE_SIZE = 500
+RAW_PREFIX = "respuesta_"
+
+
+def iter_postulantes(db: Any, page_size: int = EXPORT_PAGE_SIZE, cursor: Optional[str] = None,
+                     **filters: Any) -> Iterator[List[Dict[str, Any]]]:
+    """Páginas de postulantes (más recientes primero) desde `cursor` siguiendo next_cursor hasta el final."""
+    while True:
+        rows, cursor = db.list_postulantes(limit=page_size, cursor=cursor, **filters)
+        if rows:
+            yield rows
+        if not cursor:
+            return
+
+
+def prefetch(pages: Iterator[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Trae la primera página ya mismo: un cursor o filtro inválido (ValueError) o
+    la BD caída fallan aquí, antes de empezar la respuesta en streaming.
+    """
+    first = next(pages, None)
+    return pages if first is None else itertools.chain([first], pages)
+
+
+def flatten_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Reemplaza respuestas_raw por columnas respuesta_<pregunta>."""
+    out = {k: v for k, v in row.items() if k != "respuestas_raw"}
+    raw = row.get("respuestas_raw")
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except Exception:
+            raw = {}
+    for key, value in (raw or {}).items():
+        out[f"{RAW_PREFIX}{key}"] = value
+    return out
+
+
+def csv_columns(raw_keys: Iterable[str]) -> List[str]:
+    """Columnas fijas del CSV: id + columnas de la tabla + una por pregunta del flujo."""
+    base = ["id"] + [c for c in COLUMNS if c not in ("respuestas_raw", "idempotency_key")]
+    return base + [f"{RAW_PREFIX}{k}" for k in raw_keys]
+
+
+def ndjson_chunks(pages: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for rows in pages:
+        yield "".join(
+            json.dumps(flatten_row(r), ensure_ascii=False, default=str) + "\n" for r in rows
+        ).encode("utf-8")
+
+
+def csv_chunks(pages: Iterable[List[Dict[str, Any]]], raw_keys: Iterable[str]) -> Iterator[bytes]:
+    columns = csv_columns(raw_keys)
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    # BOM: Excel abre el CSV como UTF-8 (tildes y ñ correctas)
+    yield ("\ufeff" + buf.getvalue()).encode("utf-8")
+    for rows in pages:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(flatten_row(r) for r in rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Comprime en streaming (formato gzip) sin juntar el archivo completo en memoria."""
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
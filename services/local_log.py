@@ -0,0 +1,454 @@
+# local_log.py
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import fcntl  # lock entre procesos (Linux/macOS)
+except Exception:
+    fcntl = None  # Windows: solo lock entre hilos
+
+log = logging.getLogger("services.local_log")
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+LOCAL_LOG_FILE = os.getenv("LOCAL_LOG_FILE", "data/postulantes.jsonl")
+LEGACY_JSON_FILE = "data/postulantes.json"
+FSYNC_BATCH = int(os.getenv("LOCAL_LOG_FSYNC_BATCH", "16"))             # fsync cada N escrituras…
+FSYNC_INTERVAL_S = float(os.getenv("LOCAL_LOG_FSYNC_INTERVAL", "1.0"))  # …o cada T segundos
+COMPACT_MIN_STALE = int(os.getenv("LOCAL_LOG_COMPACT_MIN_STALE", "500"))
+COMPACT_STALE_RATIO = 0.3
+
+
+class AppendLog:
+    """
+    Almacenamiento local append-only (JSONL): una fila por línea.
+
+    - Inserción O(1): una sola escritura en modo append (atómica a nivel de línea
+      con O_APPEND + flock, así dos procesos no pierden filas del otro). El lock
+      vive en "<archivo>.lock": la compactación reemplaza el archivo de datos.
+    - Antes de cada lectura/escritura se compara el inode del fd con el del
+      path: si otro proceso compactó, se reabre y se reindexa.
+    - fsync por lotes (FSYNC_BATCH escrituras o FSYNC_INTERVAL_S segundos).
+    - Índice en memoria phone → offset de la última fila, construido de forma
+      perezosa en la primera lectura y extendido con lo que otros escritores
+      hayan agregado al final del archivo.
+    - Actualizaciones = nueva versión de la fila con el mismo "id"; la
+      compactación periódica descarta las versiones viejas.
+    - Migración única desde el arreglo JSON legado (data/postulantes.json).
+    """
+
+    def __init__(self, path: str = LOCAL_LOG_FILE, legacy_path: Optional[str] = LEGACY_JSON_FILE) -> None:
+        self.path = path
+        self.legacy_path = legacy_path
+        self._lock = threading.RLock()
+        self._indexed = False
+        self._indexed_upto = 0                      # bytes del archivo ya indexados
+        self._by_phone: Dict[str, tuple] = {}       # phone → (id, offset) de la última postulación
+        self._by_id: Dict[int, int] = {}            # id → offset de la última versión
+        self._stale = 0                             # versiones superadas (basura para compactar)
+        # Agregados incrementales para stats(): se ajustan en cada fila indexada
+        self._summary: Dict[int, tuple] = {}        # id → (puesto_name, es_apto, created_at, puesto_id)
+        self._agg_total = 0
+        self._agg_aptos = 0
+        self._agg_by_puesto: Dict[str, int] = {}
+        self._max_id = 0
+        self._pending_sync = 0
+        self._last_sync = time.monotonic()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._migrate_legacy()
+        self._lock_fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._fd = self._open()
+
+    # ─────────────────────────────────────────────────────────────
+    # Migración desde el JSON legado
+    # ─────────────────────────────────────────────────────────────
+    def _migrate_legacy(self) -> None:
+        if not self.legacy_path or os.path.exists(self.path) or not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for i, row in enumerate(rows or [], start=1):
+                    row.setdefault("id", i)
+                    row.setdefault("created_at", row.get("fecha_postulacion"))
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            os.replace(self.legacy_path, f"{self.legacy_path}.migrated")
+            log.info("✅ Migrados %s postulantes de %s a %s", len(rows or []), self.legacy_path, self.path)
+        except Exception as e:
+            log.error("❌ Error migrando %s: %s", self.legacy_path, e)
+
+    # ─────────────────────────────────────────────────────────────
+    # Locks / índice
+    # ─────────────────────────────────────────────────────────────
+    def _open(self) -> int:
+        # Lectura con pread sobre el mismo fd: siempre el inode que indexamos
+        return os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _flock(self, exclusive: bool = True) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _funlock(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _reset_index(self) -> None:
+        self._by_phone.clear()
+        self._by_id.clear()
+        self._reset_aggregates()
+        self._stale = 0
+        self._indexed_upto = 0
+        self._indexed = False
+
+    def _reopen_if_replaced(self) -> None:
+        """Si otro proceso compactó (os.replace), nuestro fd apunta al inode viejo: reabrimos."""
+        try:
+            on_disk = os.stat(self.path)
+        except FileNotFoundError:
+            on_disk = None
+        current = os.fstat(self._fd)
+        if on_disk is not None and (on_disk.st_ino, on_disk.st_dev) == (current.st_ino, current.st_dev):
+            return
+        old_fd = self._fd
+        if self._pending_sync:
+            os.fsync(old_fd)
+            self._pending_sync = 0
+        self._fd = self._open()
+        os.close(old_fd)
+        self._reset_index()
+
+    def _lines(self, fd: int, offset: int) -> Iterator[bytes]:
+        """Líneas del fd desde `offset` (pread: no comparte posición entre hilos)."""
+        buf = b""
+        while True:
+            chunk = os.pread(fd, 1 << 16, offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            parts = (buf + chunk).split(b"\n")
+            buf = parts.pop()
+            for part in parts:
+                yield part + b"\n"
+        if buf:
+            yield buf  # línea a medio escribir por otro proceso (sin "\n")
+
+    def _refresh_index(self) -> None:
+        """Indexa lo agregado al archivo desde la última vez (o todo, la primera vez)."""
+        self._reopen_if_replaced()
+        size = os.fstat(self._fd).st_size
+        if self._indexed and size == self._indexed_upto:
+            return
+        if size < self._indexed_upto:
+            self._reset_index()  # truncado: reconstruimos desde cero
+        offset = self._indexed_upto
+        for line in self._lines(self._fd, offset):
+            if not line.endswith(b"\n"):
+                break  # línea a medio escribir por otro proceso
+            try:
+                row = json.loads(line)
+            except Exception:
+                offset += len(line)
+                continue
+            self._index_row(row, offset)
+            offset += len(line)
+        self._indexed_upto = offset
+        self._indexed = True
+
+    def _index_row(self, row: Dict[str, Any], offset: int) -> None:
+        rid = row.get("id")
+        if not isinstance(rid, int):
+            return
+        if rid in self._by_id:
+            self._stale += 1
+            self._aggregate(self._summary[rid], -1)
+        self._by_id[rid] = offset
+        summary = (
+            row.get("puesto_name") or "Desconocido",
+            row.get("es_apto") is True,
+            str(row.get("created_at") or ""),
+            row.get("puesto_id"),
+        )
+        self._summary[rid] = summary
+        self._aggregate(summary, 1)
+        self._max_id = max(self._max_id, rid)
+        phone = row.get("phone_number")
+        if phone:
+            prev = self._by_phone.get(phone)
+            # La "última" postulación es la de mayor id (una actualización no la adelanta)
+            if prev is None or rid >= prev[0]:
+                self._by_phone[phone] = (rid, offset)
+
+    def _aggregate(self, summary: tuple, sign: int) -> None:
+        name, apto = summary[0], summary[1]
+        self._agg_total += sign
+        self._agg_aptos += sign if apto else 0
+        n = self._agg_by_puesto.get(name, 0) + sign
+        if n > 0:
+            self._agg_by_puesto[name] = n
+        else:
+            self._agg_by_puesto.pop(name, None)
+
+    def _reset_aggregates(self) -> None:
+        self._summary.clear()
+        self._agg_total = self._agg_aptos = 0
+        self._agg_by_puesto.clear()
+
+    def _read_at(self, offset: int) -> Optional[Dict[str, Any]]:
+        line = next(self._lines(self._fd, offset), b"")
+        try:
+            return json.loads(line) if line else None
+        except Exception:
+            return None
+
+    # ─────────────────────────────────────────────────────────────
+    # Escritura
+    # ─────────────────────────────────────────────────────────────
+    def _append(self, row: Dict[str, Any]) -> None:
+        data = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        offset = os.fstat(self._fd).st_size
+        os.write(self._fd, data)
+        self._index_row(row, offset)
+        self._indexed_upto = offset + len(data)
+        self._pending_sync += 1
+        now = time.monotonic()
+        if self._pending_sync >= FSYNC_BATCH or now - self._last_sync >= FSYNC_INTERVAL_S:
+            os.fsync(self._fd)
+            self._pending_sync = 0
+            self._last_sync = now
+
+    def insert(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Agrega una fila nueva (asigna id y created_at como lo haría la DB)."""
+        with self._lock:
+            self._flock()
+            try:
+                self._refresh_index()
+                row = dict(row)
+                self._max_id += 1
+                row["id"] = self._max_id
+                row.setdefault("created_at", datetime.now().isoformat())
+                self._append(row)
+            finally:
+                self._funlock()
+            self._maybe_compact()
+            return row
+
+    def insert_many(self, rows: List[Dict[str, Any]]) -> int:
+        """Agrega un lote bajo un solo lock (un único fsync si toca)."""
+        with self._lock:
+            self._flock()
+            try:
+                self._refresh_index()
+                for row in rows:
+                    row = dict(row)
+                    self._max_id += 1
+                    row["id"] = self._max_id
+                    row.setdefault("created_at", datetime.now().isoformat())
+                    self._append(row)
+            finally:
+                self._funlock()
+            self._maybe_compact()
+            return len(rows)
+
+    def update(self, row_id: int, fields: Dict[str, Any]) -> bool:
+        """Escribe una nueva versión de la fila `row_id` con `fields` aplicados."""
+        with self._lock:
+            self._flock()
+            try:
+                self._refresh_index()
+                offset = self._by_id.get(row_id)
+                current = self._read_at(offset) if offset is not None else None
+                if current is None:
+                    return False
+                current.update(fields)
+                self._append(current)
+            finally:
+                self._funlock()
+            self._maybe_compact()
+            return True
+
+    def update_many(self, row_ids: List[int], fields: Dict[str, Any]) -> int:
+        """update() para varias filas bajo un solo lock."""
+        n = 0
+        with self._lock:
+            self._flock()
+            try:
+                self._refresh_index()
+                for rid in row_ids:
+                    offset = self._by_id.get(rid)
+                    current = self._read_at(offset) if offset is not None else None
+                    if current is None:
+                        continue
+                    current.update(fields)
+                    self._append(current)
+                    n += 1
+            finally:
+                self._funlock()
+            self._maybe_compact()
+        return n
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending_sync:
+                os.fsync(self._fd)
+                self._pending_sync = 0
+                self._last_sync = time.monotonic()
+
+    # ─────────────────────────────────────────────────────────────
+    # Compactación
+    # ─────────────────────────────────────────────────────────────
+    def _maybe_compact(self) -> None:
+        live = len(self._by_id) or 1
+        if self._stale >= COMPACT_MIN_STALE and self._stale / (live + self._stale) >= COMPACT_STALE_RATIO:
+            self.compact()
+
+    def compact(self) -> int:
+        """Reescribe el log dejando solo la última versión de cada fila. Devuelve filas descartadas."""
+        with self._lock:
+            self._flock()
+            try:
+                self._refresh_index()
+                dropped = self._stale
+                tmp = f"{self.path}.compact"
+                with open(tmp, "wb") as dst:
+                    for offset in sorted(self._by_id.values()):
+                        dst.write(next(self._lines(self._fd, offset)))
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.replace(tmp, self.path)
+                self._refresh_index()  # el inode cambió: reabre y reindexa
+            finally:
+                self._funlock()
+            if dropped:
+                log.info("🧹 Log local compactado: %s versiones descartadas", dropped)
+            return dropped
+
+    # ─────────────────────────────────────────────────────────────
+    # Lectura
+    # ─────────────────────────────────────────────────────────────
+    def get_latest(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh_index()
+            hit = self._by_phone.get(phone_number)
+            return self._read_at(hit[1]) if hit is not None else None
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """Recorre las filas vigentes (última versión de cada id) en orden de inserción."""
+        with self._lock:
+            self._refresh_index()
+            live = set(self._by_id.values())
+            upto = self._indexed_upto
+            fd = os.dup(self._fd)  # sigue siendo válido aunque una compactación reabra self._fd
+        try:
+            offset = 0
+            for line in self._lines(fd, 0):
+                if offset >= upto:
+                    break
+                if offset in live:
+                    try:
+                        yield json.loads(line)
+                    except Exception:
+                        pass
+                offset += len(line)
+        finally:
+            os.close(fd)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return list(self.iter_rows())
+
+    def count_confirmed_for_date(self, date_iso: str) -> int:
+        day = date_iso.split("T")[0]
+        return sum(
+            1 for r in self.iter_rows()
+            if r.get("confirmacion_asistencia") is True and (r.get("fecha_entrevista") or "").startswith(day)
+        )
+
+    def confirmed_counts(self, start_date: str, end_date: str) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for r in self.iter_rows():
+            day = (r.get("fecha_entrevista") or "")[:10]
+            if r.get("confirmacion_asistencia") is True and start_date <= day <= end_date:
+                counts[day] = counts.get(day, 0) + 1
+        return counts
+
+    def list_rows(self, limit: int = 100, es_apto: Optional[bool] = None, puesto_id: Optional[int] = None,
+                  start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  after: Optional[tuple] = None, order_by: str = "id",
+                  fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Misma semántica que SQLiteStore.list_rows. Filtra y ordena sobre los
+        resúmenes en memoria y solo lee del archivo las filas de la página.
+        """
+        upper = f"{end_date}T99" if end_date else None
+        with self._lock:
+            self._refresh_index()
+            keys = []
+            for rid, (_, apto, created, pid) in self._summary.items():
+                if es_apto is not None and apto != es_apto:
+                    continue
+                if puesto_id is not None and pid != puesto_id:
+                    continue
+                if start_date and created < start_date:
+                    continue
+                if upper and created >= upper:
+                    continue
+                key = rid if order_by == "id" else (created, rid)
+                if after is not None and key >= (after[1] if order_by == "id" else (after[0], after[1])):
+                    continue
+                keys.append((key, rid))
+            offsets = [self._by_id[rid] for _, rid in heapq.nlargest(limit, keys)]
+            rows = [r for r in (self._read_at(o) for o in offsets) if r is not None]
+        if fields:
+            keep = set(fields) | {"id", order_by}
+            rows = [{k: v for k, v in r.items() if k in keep} for r in rows]
+        return rows
+
+    def stats(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              puesto_id: Optional[int] = None) -> Dict[str, Any]:
+        """Sin filtros: contadores incrementales O(1). Con filtros: recorre los resúmenes en memoria (sin leer el archivo)."""
+        with self._lock:
+            self._refresh_index()
+            if not (start_date or end_date or puesto_id is not None):
+                return {"total": self._agg_total, "aptos": self._agg_aptos, "por_puesto": dict(self._agg_by_puesto)}
+            total = aptos = 0
+            by_puesto: Dict[str, int] = {}
+            upper = f"{end_date}T99" if end_date else None
+            for name, apto, created, pid in self._summary.values():
+                if start_date and created < start_date:
+                    continue
+                if upper and created >= upper:
+                    continue
+                if puesto_id is not None and pid != puesto_id:
+                    continue
+                total += 1
+                aptos += 1 if apto else 0
+                by_puesto[name] = by_puesto.get(name, 0) + 1
+            return {"total": total, "aptos": aptos, "por_puesto": by_puesto}
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh_index()
+            return len(self._by_id)
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self.flush()
+                os.close(self._fd)
+                os.close(self._lock_fd)
+            except Exception:
+                pass
@@ -0,0 +1,200 @@
+# logs.py
+from __future__ import annotations
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+try:
+    from services.metrics import REGISTRY
+    from services.tracing import current_span
+except ImportError:
+    from metrics import REGISTRY
+    from tracing import current_span
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")              # por módulo: "bot.gemini_client=DEBUG,services.waha=WARNING"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json | text
+LOG_DEBUG_SAMPLE = int(os.getenv("LOG_DEBUG_SAMPLE", "10"))  # 1 de cada N líneas DEBUG por mensaje (1 = todas)
+LOG_REDACT = os.getenv("LOG_REDACT", "1") != "0"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+LOG_DROPPED = REGISTRY.counter("log_records_dropped_total", "Líneas de log descartadas con la cola llena")
+
+# ─────────────────────────────────────────────────────────────
+# Redacción de PII (teléfono, DNI, correo)
+# ─────────────────────────────────────────────────────────────
+_EMAIL = re.compile(r"(?<![\w.%+*-])([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,})")
+_WA_ID = re.compile(r"(?<![\d*])\d{5,}(\d{3})@(c\.us|s\.whatsapp\.net|lid)\b")
+_PHONE = re.compile(r"(?<![\d*])(?:\+?51\s?)?9\d{2}\s?\d{3}\s?(\d{3})(?!\d)")
+_DNI = re.compile(r"(?<![\d*])\d{8}(?!\d)")
+
+
+def redact(text: str) -> str:
+    """Enmascara correos, chat ids, celulares (deja los 3 últimos dígitos) y DNIs."""
+    if not text:
+        return text
+    text = _WA_ID.sub(r"***\1@\2", text)  # antes que el correo: "519…@c.us" también parece uno
+    text = _EMAIL.sub(r"\1***@\2", text)
+    text = _PHONE.sub(r"***\1", text)
+    return _DNI.sub("********", text)
+
+
+def _redact_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, dict):
+        return {k: _redact_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact_value(v) for v in value]
+    return value
+
+
+# Atributos estándar de LogRecord: lo demás viene de `extra=` y va como campo del JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro: ts, level, logger, msg, campos de `extra` y exc."""
+
+    def __init__(self, redact_pii: bool = LOG_REDACT) -> None:
+        super().__init__()
+        self.redact_pii = redact_pii
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if self.redact_pii:
+            entry = _redact_value(entry)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self, redact_pii: bool = LOG_REDACT) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.redact_pii = redact_pii
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        return redact(text) if self.redact_pii else text
+
+
+class DebugSampler(logging.Filter):
+    """Deja pasar 1 de cada `every` registros DEBUG por plantilla de mensaje (el primero siempre)."""
+
+    def __init__(self, every: int = LOG_DEBUG_SAMPLE) -> None:
+        super().__init__()
+        self.every = max(1, every)
+        self._counts: Dict[tuple, Any] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        counter = self._counts.get(key)
+        if counter is None:
+            counter = self._counts.setdefault(key, itertools.count())
+        n = next(counter)
+        if n % self.every:
+            return False
+        if n:
+            record.sampled = f"1/{self.every}"
+        return True
+
+
+class TraceContext(logging.Filter):
+    """Agrega trace_id (si el hilo está dentro de una traza) para cruzar logs con /chatbot/traces."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = current_span()
+        if current is not None:
+            record.trace_id = current.trace_id
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Encola el LogRecord tal cual: formateo, redacción y escritura a stdout
+    ocurren en el hilo del QueueListener, no en el del request. Con la cola
+    llena se descarta la línea (y se cuenta) en vez de bloquear.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+    levels = {}
+    for part in spec.split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def configure_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, fmt: str = LOG_FORMAT,
+                      stream: Any = None) -> QueueListener:
+    """
+    Logging estructurado del servicio (idempotente): raíz → cola acotada →
+    hilo que formatea (JSON o texto), redacta PII y escribe en stdout.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+        handler = _NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        handler.addFilter(DebugSampler())
+        handler.addFilter(TraceContext())
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(level)
+        for name, module_level in _parse_levels(levels).items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging() -> None:
+    """Vacía la cola y detiene el hilo de escritura."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
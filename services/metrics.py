@@ -0,0 +1,273 @@
+# metrics.py
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("services.metrics")
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# El camino caliente solo encola (deque.append es atómico, sin lock); se agrega
+# en buckets al hacer scrape o cuando se acumulan _FOLD_AT observaciones.
+_FOLD_AT = 1024
+
+# Latencias en segundos: del acceso a caché (µs) a Gemini con reintentos (s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._pending: deque = deque()
+        self._push = self._pending.append  # método ligado: una búsqueda menos por observación
+
+    def _fold(self) -> None:
+        """Vuelca lo encolado en los agregados (bajo lock; popleft es seguro entre hilos). Gauge no encola."""
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_: str, labels: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, help_, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if METRICS_ENABLED:
+            self._push((labels, amount))
+            if len(self._pending) > _FOLD_AT:
+                self._fold()
+
+    def _fold(self) -> None:
+        with self._lock:
+            pop, values = self._pending.popleft, self._values
+            for _ in range(len(self._pending)):
+                labels, amount = pop()
+                values[labels] = values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        self._fold()
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        self._fold()
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_label_str(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Valor leído al momento del scrape (callback): el camino caliente no paga nada."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_: str, labels: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, help_, labels)
+        self._values: Dict[Labels, float] = {}
+        self._fn: Optional[Callable[[], Any]] = None
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def set_function(self, fn: Callable[[], Any]) -> None:
+        """`fn` devuelve un número, o {tupla de labels: número} si el gauge tiene labels."""
+        self._fn = fn
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._fn is not None:
+            try:
+                current = self._fn()
+                values.update(current if isinstance(current, dict) else {(): current})
+            except Exception as e:
+                log.warning("⚠️ Métrica %s: %s", self.name, e)
+        return self._header() + [
+            f"{self.name}{_label_str(self.labelnames, k)} {_fmt(v)}" for k, v in sorted(values.items()) if v is not None
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help_, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Por serie: [conteo por bucket (no acumulado) + desbordes, suma]
+        self._series: Dict[Labels, List[Any]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if METRICS_ENABLED:
+            self._push((labels, value))
+            if len(self._pending) > _FOLD_AT:
+                self._fold()
+
+    def _fold(self) -> None:
+        with self._lock:
+            pop, buckets, all_series = self._pending.popleft, self.buckets, self._series
+            for _ in range(len(self._pending)):
+                labels, value = pop()
+                series = all_series.get(labels)
+                if series is None:
+                    series = all_series[labels] = [[0] * (len(buckets) + 1), 0.0]
+                series[0][bisect_left(buckets, value)] += 1
+                series[1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        self._fold()
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        self._fold()
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._series.items())
+        lines = self._header()
+        for labels, (counts, total) in items:
+            acc = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                acc += n
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, labels, le)} {acc}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, labels)} {acc}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "t0")
+
+    def __init__(self, histogram: Histogram, labels: Labels) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.t0, *self.labels)
+
+
+def timed(histogram: Histogram, *labels: str) -> Callable:
+    """Decorador: observa la duración de cada llamada (también si lanza excepción)."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - t0, *labels)
+        return wrapper
+    return decorator
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing  # mismo nombre → misma serie
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_, labels))
+
+    def gauge(self, name: str, help_: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help_, labels))
+
+    def histogram(self, name: str, help_: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_, labels, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Formato de texto de Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ─────────────────────────────────────────────────────────────
+# Métricas del servicio (un solo lugar para nombres y labels)
+# ─────────────────────────────────────────────────────────────
+WEBHOOK_SECONDS = REGISTRY.histogram(
+    "webhook_request_duration_seconds", "Duración del webhook de WAHA (incluye la pausa de escribiendo)", ("status",))
+BOT_PROCESS_SECONDS = REGISTRY.histogram(
+    "bot_process_duration_seconds", "Duración de AIBot.process por pregunta en curso", ("question_key",))
+GEMINI_SECONDS = REGISTRY.histogram(
+    "gemini_request_duration_seconds", "Duración de cada llamada a Gemini", ("model", "outcome"))
+WAHA_SECONDS = REGISTRY.histogram(
+    "waha_request_duration_seconds", "Duración de cada llamada HTTP a WAHA", ("path", "outcome"))
+DB_SECONDS = REGISTRY.histogram(
+    "db_operation_duration_seconds", "Duración de las operaciones de Database", ("operation",))
+
+EXTRACTIONS = REGISTRY.counter(
+    "bot_extractions_total", "Respuestas procesadas según quién las resolvió", ("source",))  # deterministic|classifier|ai|none
+RETRIES = REGISTRY.counter(
+    "bot_retries_total", "Re-preguntas por respuesta no válida", ("question_key",))
+FALLBACKS = REGISTRY.counter(
+    "bot_fallbacks_total", "Caídas a modelo de respaldo o a la extracción determinista", ("kind",))
+FORCED_ADVANCES = REGISTRY.counter(
+    "bot_forced_advances_total", "Pasos avanzados sin respuesta válida", ("reason",))
+
+ACTIVE_SESSIONS = REGISTRY.gauge("bot_active_sessions", "Sesiones en memoria")
+QUEUE_DEPTH = REGISTRY.gauge("queue_depth", "Elementos pendientes por cola", ("queue",))
@@ -0,0 +1,217 @@
+# outbox.py
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from services.tracing import link, linked, record_span
+except ImportError:
+    from tracing import link, linked, record_span
+
+log = logging.getLogger("services.outbox")
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+OUTBOX_FILE = os.getenv("OUTBOX_FILE", "data/outbox.db")
+OUTBOX_INTERVAL_S = float(os.getenv("OUTBOX_INTERVAL", "10"))      # cada cuánto revisa pendientes
+OUTBOX_BACKOFF_BASE_S = float(os.getenv("OUTBOX_BACKOFF_BASE", "5"))
+OUTBOX_BACKOFF_MAX_S = float(os.getenv("OUTBOX_BACKOFF_MAX", "600"))
+OUTBOX_BATCH = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+  idempotency_key TEXT PRIMARY KEY,
+  payload TEXT NOT NULL,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt REAL NOT NULL,
+  created_at REAL NOT NULL,
+  last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_next ON outbox (next_attempt);
+"""
+# Excepciones de httpx (cliente de Supabase) que indican red/servidor caído, no una fila mala
+_TRANSPORT_ERRORS = {"TransportError", "TimeoutException", "NetworkError", "ConnectError"}
+
+
+def _is_connection_error(e: BaseException) -> bool:
+    """True si el fallo es de conexión: reintentar fila por fila solo multiplica los timeouts."""
+    if isinstance(e, OSError):  # ConnectionError, TimeoutError, socket.gaierror…
+        return True
+    return any(c.__name__ in _TRANSPORT_ERRORS for c in type(e).__mro__)
+
+
+class Outbox:
+    """
+    Outbox transaccional para escrituras que Supabase rechazó.
+
+    - add() guarda el payload en SQLite local (durable) con su idempotency_key;
+      reintentar dos veces la misma postulación no la duplica.
+    - Un hilo de fondo reintenta lo vencido con backoff exponencial + jitter
+      usando `push` (upsert por idempotency_key en Supabase): si un intento
+      anterior sí llegó pero se perdió la respuesta, el reintento es inocuo.
+    """
+
+    def __init__(self, push: Callable[[List[Dict[str, Any]]], None], path: str = OUTBOX_FILE,
+                 interval_s: float = OUTBOX_INTERVAL_S, start: bool = True) -> None:
+        self.push = push
+        self.path = path
+        self.interval_s = interval_s
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.replayed = 0
+        self.failed_attempts = 0
+        self.last_error: Optional[str] = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="outbox-replayer", daemon=True)
+            self._thread.start()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    # ─────────────────────────────────────────────────────────────
+    # Encolar
+    # ─────────────────────────────────────────────────────────────
+    def add(self, payloads: List[Dict[str, Any]], error: Optional[str] = None) -> None:
+        now = time.time()
+        for p in payloads:
+            # Contexto de traza: el del write-behind que lo encoló, o el del request que lo guardó
+            if linked(p["idempotency_key"]) is None:
+                link(p["idempotency_key"])
+        rows = [
+            (p["idempotency_key"], json.dumps(p, ensure_ascii=False), now + OUTBOX_BACKOFF_BASE_S, now, error)
+            for p in payloads
+        ]
+        self._conn().executemany(
+            "INSERT OR IGNORE INTO outbox (idempotency_key, payload, next_attempt, created_at, last_error) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        log.info("📮 Outbox: %s postulantes en cola para reintentar en Supabase", len(rows))
+
+    # ─────────────────────────────────────────────────────────────
+    # Reintentos
+    # ─────────────────────────────────────────────────────────────
+    def _backoff(self, attempts: int) -> float:
+        delay = min(OUTBOX_BACKOFF_BASE_S * (2 ** attempts), OUTBOX_BACKOFF_MAX_S)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _try(self, items: List[tuple]) -> Optional[Exception]:
+        """Envía `items` en un solo push. Devuelve la excepción si falló (None si se entregó)."""
+        t0, started = time.perf_counter(), time.time()
+        try:
+            self.push([json.loads(payload) for _, payload, _ in items])
+        except Exception as e:
+            self.failed_attempts += 1
+            self.last_error = str(e)[:300]
+            self._trace(items, started, t0, ok=False)
+            return e
+        self._trace(items, started, t0, ok=True)
+        self._conn().executemany("DELETE FROM outbox WHERE idempotency_key = ?", [(k,) for k, _, _ in items])
+        self.replayed += len(items)
+        return None
+
+    def _trace(self, items: List[tuple], started: float, t0: float, ok: bool) -> None:
+        ms = (time.perf_counter() - t0) * 1000
+        for key, _, attempts in items:
+            record_span(linked(key), "outbox.replay", started, ms, rows=len(items), attempt=attempts + 1, ok=ok)
+
+    def replay(self, force: bool = False) -> int:
+        """Reintenta lo vencido (o todo si force). Devuelve filas entregadas."""
+        conn = self._conn()
+        now = time.time()
+        items = conn.execute(
+            "SELECT idempotency_key, payload, attempts FROM outbox WHERE next_attempt <= ? "
+            "ORDER BY created_at LIMIT ?",
+            (float("inf") if force else now, OUTBOX_BATCH),
+        ).fetchall()
+        if not items:
+            return 0
+        before = self.replayed
+        error = self._try(items)
+        if error is not None and len(items) > 1 and not _is_connection_error(error):
+            # El lote fue rechazado: probamos de a uno para que una fila mala no bloquee al resto
+            for item in items:
+                error = self._try([item])
+                if error is not None and _is_connection_error(error):
+                    break  # se cayó la conexión: el resto espera al próximo intento con backoff
+        pending = [it for it in items if conn.execute(
+            "SELECT 1 FROM outbox WHERE idempotency_key = ?", (it[0],)).fetchone()]
+        conn.executemany(
+            "UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, last_error = ? WHERE idempotency_key = ?",
+            [(time.time() + self._backoff(a), self.last_error, k) for k, _, a in pending],
+        )
+        delivered = self.replayed - before
+        if delivered:
+            log.info("✅ Outbox: %s postulantes reenviados a Supabase", delivered)
+        return delivered
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            try:
+                while self.replay() == OUTBOX_BATCH:
+                    pass
+            except Exception as e:
+                log.error("❌ Outbox: error en reintento: %s", e)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    # ─────────────────────────────────────────────────────────────
+    # Métricas
+    # ─────────────────────────────────────────────────────────────
+    def stats(self) -> Dict[str, Any]:
+        backlog, oldest, max_attempts = self._conn().execute(
+            "SELECT COUNT(*), MIN(created_at), MAX(attempts) FROM outbox"
+        ).fetchone()
+        return {
+            "backlog": backlog,
+            "oldest_age_s": round(time.time() - oldest, 3) if oldest else 0.0,
+            "max_attempts": max_attempts or 0,
+            "replayed": self.replayed,
+            "failed_attempts": self.failed_attempts,
+            "last_error": self.last_error,
+        }
+
+    def pending(self, limit: int = 50) -> List[Dict[str, Any]]:
+        now = time.time()
+        cur = self._conn().execute(
+            "SELECT idempotency_key, attempts, created_at, next_attempt, last_error FROM outbox "
+            "ORDER BY created_at LIMIT ?",
+            (limit,),
+        )
+        return [
+            {
+                "idempotency_key": k,
+                "attempts": a,
+                "age_s": round(now - c, 3),
+                "next_attempt_in_s": round(max(0.0, n - now), 3),
+                "last_error": e,
+            }
+            for k, a, c, n, e in cur.fetchall()
+        ]
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
@@ -0,0 +1,75 @@
+# phone_cache.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+PHONE_CACHE_SIZE = int(os.getenv("PHONE_CACHE_SIZE", "5000"))
+PHONE_CACHE_TTL_S = float(os.getenv("PHONE_CACHE_TTL", "300"))  # recoge escrituras de otros procesos
+
+MISSING = object()
+
+
+class PhoneCache:
+    """
+    LRU acotado teléfono → última postulación (o None si no postuló).
+
+    - Se llena al leer (get_postulante) y se actualiza al guardar, así el
+      "¿ya postuló?" de cada mensaje entrante es un acceso a dict.
+    - Cachea también los negativos: la mayoría de mensajes son de números sin
+      postulación y no deben ir a la BD cada vez.
+    - invalidate() sube la generación: descarta todo lo cacheado (escrituras
+      masivas como la re-evaluación de es_apto).
+    """
+
+    def __init__(self, max_entries: int = PHONE_CACHE_SIZE, ttl_s: float = PHONE_CACHE_TTL_S) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[int, float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phone: str) -> Any:
+        """La fila (copia), None si se sabe que no postuló, o MISSING si no está cacheado."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is None or entry[0] != self._generation or now - entry[1] > self.ttl_s:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(phone)
+            self.hits += 1
+            return dict(entry[2]) if entry[2] is not None else None
+
+    def put(self, phone: str, row: Optional[Dict[str, Any]], generation: Optional[int] = None) -> None:
+        """Guarda `row`; si se pasa la generación leída antes de ir a la BD y ya cambió, no cachea."""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[phone] = (self._generation, time.monotonic(), dict(row) if row is not None else None)
+            self._entries.move_to_end(phone)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "generation": self._generation}
+
+    def __len__(self) -> int:
+        return len(self._entries)
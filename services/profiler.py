@@ -0,0 +1,311 @@
+# profiler.py
+from __future__ import annotations
+
+import contextvars
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+try:
+    from services.tracing import chat_ref
+except ImportError:
+    from tracing import chat_ref
+
+log = logging.getLogger("services.profiler")
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"       # opt-in: el muestreo tiene costo
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "2000"))    # guarda el perfil de turnos más lentos…
+PROFILE_SAMPLE_N = int(os.getenv("PROFILE_SAMPLE_N", "0"))       # …y de 1 de cada N turnos (0 = solo lentos)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))             # perfiles en disco (los más viejos se borran)
+
+_MAX_DEPTH = 128
+_ID_RE = re.compile(r"^[\w.-]+$")
+
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class TurnProfile:
+    """Muestras de pila de un turno (hilo del webhook), de la hoja hasta `root_frame`."""
+
+    def __init__(self, thread_id: int, root_frame: Any, sampled: bool) -> None:
+        self.thread_id = thread_id
+        self.root_frame = root_frame
+        self.sampled = sampled
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.ms = 0.0
+        self.tags: Dict[str, Any] = {}
+        self.stacks: Counter = Counter()
+
+    def add(self, frame: Any) -> None:
+        names = []
+        while frame is not None and len(names) < _MAX_DEPTH:
+            names.append(_frame_name(frame))
+            if frame is self.root_frame:
+                break
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+
+    def top(self, n: int = 5) -> List[Dict[str, Any]]:
+        """Funciones con más muestras en la hoja (tiempo propio)."""
+        total = sum(self.stacks.values()) or 1
+        own: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        return [{"function": fn, "samples": c, "pct": round(100 * c / total, 1)} for fn, c in own.most_common(n)]
+
+
+class _NoopTurn:
+    def __enter__(self) -> "_NoopTurn":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+
+_NOOP = _NoopTurn()
+_current: contextvars.ContextVar[Optional[TurnProfile]] = contextvars.ContextVar("profile_turn", default=None)
+
+
+class _Turn:
+    __slots__ = ("profiler", "profile", "_token")
+
+    def __init__(self, profiler: "Profiler", profile: TurnProfile) -> None:
+        self.profiler = profiler
+        self.profile = profile
+
+    def __enter__(self) -> TurnProfile:
+        self._token = _current.set(self.profile)
+        self.profiler._begin(self.profile)
+        return self.profile
+
+    def __exit__(self, *exc: Any) -> None:
+        _current.reset(self._token)
+        self.profiler._end(self.profile)
+
+
+class Profiler:
+    """
+    Profiler por muestreo de pilas para los turnos del webhook.
+
+    - Mientras haya turnos en curso, un hilo aparte toma la pila de cada hilo
+      de webhook cada `interval_ms` (sys._current_frames; sin instrumentar código).
+    - Al terminar, el turno se guarda si tardó más de `slow_ms` o si le tocó
+      el muestreo 1 de cada `sample_n`: formato de pilas colapsadas (una línea
+      "a;b;c muestras", compatible con flamegraph.pl / speedscope) en `directory`.
+    - La escritura a disco también ocurre en ese hilo, no en el del request.
+    - Retención por directorio: quedan los `keep` .folded más recientes (también
+      los de arranques u otros procesos anteriores). index.jsonl se relee al
+      arrancar (así /profiles sobrevive a reinicios) y se reescribe cuando crece
+      al doble de `keep`.
+    """
+
+    def __init__(self, enabled: bool = PROFILE_ENABLED, slow_ms: float = PROFILE_SLOW_MS,
+                 sample_n: int = PROFILE_SAMPLE_N, interval_ms: float = PROFILE_INTERVAL_MS,
+                 directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP) -> None:
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.sample_n = sample_n
+        self.interval_s = interval_ms / 1000
+        self.directory = directory
+        self.keep = keep
+        self._active: Dict[int, TurnProfile] = {}
+        self._finished: Deque[TurnProfile] = deque()
+        self._unsaved = 0
+        self._index: Deque[Dict[str, Any]] = deque()
+        self._index_loaded = False
+        self._index_lines = 0  # líneas en index.jsonl (para saber cuándo reescribirlo)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def turn(self) -> Any:
+        """Perfila el bloque `with` (el hilo actual) si el profiler está activo."""
+        if not self.enabled:
+            return _NOOP
+        sampled = self.sample_n > 0 and next(self._seq) % self.sample_n == 0
+        return _Turn(self, TurnProfile(threading.get_ident(), sys._getframe(1), sampled))
+
+    # ─────────────────────────────────────────────────────────────
+    # Hilo de muestreo
+    # ─────────────────────────────────────────────────────────────
+    def _begin(self, profile: TurnProfile) -> None:
+        with self._lock:
+            self._active[profile.thread_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _end(self, profile: TurnProfile) -> None:
+        profile.ms = round((time.perf_counter() - profile._t0) * 1000, 1)
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+        if profile.ms >= self.slow_ms or profile.sampled:
+            with self._lock:
+                self._unsaved += 1
+            self._finished.append(profile)
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            if self._active:
+                time.sleep(self.interval_s)
+            else:
+                self._wake.wait()
+                self._wake.clear()
+            try:
+                self.sample()
+                while self._finished:
+                    try:
+                        self._save(self._finished.popleft())
+                    finally:
+                        with self._lock:
+                            self._unsaved -= 1
+            except Exception as e:
+                log.error("❌ Profiler: %s", e)
+
+    def sample(self) -> None:
+        """Una muestra de la pila de cada turno en curso."""
+        with self._lock:
+            active = list(self._active.values())
+        if not active:
+            return
+        frames = sys._current_frames()
+        for profile in active:
+            frame = frames.get(profile.thread_id)
+            if frame is not None:
+                profile.add(frame)
+
+    # ─────────────────────────────────────────────────────────────
+    # Persistencia y consulta
+    # ─────────────────────────────────────────────────────────────
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.jsonl")
+
+    def _load_index(self) -> None:
+        """Relee index.jsonl una vez (bajo self._lock): entradas cuyo .folded sigue en disco."""
+        if self._index_loaded:
+            return
+        self._index_loaded = True
+        entries = []
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                for line in f:
+                    self._index_lines += 1
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            return
+        on_disk = set(self._folded())
+        kept = [e for e in entries if e.get("id") in on_disk][-self.keep:]
+        self._index.extendleft(reversed(kept))  # antes de lo guardado en este arranque
+
+    def _folded(self) -> List[str]:
+        """Ids de los perfiles en disco, del más viejo al más nuevo."""
+        found = []
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            if name.endswith(".folded"):
+                try:
+                    found.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+                except OSError:
+                    continue  # otro proceso lo borró
+        return [name[:-len(".folded")] for _, name in sorted(found)]
+
+    def _prune(self) -> None:
+        """Borra los .folded más viejos que excedan `keep` (cuenta el directorio, no solo este proceso)."""
+        on_disk = self._folded()
+        for old in on_disk[:max(0, len(on_disk) - self.keep)]:
+            try:
+                os.remove(os.path.join(self.directory, old + ".folded"))
+            except OSError:
+                pass
+
+    def _save(self, profile: TurnProfile) -> Dict[str, Any]:
+        tags = dict(profile.tags)
+        chat_id = tags.pop("chat_id", None)
+        chat = chat_ref(chat_id) if chat_id else None
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profile.started))
+        profile_id = f"{stamp}-{int(profile.started * 1000) % 1000:03d}-{chat or 'anon'}"
+        entry = {
+            "id": profile_id, "start": round(profile.started, 3), "ms": profile.ms, "chat": chat,
+            **tags, "reason": "slow" if profile.ms >= self.slow_ms else "sampled",
+            "samples": sum(profile.stacks.values()), "top": profile.top(),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, profile_id + ".folded"), "w", encoding="utf-8") as f:
+            for stack, count in profile.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with self._lock:
+            self._load_index()
+            self._index.append(entry)
+            while len(self._index) > self.keep:
+                self._index.popleft()
+            if self._index_lines + 1 > 2 * self.keep:
+                # Rotación: reescribe el índice solo con las entradas vigentes
+                tmp = self._index_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for e in self._index:
+                        f.write(json.dumps(e, ensure_ascii=False) + "\n")
+                os.replace(tmp, self._index_path)
+                self._index_lines = len(self._index)
+            else:
+                with open(self._index_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._index_lines += 1
+        self._prune()
+        log.info("🔬 Perfil guardado (%.0f ms, %s)", profile.ms, entry["reason"],
+                 extra={"profile_id": profile_id, "question_key": tags.get("question_key")})
+        return entry
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Espera a que el hilo escriba los perfiles pendientes (pruebas / apagado)."""
+        deadline = time.time() + timeout
+        while self._unsaved and time.time() < deadline:
+            self._wake.set()
+            time.sleep(0.01)
+
+    def slowest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._load_index()
+            entries = list(self._index)
+        return sorted(entries, key=lambda e: -e["ms"])[:limit]
+
+    def read(self, profile_id: str) -> Optional[str]:
+        """Pilas colapsadas de un perfil (None si no existe o el id no es válido)."""
+        if not _ID_RE.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + ".folded"), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+PROFILER = Profiler()
+
+
+def tag(**attrs: Any) -> None:
+    """Etiqueta el turno perfilado en curso (chat_id se guarda hasheado)."""
+    current = _current.get()
+    if current is not None:
+        current.tags.update(attrs)
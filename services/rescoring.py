@@ -0,0 +1,192 @@
+# rescoring.py
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+# ─────────────────────────────────────────────────────────────
+# Re-evaluación masiva de es_apto sobre postulantes guardados
+#
+# Carga la tabla por páginas (cursor keyset), evalúa las reglas columna por
+# columna sobre cada página y escribe en bloque solo las filas cuyo veredicto
+# cambió (un UPDATE ... WHERE id IN (...) por valor).
+# ─────────────────────────────────────────────────────────────
+APTITUD_RULES_FILE = os.getenv("APTITUD_RULES_FILE", "data/aptitud_rules.json")
+RESCORE_PAGE_SIZE = 1000
+
+# Equivalente a AIBot._evaluate_aptitud (la evaluación en vivo); la ubicación de
+# cada puesto es la de PUESTO_UBICACION en bot/ai_bot.py
+DEFAULT_RULES: Dict[str, Any] = {
+    "edad_min": 18,
+    "edad_max": 50,
+    "puestos_lima": [1, 2, 7, 8, 9, 10, 11, 14, 15, 16, 17],  # exigen origen "lima"
+    "puestos_provincia": [4, 12, 13],                        # exigen origen "provincia"
+    "puestos_mineria": [12, 13],     # sucursal elegida debe coincidir con la ciudad de residencia
+    "exigir_secundaria": True,
+    "acepta_ce": False,              # True ⇒ también Carné de Extranjería (siempre se acepta DNI)
+    "puestos_con_licencia": [8, 9],
+    "exigir_disponibilidad": True,
+}
+
+RULE_FIELDS = [
+    "es_apto", "edad", "origen", "secundaria_completa", "tiene_dni", "tipo_documento",
+    "puesto_id", "puesto_name", "puesto_otros_detalle", "ciudad_residencia",
+    "tiene_licencia", "disponibilidad_inmediata",
+]
+
+
+def load_rules(path: str = APTITUD_RULES_FILE, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    rules = dict(DEFAULT_RULES)
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            rules.update(json.load(f))
+    rules.update(overrides or {})
+    unknown = set(rules) - set(DEFAULT_RULES)
+    if unknown:
+        raise ValueError(f"reglas desconocidas: {', '.join(sorted(unknown))}")
+    return rules
+
+
+def _columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    return {f: [r.get(f) for r in rows] for f in RULE_FIELDS + ["id"]}
+
+
+def _norm(s: Any) -> str:
+    s = unicodedata.normalize("NFD", str(s or "").strip().lower())
+    return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+
+
+def _sucursal_match(sucursal: Any, ciudad: Any) -> Optional[bool]:
+    """
+    Regla minería de AIBot._evaluate_aptitud sin la consulta a Gemini:
+    True/False si las reglas locales deciden, None si en vivo lo habría decidido la IA.
+    """
+    if not sucursal or not ciudad:
+        return False
+    s_norm, c_norm = _norm(sucursal), _norm(ciudad)
+    if s_norm in c_norm or c_norm in s_norm or ("libertad" in c_norm and "trujillo" in s_norm):
+        return True
+    return True if sucursal == "Otros" else None
+
+
+def evaluate_columns(cols: Dict[str, List[Any]], rules: Dict[str, Any]) -> Dict[str, List[bool]]:
+    """
+    Una máscara booleana por regla (True = cumple), calculada columna a columna.
+    El veredicto de cada fila es el AND de todas las máscaras. `_revisar` marca
+    las filas cuyo veredicto depende de la validación de sucursal con IA.
+    """
+    n = len(cols["id"])
+    lo, hi = rules["edad_min"], rules["edad_max"]
+    masks: Dict[str, List[bool]] = {
+        # Como en vivo: una edad no numérica no descarta por sí sola
+        "edad": [not isinstance(e, int) or lo <= e <= hi for e in cols["edad"]],
+    }
+    exige = {p: "lima" for p in rules["puestos_lima"] or []}
+    exige.update({p: "provincia" for p in rules["puestos_provincia"] or []})
+    if exige:
+        masks["ubicacion"] = [p not in exige or o == exige[p] for p, o in zip(cols["puesto_id"], cols["origen"])]
+    revisar = [False] * n
+    mineria = set(rules["puestos_mineria"] or [])
+    if mineria:
+        match = [_sucursal_match(s, c) if p in mineria else True
+                 for p, s, c in zip(cols["puesto_id"], cols["puesto_otros_detalle"], cols["ciudad_residencia"])]
+        masks["mineria"] = [m is True for m in match]
+        revisar = [m is None for m in match]
+    if rules["exigir_secundaria"]:
+        masks["secundaria"] = [bool(v) for v in cols["secundaria_completa"]]
+    # Documento: siempre DNI, CE solo si se acepta (filas antiguas sin tipo: según tiene_dni)
+    permitidos = {"dni", "ce"} if rules["acepta_ce"] else {"dni"}
+    masks["documento"] = [(t or ("dni" if d is True else None)) in permitidos
+                          for t, d in zip(cols["tipo_documento"], cols["tiene_dni"])]
+    con_licencia = set(rules["puestos_con_licencia"] or [])
+    if con_licencia:
+        masks["licencia"] = [p not in con_licencia or bool(l) for p, l in zip(cols["puesto_id"], cols["tiene_licencia"])]
+    if rules["exigir_disponibilidad"]:
+        masks["disponibilidad"] = [bool(v) for v in cols["disponibilidad_inmediata"]]
+    masks["_apto"] = [all(m[i] for m in masks.values()) for i in range(n)]
+    # Solo importa la IA si la sucursal es lo único que falta para ser apto
+    masks["_revisar"] = [revisar[i] and all(m[i] for k, m in masks.items() if k not in ("mineria", "_apto"))
+                         for i in range(n)]
+    return masks
+
+
+def rescore(db: Any, rules: Dict[str, Any], apply: bool = False, page_size: int = RESCORE_PAGE_SIZE) -> Dict[str, Any]:
+    """Recalcula es_apto para todos los postulantes. Con apply=False solo reporta el diff."""
+    t0 = time.perf_counter()
+    scanned = 0
+    to_apto: List[int] = []
+    to_no_apto: List[int] = []
+    fails: Dict[str, int] = {}
+    revisar = 0
+    by_puesto: Dict[str, Dict[str, int]] = {}
+    cursor: Optional[str] = None
+    while True:
+        rows, cursor = db.list_postulantes(limit=page_size, cursor=cursor, fields=RULE_FIELDS)
+        if rows:
+            cols = _columns(rows)
+            masks = evaluate_columns(cols, rules)
+            verdict = masks.pop("_apto")
+            undecided = masks.pop("_revisar")
+            for rule, mask in masks.items():
+                fails[rule] = fails.get(rule, 0) + mask.count(False)
+            page_true: List[int] = []
+            page_false: List[int] = []
+            for rid, old, new, name, skip in zip(cols["id"], cols["es_apto"], verdict, cols["puesto_name"], undecided):
+                if skip:  # sin Gemini no se puede validar la sucursal: se deja el veredicto guardado
+                    revisar += 1
+                    continue
+                if bool(old) == new:
+                    continue
+                (page_true if new else page_false).append(rid)
+                d = by_puesto.setdefault(name or "Desconocido", {"a_apto": 0, "a_no_apto": 0})
+                d["a_apto" if new else "a_no_apto"] += 1
+            if apply:
+                db.update_es_apto(page_true, True)
+                db.update_es_apto(page_false, False)
+            to_apto += page_true
+            to_no_apto += page_false
+            scanned += len(rows)
+        if not cursor:
+            break
+    return {
+        "aplicado": apply,
+        "revisados": scanned,
+        "cambian_a_apto": len(to_apto),
+        "cambian_a_no_apto": len(to_no_apto),
+        "por_puesto": by_puesto,
+        "incumplen_por_regla": fails,
+        "requieren_ia": revisar,
+        "ejemplo_ids": {"a_apto": to_apto[:20], "a_no_apto": to_no_apto[:20]},
+        "segundos": round(time.perf_counter() - t0, 3),
+    }
+
+
+# --------------------------------------------------------------------------------
+# CLI: python -m services.rescoring [regla=valor ...] [--apply]
+# Ej.: python -m services.rescoring edad_max=55 acepta_ce=true --apply
+# Sin --apply solo muestra cuántos veredictos cambiarían.
+# --------------------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    overrides: Dict[str, Any] = {}
+    for arg in argv:
+        if "=" in arg:
+            key, value = arg.split("=", 1)
+            overrides[key] = json.loads(value)
+    try:
+        from database import Database, SUPABASE_TIMEOUT_S
+    except ImportError:
+        from services.database import Database, SUPABASE_TIMEOUT_S  # type: ignore
+
+    rules = load_rules(overrides=overrides)
+    summary = rescore(Database(wait_s=SUPABASE_TIMEOUT_S), rules, apply="--apply" in argv)
+    print(json.dumps({"reglas": rules, **summary}, ensure_ascii=False, indent=2), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
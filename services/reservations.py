@@ -0,0 +1,283 @@
+# reservations.py
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+log = logging.getLogger("services.reservations")
+
+# ─────────────────────────────────────────────────────────────
+# Reservas de cupos de entrevista (hold → confirmación / expiración)
+#
+# El aforo diario era check-then-act: se leía el conteo al proponer la fecha
+# y la fila recién se insertaba al finalizar. Aquí cada propuesta toma un
+# "hold" temporal de forma atómica (confirmados + holds vigentes < aforo),
+# la confirmación lo convierte en cupo confirmado y si el candidato no
+# responde a tiempo el hold expira solo.
+# ─────────────────────────────────────────────────────────────
+HOLD_TTL_S = int(os.getenv("INTERVIEW_HOLD_MINUTES", "30")) * 60
+
+
+class InMemoryReservations:
+    """
+    Reservas en memoria (un solo proceso): lock + contadores por día.
+
+    `baseline(day)` da los confirmados ya guardados (p. ej. count_confirmed_for_date
+    del almacén local); se consulta una vez por día, en su primer uso, como
+    SQLiteReservations._seed.
+    """
+
+    def __init__(self, capacity: int, baseline: Optional[Callable[[str], int]] = None) -> None:
+        self.capacity = capacity
+        self.baseline = baseline
+        self._lock = threading.Lock()
+        self._confirmed: Dict[str, int] = {}
+        self._seeded: Set[str] = set()
+        self._holds: Dict[str, tuple] = {}  # chat_id → (day, expires_at)
+
+    def _ensure_seeded(self, day: str) -> None:
+        if self.baseline is None or day in self._seeded:
+            return
+        confirmed = int(self.baseline(day) or 0)  # fuera del lock: puede leer un archivo
+        with self._lock:
+            if day not in self._seeded:
+                self._seeded.add(day)
+                self._confirmed[day] = max(self._confirmed.get(day, 0), confirmed)
+
+    def _active_holds(self, day: str, now: float) -> int:
+        return sum(1 for d, exp in self._holds.values() if d == day and exp >= now)
+
+    def seed(self, day: str, confirmed: int) -> None:
+        """Eleva los confirmados de un día a al menos `confirmed` (p. ej. lo último visto en Supabase)."""
+        with self._lock:
+            self._confirmed[day] = max(self._confirmed.get(day, 0), confirmed)
+
+    def hold(self, day: str, chat_id: str, ttl_s: int = HOLD_TTL_S) -> bool:
+        self._ensure_seeded(day)
+        now = time.time()
+        with self._lock:
+            self._holds = {c: h for c, h in self._holds.items() if h[1] >= now and c != chat_id}
+            if self._confirmed.get(day, 0) + self._active_holds(day, now) >= self.capacity:
+                return False
+            self._holds[chat_id] = (day, now + ttl_s)
+            return True
+
+    def confirm(self, day: str, chat_id: str) -> bool:
+        self._ensure_seeded(day)
+        now = time.time()
+        with self._lock:
+            h = self._holds.get(chat_id)
+            has_hold = bool(h and h[0] == day and h[1] >= now)
+            if has_hold:
+                del self._holds[chat_id]
+            elif self._confirmed.get(day, 0) + self._active_holds(day, now) >= self.capacity:
+                return False
+            self._confirmed[day] = self._confirmed.get(day, 0) + 1
+            return True
+
+    def release(self, chat_id: str) -> None:
+        with self._lock:
+            self._holds.pop(chat_id, None)
+
+    def confirmed(self, day: str) -> int:
+        self._ensure_seeded(day)
+        with self._lock:
+            return self._confirmed.get(day, 0)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interview_slots (
+  day TEXT PRIMARY KEY,
+  confirmed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS interview_holds (
+  chat_id TEXT PRIMARY KEY,
+  day TEXT NOT NULL,
+  expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_interview_holds_day ON interview_holds (day, expires_at);
+"""
+
+
+class SQLiteReservations:
+    """
+    Reservas en SQLite (mismo archivo que SQLiteStore). Cada operación corre en
+    una transacción BEGIN IMMEDIATE: toma el lock de escritura antes de leer los
+    contadores, así el chequeo de aforo y la reserva son atómicos incluso entre
+    procesos.
+    """
+
+    def __init__(self, path: str, capacity: int) -> None:
+        self.path = path
+        self.capacity = capacity
+        self._local = threading.local()
+        self._conn().executescript(_SQLITE_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _txn(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _seed(conn: sqlite3.Connection, day: str) -> int:
+        row = conn.execute("SELECT confirmed FROM interview_slots WHERE day = ?", (day,)).fetchone()
+        if row:
+            return row[0]
+        try:
+            # Primer uso del día: partimos de los confirmados ya guardados en postulantes
+            confirmed = conn.execute(
+                "SELECT COUNT(*) FROM postulantes WHERE confirmacion_asistencia = 1 "
+                "AND fecha_entrevista >= ? AND fecha_entrevista < ?",
+                (day, f"{day}T99"),
+            ).fetchone()[0]
+        except sqlite3.OperationalError:
+            confirmed = 0
+        conn.execute("INSERT INTO interview_slots (day, confirmed) VALUES (?, ?)", (day, confirmed))
+        return confirmed
+
+    def seed(self, day: str, confirmed: int) -> None:
+        """Eleva los confirmados de un día a al menos `confirmed` (p. ej. lo último visto en Supabase)."""
+        with self._txn() as conn:
+            self._seed(conn, day)
+            conn.execute("UPDATE interview_slots SET confirmed = MAX(confirmed, ?) WHERE day = ?", (confirmed, day))
+
+    @staticmethod
+    def _held(conn: sqlite3.Connection, day: str, now: float) -> int:
+        return conn.execute(
+            "SELECT COUNT(*) FROM interview_holds WHERE day = ? AND expires_at >= ?", (day, now)
+        ).fetchone()[0]
+
+    def hold(self, day: str, chat_id: str, ttl_s: int = HOLD_TTL_S) -> bool:
+        now = time.time()
+        with self._txn() as conn:
+            confirmed = self._seed(conn, day)
+            conn.execute("DELETE FROM interview_holds WHERE expires_at < ? OR chat_id = ?", (now, chat_id))
+            if confirmed + self._held(conn, day, now) >= self.capacity:
+                return False
+            conn.execute(
+                "INSERT INTO interview_holds (chat_id, day, expires_at) VALUES (?, ?, ?)",
+                (chat_id, day, now + ttl_s),
+            )
+            return True
+
+    def confirm(self, day: str, chat_id: str) -> bool:
+        now = time.time()
+        with self._txn() as conn:
+            confirmed = self._seed(conn, day)
+            cur = conn.execute(
+                "DELETE FROM interview_holds WHERE chat_id = ? AND day = ? AND expires_at >= ?",
+                (chat_id, day, now),
+            )
+            if cur.rowcount == 0 and confirmed + self._held(conn, day, now) >= self.capacity:
+                return False
+            conn.execute("UPDATE interview_slots SET confirmed = confirmed + 1 WHERE day = ?", (day,))
+            return True
+
+    def release(self, chat_id: str) -> None:
+        self._conn().execute("DELETE FROM interview_holds WHERE chat_id = ?", (chat_id,))
+
+    def confirmed(self, day: str) -> int:
+        row = self._conn().execute("SELECT confirmed FROM interview_slots WHERE day = ?", (day,)).fetchone()
+        return row[0] if row else 0
+
+
+class SupabaseReservations:
+    """
+    Reservas en Supabase vía funciones plpgsql (ver SUPABASE_SQL en database.py):
+    cada RPC bloquea la fila del día con SELECT ... FOR UPDATE, así el chequeo de
+    aforo y la reserva ocurren en la misma transacción del servidor.
+    """
+
+    def __init__(self, client: Any, capacity: int) -> None:
+        self.client = client
+        self.capacity = capacity
+
+    def hold(self, day: str, chat_id: str, ttl_s: int = HOLD_TTL_S) -> bool:
+        res = self.client.rpc("reserve_interview_slot", {
+            "p_day": day, "p_chat_id": chat_id, "p_capacity": self.capacity, "p_ttl_seconds": ttl_s,
+        }).execute()
+        return bool(getattr(res, "data", False))
+
+    def confirm(self, day: str, chat_id: str) -> bool:
+        res = self.client.rpc("confirm_interview_slot", {
+            "p_day": day, "p_chat_id": chat_id, "p_capacity": self.capacity,
+        }).execute()
+        return bool(getattr(res, "data", False))
+
+    def release(self, chat_id: str) -> None:
+        self.client.rpc("release_interview_slot", {"p_chat_id": chat_id}).execute()
+
+    def confirmed(self, day: str) -> int:
+        res = self.client.table("interview_slots").select("confirmed").eq("day", day).limit(1).execute()
+        data = getattr(res, "data", None) or []
+        return int(data[0]["confirmed"]) if data else 0
+
+
+class FailoverReservations:
+    """
+    Reservas que siguen el backend activo de Database: Supabase mientras esté
+    arriba y el almacén local mientras no, sin quedar fijadas al que había al
+    arrancar el bot (la conexión a Supabase se calienta en segundo plano).
+
+    Las confirmaciones tomadas en local se guardan y se reenvían a Supabase
+    (replay) cuando vuelve, para que su contador de aforo las incluya.
+    """
+
+    def __init__(self, pick: Callable[[], Any]) -> None:
+        self.pick = pick
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, str]] = []  # (day, chat_id) confirmados en local
+
+    def hold(self, day: str, chat_id: str, ttl_s: int = HOLD_TTL_S) -> bool:
+        return self.pick().hold(day, chat_id, ttl_s)
+
+    def confirm(self, day: str, chat_id: str) -> bool:
+        backend = self.pick()
+        ok = backend.confirm(day, chat_id)
+        if ok and not isinstance(backend, SupabaseReservations):
+            with self._lock:
+                self._pending.append((day, chat_id))
+        return ok
+
+    def replay(self, primary: Any) -> int:
+        """Reenvía a `primary` las confirmaciones locales; si falla la conexión, quedan para la próxima."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        sent = 0
+        try:
+            for day, chat_id in pending:
+                if not primary.confirm(day, chat_id):
+                    log.warning("⚠️ Día %s sobre el aforo: la confirmación local no entró en Supabase", day,
+                                extra={"chat_id": chat_id})
+                sent += 1
+        except Exception as e:
+            log.warning("⚠️ Reenvío de confirmaciones interrumpido: %s", e)
+            with self._lock:
+                self._pending[:0] = pending[sent:]
+        return sent
+
+    def release(self, chat_id: str) -> None:
+        self.pick().release(chat_id)
+
+    def confirmed(self, day: str) -> int:
+        return self.pick().confirmed(day)
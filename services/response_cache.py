@@ -0,0 +1,76 @@
+# response_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL", "30"))  # tope para ver escrituras de otros procesos
+RESPONSE_CACHE_MAX = int(os.getenv("RESPONSE_CACHE_MAX", "256"))
+
+
+class ResponseCache:
+    """
+    Caché de respuestas JSON de lectura (stats / listados) con ETag.
+
+    Cada entrada guarda el cuerpo ya serializado, su ETag (hash del cuerpo) y
+    la versión de escritura de la BD con que se calculó. Mientras la versión no
+    cambie (ni venza el TTL) se reutiliza: el dashboard que hace polling recibe
+    304 sin tocar la BD ni volver a serializar.
+
+    Last-Modified es el momento en que cambió el cuerpo (su ETag), no la última
+    escritura de la BD. Si `compute` lanza, no se guarda nada.
+    """
+
+    def __init__(self, version: Callable[[], int],
+                 ttl_s: float = RESPONSE_CACHE_TTL_S, max_entries: int = RESPONSE_CACHE_MAX) -> None:
+        self.version = version
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, compute: Callable[[], Any]) -> Dict[str, Any]:
+        """Devuelve {"body", "etag", "last_modified"} para `key`, recalculando si cambió la versión."""
+        version = self.version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["version"] == version and now - entry["at"] <= self.ttl_s:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        self.misses += 1
+        body = json.dumps(compute(), ensure_ascii=False, default=str).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        with self._lock:
+            previous = self._entries.get(key)
+            same = previous is not None and previous["etag"] == etag
+            entry = {
+                "body": body,
+                "etag": etag,
+                "last_modified": previous["last_modified"] if same else time.time(),
+                "version": version,
+                "at": now,
+            }
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
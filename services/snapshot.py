@@ -0,0 +1,260 @@
+# snapshot.py
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+try:
+    from services.sqlite_store import COLUMN_TYPES, BOOL_COLUMNS
+except ImportError:
+    from sqlite_store import COLUMN_TYPES, BOOL_COLUMNS
+
+# ─────────────────────────────────────────────────────────────
+# Snapshot columnar de postulantes para análisis (embudo / conversión)
+#
+# data/snapshot/fecha=YYYY-MM-DD/part-<id>.parquet   (particiones estilo Hive)
+#
+# Incremental: _state.json guarda el mayor id materializado; cada corrida solo
+# agrega una parte nueva por fecha con las filas posteriores. Las filas
+# modificadas después (p. ej. re-evaluación de es_apto) requieren --full.
+# Un snapshot de la versión anterior (partes .cols.gz) se reconstruye entero.
+# ─────────────────────────────────────────────────────────────
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "data/snapshot")
+SNAPSHOT_PAGE_SIZE = 1000
+
+SNAPSHOT_FORMAT = "parquet"
+
+# Tipos de columna: enums con pocos valores distintos van codificados por diccionario
+ENUM_COLUMNS = {
+    "puesto_name", "origen", "destino", "licencia_categoria", "genero", "tipo_documento",
+    "modalidad_trabajo", "medio_captacion", "distrito_residencia", "ciudad_residencia",
+}
+INT_COLUMNS = {"id", "puesto_id", "edad"}
+TIMESTAMP_COLUMNS = {"fecha_postulacion", "fecha_entrevista", "created_at"}
+SNAPSHOT_COLUMNS = ["id"] + [c for c in COLUMN_TYPES if c not in ("respuestas_raw", "idempotency_key")]
+
+
+def _kind(col: str) -> str:
+    if col in BOOL_COLUMNS:
+        return "bool"
+    if col in INT_COLUMNS:
+        return "int"
+    if col in ENUM_COLUMNS:
+        return "enum"
+    if col in TIMESTAMP_COLUMNS:
+        return "timestamp"
+    return "str"
+
+
+def _to_int(v: Any) -> Optional[int]:
+    try:
+        return int(v) if v is not None and v != "" else None
+    except Exception:
+        return None
+
+
+def _to_ts(v: Any) -> Optional[datetime]:
+    if not v:
+        return None
+    try:
+        return datetime.fromisoformat(str(v).replace("Z", "+00:00")).replace(tzinfo=None)
+    except Exception:
+        return None
+
+
+def _partition_key(row: Dict[str, Any]) -> str:
+    return str(row.get("fecha_postulacion") or row.get("created_at") or "")[:10] or "sin_fecha"
+
+
+def _arrow_type(col: str) -> pa.DataType:
+    kind = _kind(col)
+    if kind == "bool":
+        return pa.bool_()
+    if kind == "int":
+        return pa.int32()
+    if kind == "enum":
+        return pa.dictionary(pa.int32(), pa.string())
+    if kind == "timestamp":
+        return pa.timestamp("us")
+    return pa.string()
+
+
+# Esquema fijo: todas las partes comparten tipos aunque una columna venga toda en null
+SNAPSHOT_SCHEMA = pa.schema([(c, _arrow_type(c)) for c in SNAPSHOT_COLUMNS])
+
+
+# ─────────────────────────────────────────────────────────────
+# Escritura de una parte (Parquet)
+# ─────────────────────────────────────────────────────────────
+def _write_part(rows: List[Dict[str, Any]], path_base: str) -> str:
+    arrays = []
+    for field in SNAPSHOT_SCHEMA:
+        values = [r.get(field.name) for r in rows]
+        kind = _kind(field.name)
+        if kind == "bool":
+            arrays.append(pa.array([None if v is None else bool(v) for v in values], pa.bool_()))
+        elif kind == "int":
+            arrays.append(pa.array([_to_int(v) for v in values], pa.int32()))
+        elif kind == "enum":
+            strings = pa.array([None if v is None else str(v) for v in values], pa.string())
+            arrays.append(strings.dictionary_encode().cast(field.type))
+        elif kind == "timestamp":
+            arrays.append(pa.array([_to_ts(v) for v in values], pa.timestamp("us")))
+        else:
+            arrays.append(pa.array([None if v is None else str(v) for v in values], pa.string()))
+    path = path_base + ".parquet"
+    pq.write_table(pa.Table.from_arrays(arrays, schema=SNAPSHOT_SCHEMA), path, compression="zstd")
+    return path
+
+
+# ─────────────────────────────────────────────────────────────
+# Materialización incremental
+# ─────────────────────────────────────────────────────────────
+def _state_path(out_dir: str) -> str:
+    return os.path.join(out_dir, "_state.json")
+
+
+def _load_state(out_dir: str) -> Dict[str, Any]:
+    try:
+        with open(_state_path(out_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {"last_id": 0}
+
+
+def _new_rows(db: Any, last_id: int) -> List[Dict[str, Any]]:
+    """Filas con id > last_id (recorre desde la más reciente y corta al llegar a lo ya materializado)."""
+    out: List[Dict[str, Any]] = []
+    cursor: Optional[str] = None
+    while True:
+        rows, cursor = db.list_postulantes(limit=SNAPSHOT_PAGE_SIZE, cursor=cursor, fields=SNAPSHOT_COLUMNS[1:])
+        for r in rows:
+            if (r.get("id") or 0) <= last_id:
+                return out
+            out.append(r)
+        if not cursor:
+            return out
+
+
+def build_snapshot(db: Any, out_dir: str = SNAPSHOT_DIR, full: bool = False) -> Dict[str, Any]:
+    """Agrega al snapshot las filas nuevas (o lo reconstruye con full=True). Devuelve un resumen."""
+    state = _load_state(out_dir)
+    if state.get("last_id") and state.get("format") != SNAPSHOT_FORMAT:
+        full = True  # snapshot de otro formato: no se mezclan partes
+    if full and os.path.isdir(out_dir):
+        for name in os.listdir(out_dir):
+            part_dir = os.path.join(out_dir, name)
+            if name.startswith("fecha=") and os.path.isdir(part_dir):
+                for f in os.listdir(part_dir):
+                    os.remove(os.path.join(part_dir, f))
+                os.rmdir(part_dir)
+        if os.path.exists(_state_path(out_dir)):
+            os.remove(_state_path(out_dir))
+        state = {"last_id": 0}
+    os.makedirs(out_dir, exist_ok=True)
+    rows = _new_rows(db, int(state.get("last_id") or 0))
+    if not rows:
+        return {"rows": 0, "parts": [], "last_id": state.get("last_id", 0)}
+
+    by_date: Dict[str, List[Dict[str, Any]]] = {}
+    for r in rows:
+        by_date.setdefault(_partition_key(r), []).append(r)
+    last_id = max(r["id"] for r in rows)
+    parts = []
+    for day, day_rows in sorted(by_date.items()):
+        part_dir = os.path.join(out_dir, f"fecha={day}")
+        os.makedirs(part_dir, exist_ok=True)
+        day_rows.sort(key=lambda r: r["id"])
+        parts.append(_write_part(day_rows, os.path.join(part_dir, f"part-{last_id:010d}")))
+
+    state = {"last_id": last_id, "updated_at": datetime.now().isoformat(), "format": SNAPSHOT_FORMAT}
+    tmp = _state_path(out_dir) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, _state_path(out_dir))
+    return {"rows": len(rows), "parts": parts, "last_id": last_id}
+
+
+# ─────────────────────────────────────────────────────────────
+# Lectura / agregados
+# ─────────────────────────────────────────────────────────────
+def _iter_parts(out_dir: str) -> Iterator[str]:
+    if not os.path.isdir(out_dir):
+        return
+    for name in sorted(os.listdir(out_dir)):
+        part_dir = os.path.join(out_dir, name)
+        if name.startswith("fecha=") and os.path.isdir(part_dir):
+            for f in sorted(os.listdir(part_dir)):
+                if f.endswith(".parquet"):
+                    yield os.path.join(part_dir, f)
+
+
+def _dataset(out_dir: str) -> ds.Dataset:
+    """Todas las partes como un dataset; `fecha` sale del nombre de la partición."""
+    partitioning = ds.partitioning(pa.schema([("fecha", pa.string())]), flavor="hive")
+    return ds.dataset(list(_iter_parts(out_dir)), schema=SNAPSHOT_SCHEMA.append(pa.field("fecha", pa.string())),
+                      format="parquet", partitioning=partitioning, partition_base_dir=out_dir)
+
+
+def snapshot_stats(out_dir: str = SNAPSHOT_DIR, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None, puesto_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Agregados al estilo Database.get_stats sobre el snapshot. Escaneo columnar:
+    solo se leen puesto_name y es_apto (y puesto_id si se filtra); las
+    particiones fuera del rango de fecha se descartan sin abrirlas.
+    """
+    dataset = _dataset(out_dir)
+    where = None
+    for cond in (
+        ds.field("fecha") >= start_date if start_date else None,
+        ds.field("fecha") <= end_date if end_date else None,
+        ds.field("puesto_id") == puesto_id if puesto_id is not None else None,
+    ):
+        if cond is not None:
+            where = cond if where is None else where & cond
+    table = dataset.to_table(columns=["puesto_name", "es_apto"], filter=where)
+    names = pc.fill_null(table["puesto_name"].cast(pa.string()), "Desconocido")
+    grouped = pa.table({"puesto": names, "apto": pc.fill_null(table["es_apto"], False).cast(pa.int64())})
+    grouped = grouped.group_by("puesto").aggregate([("apto", "sum"), ("apto", "count")])
+    por_puesto = dict(zip(grouped["puesto"].to_pylist(), grouped["apto_count"].to_pylist()))
+    return {
+        "total": table.num_rows,
+        "aptos": sum(grouped["apto_sum"].to_pylist()),
+        "por_puesto": dict(sorted(por_puesto.items())),
+    }
+
+
+# --------------------------------------------------------------------------------
+# CLI: python -m services.snapshot [--full] [--stats]
+# Materializa (incremental) los postulantes en SNAPSHOT_DIR e imprime agregados.
+# --------------------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        from database import Database, SUPABASE_TIMEOUT_S
+    except ImportError:
+        from services.database import Database, SUPABASE_TIMEOUT_S  # type: ignore
+
+    t0 = time.perf_counter()
+    summary = build_snapshot(Database(wait_s=SUPABASE_TIMEOUT_S), full="--full" in argv)
+    print(
+        f"✅ Snapshot: {summary['rows']} filas nuevas en {len(summary['parts'])} particiones "
+        f"(último id {summary['last_id']}, {SNAPSHOT_FORMAT}) en {time.perf_counter() - t0:.1f}s",
+        flush=True,
+    )
+    if "--stats" in argv:
+        print(json.dumps(snapshot_stats(), ensure_ascii=False, indent=2), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,365 @@
+# sqlite_store.py
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+log = logging.getLogger("services.sqlite_store")
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+SQLITE_FILE = os.getenv("SQLITE_FILE", "data/postulantes.db")
+
+# Columnas de public.postulantes (SUPABASE_SQL) + las que agrega _build_payload
+COLUMN_TYPES: Dict[str, str] = {
+    "phone_number": "TEXT NOT NULL",
+    "puesto_id": "INTEGER",
+    "puesto_name": "TEXT",
+    "edad": "INTEGER",
+    "origen": "TEXT",
+    "destino": "TEXT",
+    "secundaria_completa": "BOOLEAN",
+    "tiene_dni": "BOOLEAN",
+    "tiene_licencia": "BOOLEAN",
+    "licencia_categoria": "TEXT",
+    "disponibilidad_inmediata": "BOOLEAN",
+    "nombre_completo": "TEXT",
+    "nombres": "TEXT",
+    "apellidos": "TEXT",
+    "genero": "TEXT",
+    "tipo_documento": "TEXT",
+    "numero_documento": "TEXT",
+    "correo_electronico": "TEXT",
+    "ha_trabajado_en_hermes": "BOOLEAN",
+    "modalidad_trabajo": "TEXT",
+    "distrito_residencia": "TEXT",
+    "ciudad_residencia": "TEXT",
+    "medio_captacion": "TEXT",
+    "medio_captacion_otro": "TEXT",
+    "puesto_otros_detalle": "TEXT",
+    "horario_entrevista": "TEXT",
+    "fecha_entrevista": "TEXT",
+    "confirmacion_asistencia": "BOOLEAN",
+    "autorizacion_datos": "BOOLEAN",
+    "es_apto": "BOOLEAN DEFAULT 0",
+    "respuestas_raw": "TEXT",
+    "fecha_postulacion": "TEXT",
+    "idempotency_key": "TEXT",
+    "created_at": "TEXT",
+}
+COLUMNS: List[str] = list(COLUMN_TYPES)
+BOOL_COLUMNS = {c for c, t in COLUMN_TYPES.items() if t.startswith("BOOLEAN")}
+
+SCHEMA_SQL = (
+    "CREATE TABLE IF NOT EXISTS postulantes (\n  id INTEGER PRIMARY KEY AUTOINCREMENT,\n  "
+    + ",\n  ".join(f"{c} {t}" for c, t in COLUMN_TYPES.items())
+    + "\n);\n"
+    "CREATE INDEX IF NOT EXISTS idx_postulantes_phone      ON postulantes (phone_number, id);\n"
+    "CREATE INDEX IF NOT EXISTS idx_postulantes_es_apto    ON postulantes (es_apto, id);\n"
+    "CREATE INDEX IF NOT EXISTS idx_postulantes_entrevista ON postulantes (fecha_entrevista) WHERE confirmacion_asistencia = 1;\n"
+    "CREATE INDEX IF NOT EXISTS idx_postulantes_created_id ON postulantes (created_at, id);\n"
+    "CREATE INDEX IF NOT EXISTS idx_postulantes_puesto_id  ON postulantes (puesto_id, id);\n"
+    # Índices de una sola columna reemplazados por los compuestos (keyset pagination)
+    "DROP INDEX IF EXISTS idx_postulantes_created_at;\n"
+    "DROP INDEX IF EXISTS idx_postulantes_puesto;\n"
+)
+
+# Sentencias fijas: sqlite3 las mantiene preparadas en su caché por conexión
+# OR IGNORE + índice UNIQUE: reintentar la misma postulación (misma idempotency_key) no la duplica
+_INSERT_SQL = f"INSERT OR IGNORE INTO postulantes ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})"
+_BY_KEY_SQL = "SELECT * FROM postulantes WHERE idempotency_key = ?"
+_LATEST_SQL = "SELECT * FROM postulantes WHERE phone_number = ? ORDER BY id DESC LIMIT 1"
+_COUNT_DATE_SQL = (
+    "SELECT COUNT(*) FROM postulantes "
+    "WHERE confirmacion_asistencia = 1 AND fecha_entrevista >= ? AND fecha_entrevista < ?"
+)
+_COUNT_RANGE_SQL = (
+    "SELECT substr(fecha_entrevista, 1, 10), COUNT(*) FROM postulantes "
+    "WHERE confirmacion_asistencia = 1 AND fecha_entrevista >= ? AND fecha_entrevista < ? GROUP BY 1"
+)
+# Orden de los listados (más recientes primero) y su condición keyset "después de (valor, id)"
+_LIST_ORDER = {
+    "id": ("id DESC", "id < ?"),
+    "created_at": ("created_at DESC, id DESC", "(created_at < ? OR (created_at = ? AND id < ?))"),
+}
+_STATS_SQL = (
+    "SELECT COALESCE(puesto_name, 'Desconocido'), COUNT(*), SUM(CASE WHEN es_apto = 1 THEN 1 ELSE 0 END) "
+    "FROM postulantes{where} GROUP BY 1"
+)
+
+
+class SQLiteStore:
+    """
+    Backend local SQLite para postulantes (reemplaza al JSON cuando no hay Supabase).
+
+    - Modo WAL: lecturas concurrentes sin bloquear al escritor.
+    - Una conexión por hilo (sqlite3 no comparte conexiones entre hilos).
+    - Todas las lecturas de Database son consultas indexadas.
+    """
+
+    def __init__(self, path: str = SQLITE_FILE,
+                 import_from: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA_SQL)
+        self._ensure_columns(conn)
+        self._ensure_unique_key(conn)
+        if import_from is not None:
+            self._import_once(import_from)
+
+    # ─────────────────────────────────────────────────────────────
+    # Conexiones
+    # ─────────────────────────────────────────────────────────────
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _ensure_columns(self, conn: sqlite3.Connection) -> None:
+        """Agrega columnas nuevas a bases creadas con un esquema anterior."""
+        existing = {r[1] for r in conn.execute("PRAGMA table_info(postulantes)")}
+        for col, typ in COLUMN_TYPES.items():
+            if col not in existing:
+                conn.execute(f"ALTER TABLE postulantes ADD COLUMN {col} {typ.replace(' NOT NULL', '')}")
+
+    def _ensure_unique_key(self, conn: sqlite3.Connection) -> None:
+        """
+        Índice UNIQUE sobre idempotency_key (las filas sin clave, NULL, no chocan entre sí).
+        Va después de _ensure_columns porque bases anteriores no tienen la columna; si
+        ya traen duplicados se conserva la primera fila de cada clave.
+        """
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "DELETE FROM postulantes WHERE idempotency_key IS NOT NULL AND id NOT IN "
+                    "(SELECT MIN(id) FROM postulantes WHERE idempotency_key IS NOT NULL GROUP BY idempotency_key)"
+                )
+                conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_postulantes_idempotency "
+                             "ON postulantes (idempotency_key)")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _import_once(self, source: Callable[[], Iterable[Dict[str, Any]]]) -> None:
+        """Importa filas de otro almacén local (p. ej. el log JSONL) si la tabla está vacía."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM postulantes LIMIT 1").fetchone():
+            return
+        try:
+            rows = list(source())
+        except Exception as e:
+            log.warning("⚠️ No se pudo leer almacén previo para importar a SQLite: %s", e)
+            return
+        if not rows:
+            return
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(_INSERT_SQL, [self._params(r) for r in rows])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        log.info("✅ Importados %s postulantes a SQLite (%s)", len(rows), self.path)
+
+    # ─────────────────────────────────────────────────────────────
+    # Conversión de filas
+    # ─────────────────────────────────────────────────────────────
+    @staticmethod
+    def _params(row: Dict[str, Any]) -> List[Any]:
+        out: List[Any] = []
+        for c in COLUMNS:
+            v = row.get(c)
+            if c == "created_at" and v is None:
+                v = datetime.now().isoformat()
+            elif isinstance(v, (dict, list)):
+                v = json.dumps(v, ensure_ascii=False)
+            out.append(v)
+        return out
+
+    @staticmethod
+    def _row(r: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if r is None:
+            return None
+        d = dict(r)
+        for c in BOOL_COLUMNS:
+            if d.get(c) is not None:
+                d[c] = bool(d[c])
+        return d
+
+    # ─────────────────────────────────────────────────────────────
+    # Escritura
+    # ─────────────────────────────────────────────────────────────
+    def insert(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        conn = self._conn()
+        params = self._params(row)
+        with self._write_lock:
+            cur = conn.execute(_INSERT_SQL, params)
+        if cur.rowcount == 0:  # idempotency_key ya guardada: devolvemos la fila existente
+            existing = self._row(conn.execute(_BY_KEY_SQL, (row.get("idempotency_key"),)).fetchone())
+            if existing is not None:
+                return existing
+        out = dict(zip(COLUMNS, params))
+        out.update({k: v for k, v in row.items() if k not in out})
+        out["id"] = cur.lastrowid
+        return out
+
+    def insert_many(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Inserta un lote en una sola transacción (un fsync de WAL para todo el lote).
+        Devuelve las filas nuevas (las de idempotency_key ya guardada se ignoran).
+        """
+        conn = self._conn()
+        params = [self._params(r) for r in rows]
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = conn.executemany(_INSERT_SQL, params)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return cur.rowcount
+
+    def update(self, row_id: int, fields: Dict[str, Any]) -> bool:
+        cols = [c for c in fields if c in COLUMN_TYPES]
+        if not cols:
+            return False
+        sql = f"UPDATE postulantes SET {', '.join(f'{c} = ?' for c in cols)} WHERE id = ?"
+        with self._write_lock:
+            cur = self._conn().execute(sql, [fields[c] for c in cols] + [row_id])
+        return cur.rowcount > 0
+
+    def update_many(self, row_ids: List[int], fields: Dict[str, Any]) -> int:
+        """Mismos `fields` para todas las filas de `row_ids` (UPDATE ... WHERE id IN, en una transacción)."""
+        cols = [c for c in fields if c in COLUMN_TYPES]
+        if not cols or not row_ids:
+            return 0
+        conn = self._conn()
+        values = [fields[c] for c in cols]
+        set_sql = ", ".join(f"{c} = ?" for c in cols)
+        n = 0
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for i in range(0, len(row_ids), 500):
+                    chunk = row_ids[i:i + 500]
+                    sql = f"UPDATE postulantes SET {set_sql} WHERE id IN ({', '.join('?' for _ in chunk)})"
+                    n += conn.execute(sql, values + list(chunk)).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return n
+
+    def flush(self) -> None:
+        pass  # cada sentencia es su propia transacción (autocommit)
+
+    # ─────────────────────────────────────────────────────────────
+    # Lectura (todas indexadas)
+    # ─────────────────────────────────────────────────────────────
+    def get_latest(self, phone_number: str) -> Optional[Dict[str, Any]]:
+        return self._row(self._conn().execute(_LATEST_SQL, (phone_number,)).fetchone())
+
+    def count_confirmed_for_date(self, date_iso: str) -> int:
+        day = date_iso.split("T")[0]
+        return self._conn().execute(_COUNT_DATE_SQL, (day, f"{day}T99")).fetchone()[0]
+
+    def confirmed_counts(self, start_date: str, end_date: str) -> Dict[str, int]:
+        cur = self._conn().execute(_COUNT_RANGE_SQL, (start_date, f"{end_date}T99"))
+        return {day: n for day, n in cur.fetchall()}
+
+    def list_rows(self, limit: int = 100, es_apto: Optional[bool] = None, puesto_id: Optional[int] = None,
+                  start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  after: Optional[tuple] = None, order_by: str = "id",
+                  fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Página de postulantes (más recientes primero) con paginación keyset:
+        `after` = (valor, id) de la última fila de la página anterior.
+        `fields` proyecta columnas (siempre incluye id y la columna de orden).
+        """
+        order_sql, after_sql = _LIST_ORDER[order_by]
+        cols = "*"
+        if fields:
+            keep = ["id"] + ([order_by] if order_by != "id" else [])
+            cols = ", ".join(dict.fromkeys(keep + [f for f in fields if f in COLUMN_TYPES]))
+        where: List[str] = []
+        params: List[Any] = []
+        if es_apto is not None:
+            where.append("es_apto = ?")
+            params.append(1 if es_apto else 0)
+        if puesto_id is not None:
+            where.append("puesto_id = ?")
+            params.append(puesto_id)
+        if start_date:
+            where.append("created_at >= ?")
+            params.append(start_date)
+        if end_date:
+            where.append("created_at < ?")
+            params.append(f"{end_date}T99")
+        if after is not None:
+            where.append(after_sql)
+            params.extend([after[1]] if order_by == "id" else [after[0], after[0], after[1]])
+        sql = (
+            f"SELECT {cols} FROM postulantes"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + f" ORDER BY {order_sql} LIMIT ?"
+        )
+        cur = self._conn().execute(sql, params + [limit])
+        return [self._row(r) for r in cur.fetchall()]  # type: ignore[misc]
+
+    def stats(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              puesto_id: Optional[int] = None) -> Dict[str, Any]:
+        """Conteos agrupados por puesto (GROUP BY en SQLite), con filtros opcionales por created_at y puesto."""
+        where: List[str] = []
+        params: List[Any] = []
+        if start_date:
+            where.append("created_at >= ?")
+            params.append(start_date)
+        if end_date:
+            where.append("created_at < ?")
+            params.append(f"{end_date}T99")
+        if puesto_id is not None:
+            where.append("puesto_id = ?")
+            params.append(puesto_id)
+        sql = _STATS_SQL.format(where=(" WHERE " + " AND ".join(where)) if where else "")
+        total = aptos = 0
+        by_puesto: Dict[str, int] = {}
+        for name, n, n_apto in self._conn().execute(sql, params):
+            by_puesto[name] = n
+            total += n
+            aptos += n_apto or 0
+        return {"total": total, "aptos": aptos, "por_puesto": by_puesto}
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        for r in self._conn().execute("SELECT * FROM postulantes ORDER BY id"):
+            yield self._row(r)  # type: ignore[misc]
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return list(self.iter_rows())
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM postulantes").fetchone()[0]
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,314 @@
+# tracing.py
+from __future__ import annotations
+
+import atexit
+import contextvars
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+log = logging.getLogger("services.tracing")
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") != "0"
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "200"))          # trazas recientes en memoria (/chatbot/traces)
+TRACE_FILE = os.getenv("TRACE_FILE", "")                      # JSONL con un span por línea (vacío = solo memoria)
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))     # turnos más lentos se loguean con su desglose
+CHAT_REF_SECRET = os.getenv("CHAT_REF_SECRET", "")           # clave HMAC de los chats anonimizados (vacía = aleatoria por proceso)
+
+# Contexto que viaja por colas (write-behind, outbox): idempotency_key → span de origen
+_LINKS_MAX = 2000
+
+
+# Sin clave, un hash del teléfono se revierte probando los ~10⁹ celulares posibles
+_CHAT_REF_KEY = CHAT_REF_SECRET.encode("utf-8") or os.urandom(32)
+
+
+def chat_ref(chat_id: str) -> str:
+    """
+    Chat anonimizado (trazas, perfiles, cassette): HMAC-SHA256 con CHAT_REF_SECRET.
+    Se puede buscar por teléfono sin guardarlo; sin la clave no se revierte.
+    """
+    return "chat-" + hmac.new(_CHAT_REF_KEY, chat_id.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+
+def _new_id(bits: int) -> str:
+    return format(random.getrandbits(bits), f"0{bits // 4}x")
+
+
+class Span:
+    """Tramo de una traza. Se exporta al cerrarse (también si se cierra en otro hilo)."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "start", "_t0", "ms", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: Dict[str, Any]) -> None:
+        self.trace_id = trace_id
+        self.span_id = _new_id(32)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def end(self) -> None:
+        self.ms = round((time.perf_counter() - self._t0) * 1000, 3)
+        EXPORTER.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        entry = {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "start": round(self.start, 6), "ms": self.ms,
+        }
+        if self.attrs:
+            entry["attrs"] = self.attrs
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+
+class _NoopSpan:
+    """Fuera de una traza (tests, hilos de fondo sin contexto): no registra nada."""
+
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+
+NOOP = _NoopSpan()
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+
+
+class _ActiveSpan:
+    __slots__ = ("span", "_token")
+
+    def __init__(self, span: Span) -> None:
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        _current.reset(self._token)
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"[:300]
+        self.span.end()
+
+
+def trace(name: str, **attrs: Any) -> Any:
+    """Abre la traza de un mensaje entrante (span raíz). Uso: `with trace("webhook") as root:`."""
+    if not TRACING_ENABLED:
+        return NOOP
+    return _ActiveSpan(Span(name, _new_id(64), None, attrs))
+
+
+def span(name: str, **attrs: Any) -> Any:
+    """Span hijo del actual; sin traza activa es un no-op (casi gratis)."""
+    parent = _current.get()
+    if parent is None:
+        return NOOP
+    return _ActiveSpan(Span(name, parent.trace_id, parent.span_id, attrs))
+
+
+def traced(name: str) -> Callable:
+    """Decorador: la llamada queda como span hijo (si hay traza activa)."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def annotate(**attrs: Any) -> None:
+    """Agrega atributos al span actual (si hay traza activa)."""
+    current = _current.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+def record_span(parent: Optional[Span], name: str, start: float, ms: float, **attrs: Any) -> None:
+    """
+    Registra un span ya medido bajo `parent` (típicamente capturado antes de
+    encolar): así el trabajo de un hilo de fondo aparece en la traza del turno.
+    """
+    if parent is None:
+        return
+    child = Span(name, parent.trace_id, parent.span_id, attrs)
+    child.start, child.ms = start, round(ms, 3)
+    EXPORTER.export(child, late=True)
+
+
+# ─────────────────────────────────────────────────────────────
+# Contexto a través de colas
+# ─────────────────────────────────────────────────────────────
+_links: "OrderedDict[str, Span]" = OrderedDict()
+_links_lock = threading.Lock()
+
+
+def link(key: Optional[str], parent: Optional[Span] = None) -> None:
+    """Asocia `key` (p. ej. la idempotency_key del payload) al span actual."""
+    parent = parent or _current.get()
+    if parent is None or not key:
+        return
+    with _links_lock:
+        _links[key] = parent
+        _links.move_to_end(key)
+        while len(_links) > _LINKS_MAX:
+            _links.popitem(last=False)
+
+
+def linked(key: Optional[str]) -> Optional[Span]:
+    """Span de origen de `key` (el hilo que lo consume lo usa como padre)."""
+    with _links_lock:
+        return _links.get(key) if key else None
+
+
+# ─────────────────────────────────────────────────────────────
+# Exportador local: ring buffer en memoria + archivo JSONL opcional
+# ─────────────────────────────────────────────────────────────
+class TraceExporter:
+    """
+    - Buffer: las últimas `capacity` trazas (agrupadas por trace_id), con los
+      spans que llegan tarde desde colas incluidos mientras la traza siga ahí.
+    - Archivo: un span por línea; lo escribe un hilo aparte, no el del request.
+    """
+
+    def __init__(self, capacity: int = TRACE_BUFFER, path: str = TRACE_FILE, slow_ms: float = TRACE_SLOW_MS) -> None:
+        self.capacity = capacity
+        self.path = path
+        self.slow_ms = slow_ms
+        self._traces: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+    def export(self, span: Span, late: bool = False) -> None:
+        """`late`: span de un hilo de fondo; si su traza ya salió del buffer, queda solo en el archivo."""
+        entry = span.to_dict()
+        with self._lock:
+            trace = self._traces.get(span.trace_id)
+            if trace is None and not late:
+                trace = self._traces[span.trace_id] = {"trace_id": span.trace_id, "spans": []}
+                while len(self._traces) > self.capacity:
+                    self._traces.popitem(last=False)
+            if trace is not None:
+                trace["spans"].append(entry)
+                if span.parent_id is None:
+                    if len(trace["spans"]) == 1 and not span.error:
+                        # Sin spans hijos (webhook ignorado: grupo, propio, otro evento): no ocupa el buffer
+                        del self._traces[span.trace_id]
+                        return
+                    trace.update(name=span.name, start=entry["start"], ms=span.ms, attrs=span.attrs)
+        if self.path:
+            self._write(entry)
+        if span.parent_id is None and span.ms is not None and span.ms >= self.slow_ms:
+            log.warning("🐢 Turno lento (%.0f ms)", span.ms,
+                        extra={"trace_id": span.trace_id, "breakdown": self.breakdown(span.trace_id)})
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self._writer = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.close)
+        self._queue.put(entry)
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self) -> None:
+        """Vacía el archivo (el hilo escribe lo encolado y termina)."""
+        writer = self._writer
+        if writer is not None and writer.is_alive():
+            self._queue.put(None)
+            writer.join(timeout=5)
+        self._writer = None
+
+    # ─────────────────────────────────────────────────────────────
+    # Consulta
+    # ─────────────────────────────────────────────────────────────
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            trace = self._traces.get(trace_id)
+            return None if trace is None else {**trace, "spans": sorted(trace["spans"], key=lambda s: s["start"])}
+
+    def breakdown(self, trace_id: str) -> Dict[str, float]:
+        """ms por nombre de span hijo (suma), de mayor a menor."""
+        trace = self.get(trace_id)
+        totals: Dict[str, float] = defaultdict(float)
+        for s in (trace or {}).get("spans", []):
+            if s["parent_id"] is not None and s["ms"] is not None:
+                totals[s["name"]] += s["ms"]
+        return {k: round(v, 1) for k, v in sorted(totals.items(), key=lambda kv: -kv[1])}
+
+    def recent(self, limit: int = 20, min_ms: float = 0.0, chat: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Trazas terminadas más recientes primero, con su desglose por span."""
+        with self._lock:
+            traces = [t for t in reversed(self._traces.values()) if t.get("ms") is not None]
+        out = []
+        for t in traces:
+            if t["ms"] < min_ms or (chat and (t.get("attrs") or {}).get("chat") != chat):
+                continue
+            out.append({
+                "trace_id": t["trace_id"], "name": t["name"], "start": t["start"], "ms": t["ms"],
+                "attrs": t.get("attrs") or {}, "spans": len(t["spans"]), "breakdown": self.breakdown(t["trace_id"]),
+            })
+            if len(out) >= limit:
+                break
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+
+EXPORTER = TraceExporter()
+
+
+def iter_file(path: str = TRACE_FILE) -> Iterator[Dict[str, Any]]:
+    """Spans del archivo JSONL (para analizar fuera de línea)."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -1,14 +1,25 @@
 import os
 import time
+import logging
+import threading
 import requests
 from typing import Optional, Dict, Any
 
+try:
+    from services.metrics import WAHA_SECONDS
+    from services.tracing import span
+except ImportError:
+    from metrics import WAHA_SECONDS
+    from tracing import span
+
+log = logging.getLogger("services.waha")
+
 class Waha:
     """
     Cliente robusto para WAHA (versión corregida y estable).
     """
 
-    def __init__(self):
+    def __init__(self, probe: bool = True):
         self.base_url = os.getenv("WAHA_URL", "http://waha:3000").rstrip("/")
         self.api_key = os.getenv("WAHA_API_KEY", "")
         self.session = os.getenv("WAHA_SESSION", "default")
@@ -18,37 +29,51 @@ class Waha:
             "Content-Type": "application/json",
         }
 
-        self._test_connection()
+        # La verificación de conexión corre en segundo plano: no bloquea el arranque
+        self.status = "unknown"
+        self.probed = threading.Event()
+        if probe:
+            threading.Thread(target=self._test_connection, name="waha-probe", daemon=True).start()
 
     def _test_connection(self):
         """Verifica la conexión con WAHA al inicializar"""
+        t0 = time.perf_counter()
         try:
             url = f"{self.base_url}/api/server/status"
             r = requests.get(url, headers=self.headers, timeout=5)
-            print(f"✅ WAHA conectado correctamente: {r.status_code}", flush=True)
+            WAHA_SECONDS.observe(time.perf_counter() - t0, "/api/server/status", f"{r.status_code // 100}xx")
+            self.status = "ok" if r.status_code < 400 else f"http {r.status_code}"
+            log.info("✅ WAHA conectado correctamente: %s", r.status_code)
         except Exception as e:
-            print(
-                f"⚠️ Advertencia: No se pudo verificar conexión con WAHA: {e}",
-                flush=True,
-            )
+            WAHA_SECONDS.observe(time.perf_counter() - t0, "/api/server/status", "error")
+            self.status = "error"
+            log.warning("⚠️ Advertencia: No se pudo verificar conexión con WAHA: %s", e)
+        finally:
+            self.probed.set()
 
     def _post(self, path: str, payload: dict, timeout: int = 20) -> requests.Response:
         """Método base para hacer POST requests con mejores logs"""
         url = f"{self.base_url}{path}"
+        t0 = time.perf_counter()
         try:
-            r = requests.post(
-                url, json=payload, headers=self.headers, timeout=timeout
-            )
-            print(f"📤 WAHA POST {path} -> Status: {r.status_code}", flush=True)
+            with span("waha.post", path=path) as sp:
+                r = requests.post(
+                    url, json=payload, headers=self.headers, timeout=timeout
+                )
+                sp.set(status=r.status_code)
+            WAHA_SECONDS.observe(time.perf_counter() - t0, path, f"{r.status_code // 100}xx")
+            log.debug("📤 WAHA POST %s -> Status: %s", path, r.status_code)
 
             if r.status_code >= 400:
-                print(f"❌ WAHA ERROR BODY: {r.text}", flush=True)
+                log.error("❌ WAHA POST %s -> %s", path, r.status_code, extra={"body": r.text[:500]})
 
             r.raise_for_status()
             return r
 
         except requests.exceptions.RequestException as e:
-            print(f"❌ Error en WAHA POST {path}: {e}", flush=True)
+            if not isinstance(e, requests.exceptions.HTTPError):
+                WAHA_SECONDS.observe(time.perf_counter() - t0, path, "error")  # sin respuesta HTTP
+            log.error("❌ Error en WAHA POST %s: %s", path, e)
             raise
 
     def send_message(self, chat_id: str, message: str) -> Optional[Dict[Any, Any]]:
@@ -57,7 +82,7 @@ class Waha:
         """
 
         if not message or not message.strip():
-            print("⚠️ Intento de enviar mensaje vacío", flush=True)
+            log.warning("⚠️ Intento de enviar mensaje vacío")
             return None
 
         payload = {
@@ -68,10 +93,10 @@ class Waha:
 
         try:
             r = self._post("/api/sendText", payload)
-            print("✅ Mensaje enviado correctamente", flush=True)
+            log.debug("✅ Mensaje enviado correctamente")
             return r.json() if r.text else {}
         except Exception as e:
-            print("❌ Falló sendText", flush=True)
+            log.error("❌ Falló sendText")
             raise
 
     def start_typing(self, chat_id: str) -> bool:
@@ -81,7 +106,7 @@ class Waha:
             self._post("/api/startTyping", payload, timeout=10)
             return True
         except Exception as e:
-            print(f"⚠️ Warning startTyping: {e}", flush=True)
+            log.warning("⚠️ Warning startTyping: %s", e)
             return False
 
     def stop_typing(self, chat_id: str) -> bool:
@@ -91,7 +116,7 @@ class Waha:
             self._post("/api/stopTyping", payload, timeout=10)
             return True
         except Exception as e:
-            print(f"⚠️ Warning stopTyping: {e}", flush=True)
+            log.warning("⚠️ Warning stopTyping: %s", e)
             return False
 
     def send_seen(self, chat_id: str) -> bool:
@@ -104,7 +129,7 @@ class Waha:
             self._post("/api/sendSeen", payload, timeout=10)
             return True
         except Exception as e:
-            print(f"⚠️ Warning sendSeen: {e}", flush=True)
+            log.warning("⚠️ Warning sendSeen: %s", e)
             return False
 
     def get_history_messages(self, chat_id: str, limit: int = 10) -> Optional[list]:
@@ -119,5 +144,5 @@ class Waha:
             r.raise_for_status()
             return r.json()
         except Exception as e:
-            print(f"❌ Error al obtener historial: {e}", flush=True)
+            log.error("❌ Error al obtener historial: %s", e)
             return None
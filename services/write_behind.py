@@ -0,0 +1,262 @@
+# write_behind.py
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+try:
+    import fcntl  # journal en exclusiva por proceso (Linux/macOS)
+except Exception:
+    fcntl = None
+
+try:
+    from services.tracing import link, linked, record_span, traced
+except ImportError:
+    from tracing import link, linked, record_span, traced
+
+log = logging.getLogger("services.write_behind")
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "1") == "1"
+WRITE_BEHIND_JOURNAL = os.getenv("WRITE_BEHIND_JOURNAL", "data/write_behind.jsonl")
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "20"))             # flush al juntar N filas…
+WRITE_BEHIND_INTERVAL_S = float(os.getenv("WRITE_BEHIND_INTERVAL", "2.0"))  # …o cada T segundos
+WRITE_BEHIND_RETRY_S = 5.0                                                  # espera tras un flush fallido
+
+
+class WriteBehindBuffer:
+    """
+    Persistencia diferida de postulaciones completadas.
+
+    - enqueue() arma el payload, lo escribe en un journal local (append + fsync)
+      y retorna de inmediato: el webhook ya no espera el INSERT en Supabase.
+    - Un hilo de fondo vacía el buffer por tamaño (WRITE_BEHIND_BATCH) o por
+      tiempo (WRITE_BEHIND_INTERVAL_S) con db.save_postulantes_batch (un solo
+      INSERT para todo el lote).
+    - Journal: líneas {"seq", "payload"} al encolar y {"ack": [seq…]} al
+      persistir. Al reiniciar se re-encola lo que no tiene ack; cuando el buffer
+      queda vacío el journal se trunca.
+    - Cada proceso toma su journal con flock: si otro worker ya tiene
+      WRITE_BEHIND_JOURNAL, usa "<journal>.<pid>.jsonl". Al arrancar adopta los
+      journals de procesos muertos (sin lock) y los borra.
+    """
+
+    def __init__(self, db: Any, journal_path: str = WRITE_BEHIND_JOURNAL,
+                 batch_size: int = WRITE_BEHIND_BATCH, interval_s: float = WRITE_BEHIND_INTERVAL_S,
+                 start: bool = True) -> None:
+        self.db = db
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._queue: Deque[tuple] = deque()  # (seq, enqueued_at, payload)
+        self._seq = 0
+        self._flush_lock = threading.Lock()
+
+        # Métricas
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        self._fd = self._claim_journal()
+        self._recover()
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    # ─────────────────────────────────────────────────────────────
+    # Journal
+    # ─────────────────────────────────────────────────────────────
+    @staticmethod
+    def _try_lock(fd: int) -> bool:
+        if fcntl is None:
+            return True  # Windows: sin exclusión entre procesos
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _claim_journal(self) -> int:
+        """Abre y bloquea el journal; si otro proceso lo tiene, usa uno con el pid."""
+        root, ext = os.path.splitext(self.journal_path)
+        pid = os.getpid()
+        # Varios buffers en el mismo proceso (tests, varios bots): <pid>-1, <pid>-2…
+        candidates = [self.journal_path, f"{root}.{pid}{ext}"] + [f"{root}.{pid}-{i}{ext}" for i in range(1, 100)]
+        for path in candidates:
+            fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            if self._try_lock(fd):
+                self._base_path, self.journal_path = self.journal_path, path
+                return fd
+            os.close(fd)
+        raise RuntimeError(f"Write-behind: no se pudo bloquear el journal {self.journal_path}")
+
+    @staticmethod
+    def _read_pending(path: str) -> Dict[int, Dict[str, Any]]:
+        pending: Dict[int, Dict[str, Any]] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except Exception:
+                    continue  # línea truncada por un corte
+                if "ack" in entry:
+                    for seq in entry["ack"]:
+                        pending.pop(seq, None)
+                elif "seq" in entry:
+                    pending[entry["seq"]] = entry["payload"]
+        return pending
+
+    def _recover(self) -> None:
+        pending = self._read_pending(self.journal_path)
+        self._seq = max(pending, default=0)
+        now = time.time()
+        for seq in sorted(pending):
+            self._queue.append((seq, now, pending[seq]))
+
+        # Journals de otros procesos que ya no corren (nadie tiene su lock)
+        root, ext = os.path.splitext(self._base_path)
+        adopted = 0
+        for path in [self._base_path] + sorted(glob.glob(f"{glob.escape(root)}.*{ext}")):
+            if path == self.journal_path or not os.path.exists(path):
+                continue
+            fd = os.open(path, os.O_RDWR)
+            try:
+                if not self._try_lock(fd):
+                    continue  # worker vivo: su journal es suyo
+                for _, payload in sorted(self._read_pending(path).items()):
+                    self._seq += 1
+                    self._journal({"seq": self._seq, "payload": payload})
+                    self._queue.append((self._seq, now, payload))
+                    adopted += 1
+                os.unlink(path)
+            finally:
+                os.close(fd)
+        if self._queue:
+            log.info("♻️ Write-behind: %s postulaciones pendientes recuperadas del journal (%s de otros procesos)",
+                     len(self._queue), adopted)
+
+    def _journal(self, entry: Dict[str, Any]) -> None:
+        os.write(self._fd, (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        os.fsync(self._fd)
+
+    def _truncate_journal(self) -> None:
+        os.ftruncate(self._fd, 0)
+        os.fsync(self._fd)
+
+    # ─────────────────────────────────────────────────────────────
+    # API
+    # ─────────────────────────────────────────────────────────────
+    @traced("write_behind.enqueue")
+    def enqueue(self, phone_number: str, session_data: Dict[str, Any]) -> bool:
+        """Encola la postulación (durable en el journal). True si quedó registrada."""
+        try:
+            payload = self.db._build_payload(phone_number, session_data)
+            link(payload.get("idempotency_key"))  # el flush de fondo aparece en la traza del turno
+            with self._lock:
+                self._seq += 1
+                seq = self._seq
+                self._journal({"seq": seq, "payload": payload})
+                self._queue.append((seq, time.time(), payload))
+                full = len(self._queue) >= self.batch_size
+            if hasattr(self.db, "remember_postulante"):
+                self.db.remember_postulante(payload)  # "¿ya postuló?" responde antes del flush
+            if full:
+                self._wake.set()
+            return True
+        except Exception as e:
+            log.error("❌ Error encolando postulante (guardado directo): %s", e)
+            return bool(self.db.save_postulante(phone_number, session_data))
+
+    def flush(self) -> int:
+        """Persiste lo pendiente en lotes. Devuelve filas persistidas."""
+        done = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = list(self._queue)[: self.batch_size]
+                if not batch:
+                    break
+                t0, started = time.perf_counter(), time.time()
+                ok = False
+                try:
+                    ok = bool(self.db.save_postulantes_batch([p for _, _, p in batch]))
+                except Exception as e:
+                    log.error("❌ Write-behind: error persistiendo lote: %s", e)
+                ms = (time.perf_counter() - t0) * 1000
+                for _, enqueued_at, payload in batch:
+                    record_span(linked(payload.get("idempotency_key")), "write_behind.flush", started, ms,
+                                rows=len(batch), queued_ms=round((started - enqueued_at) * 1000, 1), ok=ok)
+                self.last_flush_ms = ms
+                self.max_flush_ms = max(self.max_flush_ms, ms)
+                if not ok:
+                    self.failed_flushes += 1
+                    break
+                self.flushes += 1
+                self.flushed_rows += len(batch)
+                self._total_flush_ms += ms
+                done += len(batch)
+                with self._lock:
+                    for _ in batch:
+                        self._queue.popleft()
+                    if self._queue:
+                        self._journal({"ack": [seq for seq, _, _ in batch]})
+                    else:
+                        self._truncate_journal()
+        return done
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            if self._queue and not self.flush() and self._queue:
+                self._stop.wait(WRITE_BEHIND_RETRY_S)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        try:
+            if self.journal_path != self._base_path and not self._queue:
+                os.unlink(self.journal_path)  # journal propio (con pid) ya vacío
+            os.close(self._fd)
+        except Exception:
+            pass
+
+    # ─────────────────────────────────────────────────────────────
+    # Métricas
+    # ─────────────────────────────────────────────────────────────
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            backlog = len(self._queue)
+            oldest = self._queue[0][1] if self._queue else None
+        return {
+            "backlog": backlog,
+            "oldest_age_s": round(time.time() - oldest, 3) if oldest else 0.0,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+    def __len__(self) -> int:
+        return len(self._queue)
@@ -0,0 +1,255 @@
+# bench.py
+"""
+Microbenchmarks de los caminos calientes del bot, con baseline guardado.
+
+Cada benchmark mide el mejor tiempo por llamada (µs) de varias repeticiones
+con timeit. Para poder comparar entre máquinas, los tiempos se normalizan
+contra una carga de calibración fija (Python puro) medida de forma alternada:
+lo que se guarda y se compara es la razón benchmark / calibración.
+
+Uso:
+    python test/bench.py               # corre y compara contra test/bench_baseline.json
+    python test/bench.py --save        # regraba el baseline (tras una mejora intencional)
+    python test/bench.py -k validate   # solo los benchmarks cuyo nombre contiene "validate"
+
+Sale con código 1 si algún benchmark empeora más de BENCH_THRESHOLD (0.30 = +30 %)
+respecto al baseline: es el chequeo que corre CI.
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# ─────────────────────────────────────────────────────────────
+# Parámetros (ajustables por variables de entorno)
+# ─────────────────────────────────────────────────────────────
+BENCH_BASELINE_FILE = os.getenv("BENCH_BASELINE_FILE", os.path.join(ROOT, "test", "bench_baseline.json"))
+BENCH_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.30"))
+BENCH_MIN_TIME_S = float(os.getenv("BENCH_MIN_TIME", "0.02"))  # tiempo mínimo por repetición
+BENCH_REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+
+
+def _calibration() -> None:
+    """Carga de referencia: aritmética, dicts y strings (lo que hace el bot)."""
+    d: Dict[str, int] = {}
+    for i in range(200):
+        k = "k" + str(i % 50)
+        d[k] = d.get(k, 0) + i * i
+    " ".join(sorted(d)).lower().split()
+
+
+# ─────────────────────────────────────────────────────────────
+# Casos
+# ─────────────────────────────────────────────────────────────
+def _walk_flow(bot: Any, chat_id: str, seed: int = 7) -> List[Tuple[str, Dict[str, Any], str]]:
+    """
+    Recorre el cuestionario completo una vez y devuelve, por paso, (clave,
+    copia de la sesión antes de responder, respuesta). Con esto cada
+    benchmark de process arranca siempre del mismo estado.
+    """
+    from loadtest import answer, _profile
+
+    rng = random.Random(seed)
+    profile = _profile(rng)
+    profile.update({"edad": 30, "ce": False})
+    bot.process(chat_id, "empezar")
+    steps = []
+    for _ in range(80):
+        s = bot.sessions[chat_id]
+        if s["completed"]:
+            break
+        key = bot.questions_flow[s["step"] - 1]
+        text = answer(key, profile, rng)
+        if key == "lugar_residencia":
+            text = "Lima"
+        if key == "confirmacion_entrevista":
+            text = "Sí"
+        steps.append((key, copy.deepcopy(s), text))
+        bot.process(chat_id, text)
+    return steps
+
+
+def _restore(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia de la sesión suficiente para que process() no altere el snapshot."""
+    return dict(
+        snapshot,
+        data=dict(snapshot["data"]),
+        raw_answers=dict(snapshot["raw_answers"]),
+        conversation_history=list(snapshot["conversation_history"]),
+    )
+
+
+def build_cases() -> Dict[str, Callable[[], Any]]:
+    from bot.ai_bot import AIBot, _norm_text, _detect_location, _puesto_from_text
+    from bot.gemini_client import _safe_json_loads
+    from database import Database
+
+    bot = AIBot(db=False, gemini=False, intent=False)
+    chat_id = "51900000000@c.us"
+    steps = _walk_flow(bot, chat_id)
+    data = bot.sessions[chat_id]["data"]
+    cases: Dict[str, Callable[[], Any]] = {}
+
+    # AIBot.process por paso (incluye restaurar la sesión; su costo se mide aparte)
+    seen: Dict[str, int] = {}
+    for key, snapshot, text in steps:
+        if key in seen:
+            continue
+        seen[key] = 1
+
+        def run_step(snapshot=snapshot, text=text) -> None:
+            bot.sessions[chat_id] = _restore(snapshot)
+            bot.process(chat_id, text)
+        cases[f"process[{key}]"] = run_step
+    cases["process[restaurar_sesion]"] = lambda: _restore(steps[len(steps) // 2][1])
+
+    # Validación determinista por clave
+    for key, snapshot, text in steps:
+        current = snapshot["data"]
+        cases[f"validate[{key}]"] = lambda key=key, text=text, current=current: bot._validate_and_extract_soft(key, text, current)
+    for key, text in (("ciudad", "Arequipa"), ("licencia_tipo", "A2B"), ("puesto_otros", "Almacén"),
+                      ("puesto_mineria_sucursal", "2"), ("medio_captacion_otro", "Un amigo")):
+        if f"validate[{key}]" not in cases:
+            cases[f"validate[{key}]"] = lambda key=key, text=text: bot._validate_and_extract_soft(key, text, data)
+
+    textos = ["Sí, claro", "no tengo licencia", "Vivo en San Juan de Lurigancho", "Trujillo", "conductor A2B", "¿Cuánto pagan?"]
+    cases["_norm_text"] = lambda: [_norm_text(t) for t in textos]
+    norm = [_norm_text(t) for t in textos]
+    cases["_yes_no_soft"] = lambda: [bot._yes_no_soft(t) for t in norm]
+    cases["_detect_location"] = lambda: [_detect_location(t) for t in textos]
+    cases["_puesto_from_text"] = lambda: [_puesto_from_text(t) for t in ("agente de seguridad", "conductor", "digitador", "minería arequipa")]
+    cases["_get_next_step_index"] = lambda: [bot._get_next_step_index(i, data) for i in range(1, len(bot.questions_flow) + 1)]
+    cases["_evaluate_aptitud"] = lambda: bot._evaluate_aptitud(data)
+
+    ok_json = json.dumps({"is_valid": True, "extracted_data": {"edad": 30, "nombre": "Ana"}, "bot_response": "Gracias"})
+    broken = "```json\n{is_valid: True, 'extracted_data': {'edad': 30,}, 'bot_response': 'ok'}\n```"
+    cases["_safe_json_loads[valido]"] = lambda: _safe_json_loads(ok_json)
+    cases["_safe_json_loads[reparado]"] = lambda: _safe_json_loads(broken)
+
+    db = Database.__new__(Database)  # _build_payload no usa estado de conexión
+    session = bot.sessions[chat_id]
+    cases["Database._build_payload"] = lambda: db._build_payload(chat_id, session)
+    return cases
+
+
+# ─────────────────────────────────────────────────────────────
+# Medición y comparación
+# ─────────────────────────────────────────────────────────────
+def _calibrate_number(timer: timeit.Timer, min_time_s: float) -> int:
+    number = 1
+    while timer.timeit(number) < min_time_s and number < 1_000_000:
+        number *= 4
+    return number
+
+
+def measure(fn: Callable[[], Any], min_time_s: float = BENCH_MIN_TIME_S, repeat: int = BENCH_REPEAT) -> Tuple[float, float]:
+    """
+    (µs por llamada, razón contra la calibración). Benchmark y calibración se
+    alternan en cada repetición: el ruido de CPU compartida afecta a ambos y
+    se cancela en la razón.
+    """
+    timer, cal = timeit.Timer(fn), timeit.Timer(_calibration)
+    number = _calibrate_number(timer, min_time_s)
+    cal_number = _calibrate_number(cal, min_time_s)
+    best = best_cal = float("inf")
+    for _ in range(repeat):
+        best = min(best, timer.timeit(number) / number)
+        best_cal = min(best_cal, cal.timeit(cal_number) / cal_number)
+    return best * 1e6, best / best_cal
+
+
+def run_named(names: Optional[List[str]] = None, filter_: Optional[str] = None,
+              min_time_s: float = BENCH_MIN_TIME_S, repeat: int = BENCH_REPEAT) -> Dict[str, Dict[str, float]]:
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")  # el bot imprime logs en cada turno
+    try:
+        results = {}
+        for name, fn in build_cases().items():
+            if (names is not None and name not in names) or (filter_ and filter_ not in name):
+                continue
+            us, rel = measure(fn, min_time_s, repeat)
+            results[name] = {"us": round(us, 3), "rel": round(rel, 4)}
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return results
+
+
+def run(filter_: Optional[str] = None, min_time_s: float = BENCH_MIN_TIME_S, repeat: int = BENCH_REPEAT) -> Dict[str, Any]:
+    return {"python": sys.version.split()[0], "benchmarks": run_named(None, filter_, min_time_s, repeat)}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = BENCH_THRESHOLD) -> List[Dict[str, Any]]:
+    """Filas de comparación; `regression` True si la razón normalizada subió más de `threshold`."""
+    rows = []
+    base = baseline.get("benchmarks", {})
+    for name, cur in current["benchmarks"].items():
+        ref = base.get(name)
+        change = (cur["rel"] / ref["rel"] - 1) if ref and ref["rel"] else None
+        rows.append({
+            "name": name, "us": cur["us"], "baseline_us": ref["us"] if ref else None,
+            "change": change, "regression": change is not None and change > threshold,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Microbenchmarks del bot con baseline")
+    p.add_argument("--save", action="store_true", help="guarda el resultado como nuevo baseline")
+    p.add_argument("-k", dest="filter", default=None, help="solo benchmarks cuyo nombre contiene este texto")
+    p.add_argument("--threshold", type=float, default=BENCH_THRESHOLD)
+    p.add_argument("--json", action="store_true")
+    args = p.parse_args(argv)
+
+    current = run(args.filter)
+    if args.save:
+        with open(BENCH_BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"✅ Baseline guardado: {BENCH_BASELINE_FILE} ({len(current['benchmarks'])} benchmarks)", flush=True)
+        return 0
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(BENCH_BASELINE_FILE):
+        with open(BENCH_BASELINE_FILE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    rows = compare(current, baseline, args.threshold)
+    suspects = [r["name"] for r in rows if r["regression"]]
+    if suspects:
+        # Segunda pasada solo para los sospechosos: descarta picos de ruido puntuales
+        again = run_named(suspects, repeat=BENCH_REPEAT * 2)
+        for name, res in again.items():
+            if res["rel"] < current["benchmarks"][name]["rel"]:
+                current["benchmarks"][name] = res
+        rows = compare(current, baseline, args.threshold)
+    if args.json:
+        print(json.dumps({"current": current, "comparison": rows}, ensure_ascii=False), flush=True)
+    else:
+        print(f"{'benchmark':42} {'µs':>10} {'baseline':>10} {'cambio':>8}", flush=True)
+        for r in rows:
+            change = f"{r['change']:+.0%}" if r["change"] is not None else "nuevo"
+            base_us = f"{r['baseline_us']:.2f}" if r["baseline_us"] is not None else "-"
+            flag = "  ❌" if r["regression"] else ""
+            print(f"{r['name']:42} {r['us']:>10.2f} {base_us:>10} {change:>8}{flag}", flush=True)
+    regressions = [r["name"] for r in rows if r["regression"]]
+    if regressions:
+        if not args.json:
+            print(f"❌ {len(regressions)} regresiones sobre +{args.threshold:.0%}: {', '.join(regressions)}", flush=True)
+        return 1
+    if not args.json:
+        print(f"✅ Sin regresiones sobre +{args.threshold:.0%}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
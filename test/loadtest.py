@@ -0,0 +1,382 @@
+# loadtest.py
+"""
+Prueba de carga extremo a extremo contra /chatbot/webhook.
+
+Levanta la app Flask en un puerto local, un WAHA falso (HTTP real que registra
+los envíos) y reemplaza Gemini por un doble con latencia y errores
+configurables. N candidatos simulados recorren el cuestionario completo en
+paralelo con respuestas realistas (y un % fuera de guion), y se reporta la
+latencia por turno (p50/p95/p99), el throughput y las tasas de error.
+
+Uso:
+    python test/loadtest.py --candidatos 50 --concurrencia 10 \\
+        --gemini-latencia-ms 400 --gemini-error 0.05 --fuera-de-guion 0.15 [--json]
+
+Todo corre aislado en un directorio temporal (SQLite, outbox, journal): no
+toca data/ ni Supabase.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# ─────────────────────────────────────────────────────────────
+# WAHA falso: registra cada sendText por chat
+# ─────────────────────────────────────────────────────────────
+class FakeWaha:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.sent: Dict[str, List[str]] = {}
+        self.calls = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                self._reply({"status": "WORKING"})
+
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                with fake.lock:
+                    fake.calls += 1
+                    if self.path == "/api/sendText":
+                        fake.sent.setdefault(body.get("chatId", ""), []).append(body.get("text", ""))
+                self._reply({"id": "fake"})
+
+            def _reply(self, obj: Dict[str, Any]) -> None:
+                data = json.dumps(obj).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def last(self, chat_id: str) -> Optional[str]:
+        with self.lock:
+            msgs = self.sent.get(chat_id)
+            return msgs[-1] if msgs else None
+
+    def count(self, chat_id: str) -> int:
+        with self.lock:
+            return len(self.sent.get(chat_id, []))
+
+    def close(self) -> None:
+        self.server.shutdown()
+
+
+# ─────────────────────────────────────────────────────────────
+# Gemini falso: latencia configurable e inyección de errores
+# ─────────────────────────────────────────────────────────────
+class FakeGemini:
+    def __init__(self, latency_ms: float = 300.0, error_rate: float = 0.0, seed: int = 0) -> None:
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def _call(self) -> None:
+        with self.lock:
+            self.calls += 1
+            delay = max(0.0, self.rng.gauss(self.latency_ms, self.latency_ms * 0.25)) / 1000
+            fail = self.rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("Gemini falso: 503 UNAVAILABLE (inyectado)")
+
+    def warm_up(self) -> bool:
+        return True
+
+    def extract_and_validate(self, question_key: str, user_response: str, current_data: dict,
+                             conversation_history: list, available_positions: list | None = None) -> dict:
+        self._call()
+        return {"is_valid": False, "extracted_data": {}, "bot_response": "¿Podrías responder de nuevo, por favor?"}
+
+    def respuesta_conversacional(self, user_message: str, context: str, company_info: dict) -> str:
+        self._call()
+        return "Gracias por tu mensaje. Escribe *empezar* para postular. 😊"
+
+
+# ─────────────────────────────────────────────────────────────
+# Candidatos simulados
+# ─────────────────────────────────────────────────────────────
+NOMBRES = ["Juan", "María", "José", "Rosa", "Luis", "Carmen", "Carlos", "Ana", "Jorge", "Lucía"]
+APELLIDOS = ["Quispe Flores", "García Rojas", "Huamán Torres", "Mendoza Díaz", "Ramos Castillo"]
+SALUDOS = ["hola", "Hola, vi el anuncio", "empezar", "quiero postular", "buenas tardes, información"]
+
+# Respuestas fuera de guion: genéricas o típicas de cada pregunta
+OFF_SCRIPT_GENERIC = ["cuánto pagan?", "no entiendo", "espera un momento", "😅", "???", "es presencial?"]
+OFF_SCRIPT_BY_KEY = {
+    "edad": ["veinticinco", "17", "tengo 55"],
+    "numero_documento": ["1234567", "1234567890"],
+    "telefono": ["12345", "987 654 32"],
+    "correo": ["juan arroba gmail", "no tengo"],
+    "genero": ["x"],
+    "puesto": ["el de seguridad", "cualquiera"],
+    "confirmacion_entrevista": ["a qué hora?", "tal vez"],
+}
+
+
+def _pick(rng: random.Random, weighted: Dict[str, int]) -> str:
+    return rng.choices(list(weighted), weights=list(weighted.values()))[0]
+
+
+def _profile(rng: random.Random) -> Dict[str, Any]:
+    nombre, apellidos = rng.choice(NOMBRES), rng.choice(APELLIDOS)
+    return {
+        "nombre": nombre,
+        "apellidos": apellidos,
+        "edad": int(rng.triangular(18, 50, 26)),
+        "ce": rng.random() < 0.1,
+        "correo": f"{nombre.lower()}.{apellidos.split()[0].lower()}{rng.randint(1, 999)}@gmail.com",
+    }
+
+
+def answer(key: str, profile: Dict[str, Any], rng: random.Random) -> str:
+    """Respuesta válida (con variantes realistas) para la pregunta `key`."""
+    if key == "autorizacion_datos":
+        return _pick(rng, {"Sí": 6, "acepto": 3, "si acepto": 1})
+    if key == "nombre":
+        return profile["nombre"]
+    if key == "apellidos":
+        return profile["apellidos"]
+    if key == "edad":
+        return rng.choice([str(profile["edad"]), f"tengo {profile['edad']} años"])
+    if key == "genero":
+        return _pick(rng, {"Masculino": 5, "Femenino": 3, "M": 1, "mujer": 1})
+    if key == "tipo_documento":
+        return "Carné de extranjería" if profile["ce"] else _pick(rng, {"DNI": 8, "dni": 2})
+    if key == "numero_documento":
+        return "".join(str(rng.randint(0, 9)) for _ in range(9 if profile["ce"] else 8))
+    if key == "telefono":
+        digits = "9" + "".join(str(rng.randint(0, 9)) for _ in range(8))
+        return digits if rng.random() < 0.7 else f"{digits[:3]} {digits[3:6]} {digits[6:]}"
+    if key == "correo":
+        return profile["correo"]
+    if key == "secundaria":
+        return _pick(rng, {"Sí": 6, "completa": 2, "sí, técnico": 1, "no": 1})
+    if key == "trabajo_hermes":
+        return _pick(rng, {"No": 8, "Sí": 2})
+    if key == "modalidad":
+        return _pick(rng, {"1": 6, "2": 2, "3": 1, "tiempo completo": 1})
+    if key == "distrito":
+        return rng.choice(["Chorrillos", "Surco", "SJL", "Comas", "Ate", "Callao"])
+    if key == "lugar_residencia":
+        return _pick(rng, {"Lima": 8, "Provincia": 2})
+    if key == "ciudad":
+        return rng.choice(["Arequipa", "Trujillo", "Piura", "Cusco"])
+    if key == "licencia":
+        return _pick(rng, {"No": 6, "Sí": 4})
+    if key == "licencia_tipo":
+        return _pick(rng, {"A1": 5, "A2B": 2, "A2a": 2, "no sé": 1})
+    if key == "puesto":
+        return str(rng.randint(1, 18)) if rng.random() < 0.85 else rng.choice(["conductor", "agente de seguridad"])
+    if key == "puesto_mineria_sucursal":
+        return str(rng.randint(1, 5))
+    if key == "disponibilidad":
+        return _pick(rng, {"Sí": 7, "sí, inmediata": 2, "No": 1})
+    if key == "medio_captacion":
+        return str(rng.randint(1, 9)) if rng.random() < 0.8 else rng.choice(["facebook", "por tiktok"])
+    if key == "confirmacion_entrevista":
+        return _pick(rng, {"Sí": 7, "sí, ahí estaré": 2, "No": 1})
+    if key in ("puesto_otros", "medio_captacion_otro"):
+        return rng.choice(["Almacén", "Un amigo", "Otro"])
+    return "Sí"
+
+
+def off_script(key: str, rng: random.Random) -> str:
+    options = OFF_SCRIPT_BY_KEY.get(key, []) + OFF_SCRIPT_GENERIC
+    return rng.choice(options)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+# ─────────────────────────────────────────────────────────────
+# Ejecución
+# ─────────────────────────────────────────────────────────────
+def run(candidates: int = 20, concurrency: int = 10, gemini_latency_ms: float = 300.0,
+        gemini_error_rate: float = 0.0, off_script_rate: float = 0.1, max_turns: int = 80,
+        seed: int = 1, typing_delay_s: float = 0.0, quiet: bool = True) -> Dict[str, Any]:
+    """Corre la simulación y devuelve el reporte (dict). Debe llamarse antes de importar app."""
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    waha = FakeWaha()
+    os.environ.update({
+        "SUPABASE_URL": "", "SUPABASE_KEY": "", "GOOGLE_API_KEY": "",
+        "WAHA_URL": waha.url, "TYPING_DELAY_S": str(typing_delay_s),
+        "SQLITE_FILE": os.path.join(tmp, "postulantes.db"),
+        "LOCAL_LOG_FILE": os.path.join(tmp, "postulantes.jsonl"),
+        "OUTBOX_FILE": os.path.join(tmp, "outbox.db"),
+        "WRITE_BEHIND_JOURNAL": os.path.join(tmp, "write_behind.jsonl"),
+        "INTERVIEW_DAILY_CAPACITY": os.environ.get("INTERVIEW_DAILY_CAPACITY", "100000"),
+    })
+    devnull = open(os.devnull, "w")
+    out = devnull if quiet else sys.stdout
+    with redirect_stdout(out):
+        import app as app_module
+        from services.logs import shutdown_logging
+        from werkzeug.serving import make_server, WSGIRequestHandler
+        import requests
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args: Any, **kwargs: Any) -> None:
+                pass
+
+        gemini = FakeGemini(gemini_latency_ms, gemini_error_rate, seed)
+        app_module.BOT.gemini = gemini
+        server = make_server("127.0.0.1", 0, app_module.app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/chatbot/webhook"
+        bot = app_module.BOT
+
+        lock = threading.Lock()
+        latencies: List[float] = []
+        counters = {"http_errors": 0, "bot_errors": 0, "no_reply": 0, "off_script": 0, "turns": 0}
+
+        def candidate(i: int) -> Dict[str, Any]:
+            rng = random.Random(seed * 100003 + i)
+            chat_id = f"519{i:08d}@c.us"
+            profile = _profile(rng)
+            http = requests.Session()
+            text = rng.choice(SALUDOS)
+            for turn in range(max_turns):
+                before = waha.count(chat_id)
+                t0 = time.perf_counter()
+                try:
+                    r = http.post(url, json={"event": "message", "payload": {"from": chat_id, "body": text, "fromMe": False}}, timeout=60)
+                    ok = r.status_code == 200
+                except Exception:
+                    ok = False
+                dt = time.perf_counter() - t0
+                reply = waha.last(chat_id) if waha.count(chat_id) > before else None
+                with lock:
+                    latencies.append(dt)
+                    counters["turns"] += 1
+                    counters["http_errors"] += 0 if ok else 1
+                    counters["no_reply"] += 1 if reply is None else 0
+                    counters["bot_errors"] += 1 if reply and reply.startswith("⚠️") else 0
+
+                s = bot.sessions.get(chat_id)
+                if s and s.get("completed"):
+                    return {"completed": True, "turns": turn + 1}
+                if not s or s["step"] == 0:
+                    text = "empezar"
+                    continue
+                key = bot.questions_flow[s["step"] - 1]
+                if rng.random() < off_script_rate:
+                    text = off_script(key, rng)
+                    with lock:
+                        counters["off_script"] += 1
+                else:
+                    text = answer(key, profile, rng)
+            return {"completed": False, "turns": max_turns}
+
+        t_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(candidate, range(candidates)))
+        duration = time.perf_counter() - t_start
+        if bot.writer is not None:
+            bot.writer.flush()
+        server.shutdown()
+        shutdown_logging()  # vacía la cola de logs antes de cerrar devnull
+    waha.close()
+    devnull.close()
+
+    lat_ms = sorted(x * 1000 for x in latencies)
+    turns = counters["turns"] or 1
+    completed = sum(1 for r in results if r["completed"])
+    return {
+        "candidatos": candidates,
+        "concurrencia": concurrency,
+        "completados": completed,
+        "atascados": candidates - completed,
+        "turnos": counters["turns"],
+        "turnos_por_candidato": round(counters["turns"] / max(candidates, 1), 1),
+        "duracion_s": round(duration, 2),
+        "throughput_turnos_s": round(counters["turns"] / duration, 1) if duration else 0.0,
+        "latencia_ms": {
+            "p50": round(_percentile(lat_ms, 50), 1),
+            "p95": round(_percentile(lat_ms, 95), 1),
+            "p99": round(_percentile(lat_ms, 99), 1),
+            "max": round(lat_ms[-1], 1) if lat_ms else 0.0,
+            "media": round(sum(lat_ms) / len(lat_ms), 1) if lat_ms else 0.0,
+        },
+        "errores": {
+            "http": counters["http_errors"],
+            "respuestas_de_error": counters["bot_errors"],
+            "sin_respuesta": counters["no_reply"],
+            "tasa_http": round(counters["http_errors"] / turns, 4),
+            "tasa_respuestas_de_error": round(counters["bot_errors"] / turns, 4),
+        },
+        "fuera_de_guion": counters["off_script"],
+        "gemini": {"llamadas": gemini.calls, "errores_inyectados": gemini.errors},
+        "waha": {"llamadas": waha.calls},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Prueba de carga del webhook con WAHA y Gemini falsos")
+    p.add_argument("--candidatos", type=int, default=20)
+    p.add_argument("--concurrencia", type=int, default=10)
+    p.add_argument("--gemini-latencia-ms", type=float, default=300.0)
+    p.add_argument("--gemini-error", type=float, default=0.0, help="fracción de llamadas a Gemini que fallan")
+    p.add_argument("--fuera-de-guion", type=float, default=0.1, help="fracción de respuestas fuera de guion")
+    p.add_argument("--max-turnos", type=int, default=80)
+    p.add_argument("--typing-delay", type=float, default=0.0, help="TYPING_DELAY_S del webhook")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", action="store_true", help="solo el reporte JSON")
+    p.add_argument("--verbose", action="store_true", help="muestra los logs de la app")
+    args = p.parse_args(argv)
+
+    report = run(
+        candidates=args.candidatos, concurrency=args.concurrencia,
+        gemini_latency_ms=args.gemini_latencia_ms, gemini_error_rate=args.gemini_error,
+        off_script_rate=args.fuera_de_guion, max_turns=args.max_turnos, seed=args.seed,
+        typing_delay_s=args.typing_delay, quiet=not args.verbose,
+    )
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False), flush=True)
+        return 0
+    lat = report["latencia_ms"]
+    err = report["errores"]
+    print(f"📊 {report['candidatos']} candidatos × concurrencia {report['concurrencia']} en {report['duracion_s']}s", flush=True)
+    print(f"   Completados: {report['completados']}  Atascados: {report['atascados']}  "
+          f"Turnos: {report['turnos']} ({report['turnos_por_candidato']}/candidato)", flush=True)
+    print(f"   Throughput: {report['throughput_turnos_s']} turnos/s", flush=True)
+    print(f"   Latencia por turno (ms): p50={lat['p50']}  p95={lat['p95']}  p99={lat['p99']}  max={lat['max']}", flush=True)
+    print(f"   Errores: HTTP {err['http']} ({err['tasa_http']:.2%})  respuestas de error {err['respuestas_de_error']} "
+          f"({err['tasa_respuestas_de_error']:.2%})  sin respuesta {err['sin_respuesta']}", flush=True)
+    print(f"   Gemini: {report['gemini']['llamadas']} llamadas, {report['gemini']['errores_inyectados']} errores inyectados; "
+          f"fuera de guion: {report['fuera_de_guion']}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
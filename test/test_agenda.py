@@ -0,0 +1,63 @@
+import sys
+import os
+import time
+from datetime import date, timedelta
+sys.path.append(os.getcwd())
+from bot.agenda import CapacityCalendar, business_days
+
+
+class FakeDB:
+    """get_confirmed_counts por rango; cuenta las consultas."""
+
+    def __init__(self, counts):
+        self.counts = counts
+        self.calls = 0
+
+    def get_confirmed_counts(self, start_date, end_date):
+        self.calls += 1
+        return {d: n for d, n in self.counts.items() if start_date <= d <= end_date}
+
+
+def test_capacity_calendar():
+    days = business_days(date.today() + timedelta(days=1), 5)
+    first, second = days[0], days[1]
+
+    print("\n--- Testing Aforo por día ---")
+    db = FakeDB({first.isoformat(): 3, second.isoformat(): 1})
+    cal = CapacityCalendar(db, capacity=3, horizon=5, ttl_s=60)
+    available = cal.available_days()
+    print(f"Primer día libre: {cal.next_available()} (Expected {second}, {first} está lleno)")
+    assert first not in available and available[0] == second and len(available) == 4
+    assert cal.count(first) == 3 and cal.count(second) == 1 and db.calls == 1
+
+    print("\n--- Testing record (confirmaciones de este proceso) ---")
+    cal.record(f"{second.isoformat()}T08:30:00")
+    cal.record(f"{second.isoformat()}T08:30:00")
+    print(f"Confirmados en {second}: {cal.count(second)} (Expected 3)")
+    assert cal.count(second) == 3 and cal.next_available() == days[2]
+    cal.record(f"{second.isoformat()}T08:30:00", delta=-1)  # cancelación
+    assert cal.next_available() == second
+    cal.record("no es fecha")  # se ignora
+    cal.mark_full(second)
+    assert cal.next_available() == days[2] and db.calls == 1  # todo en memoria
+
+    print("\n--- Testing Refresco (escrituras de otros procesos) ---")
+    db.counts = {days[2].isoformat(): 3}
+    cal.ttl_s = 0.05
+    time.sleep(0.1)
+    available = cal.available_days()
+    print(f"Consultas a la BD: {db.calls} (Expected 2)")
+    assert db.calls == 2 and available[:2] == [first, second] and days[2] not in available
+    cal.invalidate()
+    cal.count(first)
+    assert db.calls == 3
+
+    # BD caída: el calendario no rompe el flujo (todos los días con aforo)
+    class Broken:
+        def get_confirmed_counts(self, start_date, end_date):
+            raise ConnectionError("sin red")
+    assert CapacityCalendar(Broken(), capacity=3, horizon=5).available_days() == days
+
+
+if __name__ == "__main__":
+    test_capacity_calendar()
@@ -0,0 +1,40 @@
+import sys
+import os
+import json
+sys.path.append(os.getcwd())
+sys.path.append(os.path.join(os.getcwd(), "test"))
+import bench
+
+
+def test_bench():
+    print("\n--- Testing Suite de microbenchmarks ---")
+    devnull, stdout = open(os.devnull, "w"), sys.stdout
+    sys.stdout = devnull
+    try:
+        names = set(bench.build_cases())
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+
+    from bot.ai_bot import AIBot
+    flow = AIBot(db=False, gemini=False, intent=False).questions_flow
+    missing = [k for k in flow if f"validate[{k}]" not in names]
+    print(f"Claves sin benchmark de validación: {missing} (Expected [])")
+    assert not missing and "process[edad]" in names and "Database._build_payload" in names
+
+    with open(bench.BENCH_BASELINE_FILE, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    assert names <= set(baseline["benchmarks"]), "regrabar con: python test/bench.py --save"
+
+    quick = bench.run_named(["_norm_text", "process[edad]"], min_time_s=0.001, repeat=1)
+    assert all(r["us"] > 0 and r["rel"] > 0 for r in quick.values()) and len(quick) == 2
+
+    current = {"benchmarks": {"a": {"us": 13.0, "rel": 1.3}, "b": {"us": 10.5, "rel": 1.05}}}
+    base = {"benchmarks": {"a": {"us": 9.0, "rel": 1.0}, "b": {"us": 9.0, "rel": 1.0}}}
+    flagged = [r["name"] for r in bench.compare(current, base, threshold=0.25) if r["regression"]]
+    print(f"Regresiones con umbral 25%: {flagged} (Expected ['a'])")
+    assert flagged == ["a"]
+
+
+if __name__ == "__main__":
+    test_bench()
@@ -0,0 +1,100 @@
+import sys
+import os
+import csv
+import gzip
+import io
+import json
+import subprocess
+import textwrap
+sys.path.append(os.getcwd())
+from services.export import iter_postulantes, prefetch, ndjson_chunks, csv_chunks, gzip_chunks
+
+
+class FakeDB:
+    """Paginación por cursor como Database.list_postulantes (ids descendentes)."""
+    def __init__(self, n):
+        self.rows = [
+            {"id": i, "phone_number": f"51{i:04d}", "es_apto": i % 2 == 0,
+             "respuestas_raw": json.dumps({"nombre": f"Persona {i}", "edad": str(20 + i % 30)})}
+            for i in range(n, 0, -1)
+        ]
+        self.calls = 0
+
+    def list_postulantes(self, limit, cursor=None, **filters):
+        self.calls += 1
+        if cursor and not cursor.isdigit():
+            raise ValueError("cursor inválido")
+        start = int(cursor) if cursor else 0
+        page = self.rows[start:start + limit]
+        return page, (str(start + limit) if len(page) == limit else None)
+
+
+def test_export():
+    print("\n--- Testing Export NDJSON paginado ---")
+    db = FakeDB(1234)
+    lines = b"".join(ndjson_chunks(iter_postulantes(db, page_size=500))).splitlines()
+    first = json.loads(lines[0])
+    print(f"Filas: {len(lines)} en {db.calls} páginas (Expected 1234 en 3)")
+    assert len(lines) == 1234 and db.calls == 3
+    assert first["respuesta_nombre"] == "Persona 1234" and "respuestas_raw" not in first
+
+    print("\n--- Testing Export CSV + gzip ---")
+    data = b"".join(gzip_chunks(csv_chunks(iter_postulantes(FakeDB(1234), page_size=500), ["nombre", "edad"])))
+    text = gzip.decompress(data).decode("utf-8-sig")
+    rows = list(csv.DictReader(io.StringIO(text)))
+    print(f"Filas CSV: {len(rows)} (Expected 1234), comprimido {len(data)} bytes")
+    assert len(rows) == 1234 and rows[-1]["respuesta_nombre"] == "Persona 1" and rows[0]["es_apto"] == "True"
+
+
+    print("\n--- Testing Export: primera página antes del streaming ---")
+    db = FakeDB(1234)
+    pages = prefetch(iter_postulantes(db, page_size=500, cursor="1000"))
+    print(f"Consultas antes de consumir: {db.calls} (Expected 1)")
+    assert db.calls == 1 and sum(len(p) for p in pages) == 234
+    try:
+        prefetch(iter_postulantes(FakeDB(10), cursor="basura"))
+        raise AssertionError("el cursor inválido debió fallar antes del streaming")
+    except ValueError:
+        pass
+    assert list(prefetch(iter_postulantes(FakeDB(0)))) == []
+
+
+# Se corre en subproceso: aísla env (BD local en un directorio temporal) y la app importada
+ENDPOINT_SCRIPT = textwrap.dedent("""
+    import json, os, sys, tempfile
+    tmp = tempfile.mkdtemp(prefix="export-")
+    os.environ.update({
+        "SUPABASE_URL": "", "SUPABASE_KEY": "", "GOOGLE_API_KEY": "",
+        "SQLITE_FILE": os.path.join(tmp, "postulantes.db"),
+        "LOCAL_LOG_FILE": os.path.join(tmp, "postulantes.jsonl"),
+        "OUTBOX_FILE": os.path.join(tmp, "outbox.db"),
+        "WRITE_BEHIND_JOURNAL": os.path.join(tmp, "write_behind.jsonl"),
+    })
+    sys.path.insert(0, os.getcwd())
+    import app as app_module
+    client = app_module.app.test_client()
+    out = {}
+    for name, qs in [("ok", "format=ndjson"), ("cursor", "cursor=basura"), ("order", "order_by=edad"),
+                     ("desde", "desde=ayer"), ("hasta", "hasta=2026-13-40"), ("mezcla", "order_by=created_at&cursor=WyJpZCIsIDEsIDFd")]:
+        r = client.get("/postulantes/export?" + qs)
+        out[name] = [r.status_code, r.mimetype]
+    print(json.dumps(out))
+    sys.stdout.flush()
+    os._exit(0)
+""")
+
+
+def test_export_endpoint():
+    print("\n--- Testing Export: parámetros inválidos → 400 ---")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", ENDPOINT_SCRIPT], cwd=root, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    res = json.loads(next(l for l in reversed(out.stdout.splitlines()) if l.startswith("{")))
+    print(f"Estados: {res} (Expected ok=200, el resto 400 JSON)")
+    assert res.pop("ok")[0] == 200
+    assert all(v == [400, "application/json"] for v in res.values())
+
+
+if __name__ == "__main__":
+    test_export()
+    test_export_endpoint()
@@ -0,0 +1,97 @@
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.getcwd())
+from bot.ai_bot import AIBot
+from bot.gemini_client import GeminiClient
+from bot.gemini_cassette import Cassette, raw_path, summarize, rerun
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = type("Usage", (), {"prompt_token_count": 120, "candidates_token_count": 15})()
+
+
+class FakeModel:
+    """Modelo Gemini falso: responde el género "F" a todo y cuenta las llamadas."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        return FakeResponse(json.dumps({"is_valid": True, "extracted_data": {"genero": "F"}, "bot_response": None}))
+
+
+# "soy dama" y "presencial" van a Gemini; DNI, celular y correo se resuelven con reglas
+MESSAGES = ["empezar", "Sí, acepto", "Ana", "Pérez", "30", "pues la verdad soy dama jeje", "Femenino", "DNI",
+            "71234567", "987654321", "ana.perez@gmail.com", "sí terminé", "nunca trabajé ahí", "presencial"]
+
+
+def _conversation(bot, chat_id):
+    return [bot.process(chat_id, text) for text in MESSAGES]
+
+
+def test_gemini_cassette():
+    print("\n--- Testing Cassette Gemini (record / replay) ---")
+    path = os.path.join(tempfile.mkdtemp(), "cassette.jsonl")
+
+    # Grabar: llamada real (modelo falso) + turnos
+    model = FakeModel()
+    client = GeminiClient(cassette=Cassette("record", path))
+    client.model = model
+    bot = AIBot(db=False, gemini=client, intent=False)
+    recorded = _conversation(bot, "51911111111@c.us")
+    print(f"Llamadas al modelo grabando: {model.calls} (Expected 4: extracción + aclaración, dos veces)")
+    assert model.calls == 4
+
+    summary = summarize(path)
+    print(f"Resumen: turnos={summary['turns']} llamadas={summary['calls']} tokens_in={summary['tokens_in']} (Expected 14, 4, 480)")
+    assert summary["turns"] == 14 and summary["calls"] == 4 and summary["tokens_in"] == 480
+    assert summary["calls_per_turn"] == round(4 / 14, 3) and summary["turns_with_ai"] == 2
+    with open(path, encoding="utf-8") as f:
+        shared = f.read()
+    for secret in ("51911111111", "71234567", "987654321", "ana.perez@gmail.com"):
+        assert secret not in shared  # chat anonimizado y texto enmascarado
+    assert os.stat(raw_path(path)).st_mode & 0o777 == 0o600  # originales: solo el dueño
+
+    # Reproducir: sin modelo ni red, misma respuesta
+    replay = GeminiClient(cassette=Cassette("replay", path))
+    replay.model = None
+    bot = AIBot(db=False, gemini=replay, intent=False)
+    replayed = _conversation(bot, "51922222222@c.us")
+    stats = replay.cassette.stats()
+    print(f"Replay: hits={stats['hits']} misses={stats['misses']} (Expected 4, 0)")
+    assert stats["hits"] == 4 and stats["misses"] == 0
+    assert replayed == recorded
+
+    # Prompt no grabado → miss y fallback determinista
+    assert replay._generate("otro prompt") is None
+    assert replay.cassette.stats()["misses"] == 1
+
+    # Laboratorio: re-ejecutar el tráfico grabado (texto original) con los prompts actuales
+    result = rerun(path)
+    print(f"Rerun: {result['rerun']['calls']} llamadas, {result['rerun']['misses']} misses (Expected 4, 0)")
+    assert result["rerun"]["calls"] == result["recorded"]["calls"] == 4
+    assert result["rerun"]["misses"] == 0
+
+    # Lo grabado no guarda datos personales del candidato
+    pii = os.path.join(tempfile.mkdtemp(), "pii.jsonl")
+    cassette = Cassette("record", pii)
+    with cassette.turn("51933333333@c.us", "mi correo es ana.perez@gmail.com y mi DNI 71234567"):
+        cassette.record("m", "prompt", json.dumps({"correo_electronico": "ana.perez@gmail.com", "celular": "987654321"}), 0.1)
+    with open(pii, encoding="utf-8") as f:
+        raw = f.read()
+    print(f"Redactado: {'ana.perez@gmail.com' not in raw and '71234567' not in raw} (Expected True)")
+    for secret in ("51933333333", "ana.perez@gmail.com", "71234567", "987654321"):
+        assert secret not in raw
+    # …pero al reproducir la extracción sale con los datos reales (archivo privado)
+    replayed = Cassette("replay", pii).play("m", "prompt")
+    print(f"Extracción reproducida: {replayed} (Expected correo sin enmascarar)")
+    assert json.loads(replayed)["correo_electronico"] == "ana.perez@gmail.com"
+
+
+if __name__ == "__main__":
+    test_gemini_cassette()
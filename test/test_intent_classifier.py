@@ -0,0 +1,48 @@
+import sys
+import os
+import json
+import random
+sys.path.append(os.getcwd())
+from bot.intent_classifier import IntentClassifier
+from bot.ai_bot import AIBot
+
+
+def _rows(n=120):
+    rng = random.Random(1)
+    disp_yes = ["desde mañana puedo", "ya mismo", "cuando ustedes digan", "de inmediato", "ahorita nomas"]
+    disp_no = ["en dos semanas", "recien el otro mes", "tengo que avisar en mi chamba", "mas adelante"]
+    rows = []
+    for _ in range(n):
+        ok = rng.random() < 0.5
+        rows.append({
+            "respuestas_raw": json.dumps({"disponibilidad": rng.choice(disp_yes if ok else disp_no)}),
+            "disponibilidad_inmediata": ok,
+        })
+    return rows
+
+
+def test_intent_classifier():
+    clf = IntentClassifier.train(_rows())
+    print(f"Modelos entrenados: {list(clf.models)}")
+    assert "disponibilidad" in clf.models
+
+    pred = clf.predict("disponibilidad", "mañana mismo")
+    print(f"'mañana mismo': {pred} (Expected disponibilidad=True)")
+    assert pred and pred[0] == {"disponibilidad": True}
+
+    pred = clf.predict("disponibilidad", "zzz")
+    print(f"'zzz': {pred} (Expected None → Gemini)")
+    assert pred is None
+
+    # El bot usa el clasificador antes de Gemini
+    bot = AIBot(db=None, gemini=None, intent=clf)
+    chat_id = "test_intent"
+    bot._init_session(chat_id)
+    bot.sessions[chat_id]["step"] = bot.questions_flow.index("disponibilidad") + 1
+    bot.process(chat_id, "mañana mismo")
+    print(f"Sesión: disponibilidad={bot.sessions[chat_id]['data']['disponibilidad']}")
+    assert bot.sessions[chat_id]["data"]["disponibilidad"] is True
+
+
+if __name__ == "__main__":
+    test_intent_classifier()
@@ -0,0 +1,27 @@
+import sys
+import os
+import json
+import subprocess
+sys.path.append(os.getcwd())
+
+
+def test_loadtest():
+    # Corrida mínima del harness de carga (en subproceso: aísla env y la app importada)
+    print("\n--- Testing Prueba de carga (humo) ---")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(
+        [sys.executable, os.path.join("test", "loadtest.py"), "--candidatos", "4", "--concurrencia", "4",
+         "--gemini-latencia-ms", "5", "--gemini-error", "0.5", "--fuera-de-guion", "0.2", "--json"],
+        cwd=root, capture_output=True, text=True, timeout=120,
+    )
+    assert out.returncode == 0, out.stderr
+    report = json.loads(next(l for l in reversed(out.stdout.splitlines()) if l.startswith("{")))
+    print(f"Completados: {report['completados']} (Expected 4)")
+    print(f"Latencia p50/p95/p99: {report['latencia_ms']} ms")
+    assert report["completados"] == 4 and report["errores"]["http"] == 0
+    assert report["errores"]["sin_respuesta"] == 0 and report["fuera_de_guion"] > 0
+    assert report["latencia_ms"]["p50"] <= report["latencia_ms"]["p95"] <= report["latencia_ms"]["p99"]
+
+
+if __name__ == "__main__":
+    test_loadtest()
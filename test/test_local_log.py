@@ -0,0 +1,148 @@
+import sys
+import os
+import json
+import tempfile
+import threading
+sys.path.append(os.getcwd())
+from services.local_log import AppendLog
+from services.sqlite_store import SQLiteStore
+
+
+def test_local_log():
+    tmp = tempfile.mkdtemp()
+    legacy = os.path.join(tmp, "postulantes.json")
+    path = os.path.join(tmp, "postulantes.jsonl")
+
+    print("\n--- Testing Migración JSON legado ---")
+    with open(legacy, "w", encoding="utf-8") as f:
+        json.dump([{"phone_number": "51999", "es_apto": True}], f)
+    log = AppendLog(path=path, legacy_path=legacy)
+    print(f"Filas migradas: {len(log)} (Expected 1)")
+    assert len(log) == 1 and os.path.exists(legacy + ".migrated")
+
+    print("\n--- Testing Escritores concurrentes ---")
+    def writer(n):
+        for i in range(50):
+            log.insert({"phone_number": f"51{n:03d}", "seq": i})
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"Filas: {len(log)} (Expected 401)")
+    assert len(log) == 401
+
+    # Otro proceso/instancia ve lo mismo (índice reconstruido de forma perezosa)
+    other = AppendLog(path=path, legacy_path=None)
+    latest = other.get_latest("51003")
+    print(f"Última de 51003: seq={latest['seq']} (Expected 49)")
+    assert latest["seq"] == 49
+
+    print("\n--- Testing Update + Compactación ---")
+    row_id = latest["id"]
+    log.update(row_id, {"es_apto": False})
+    print(f"Versión vigente: {log.get_latest('51003')['es_apto']} (Expected False)")
+    dropped = log.compact()
+    print(f"Compactación descartó {dropped} versiones (Expected 1)")
+    assert dropped == 1 and len(log) == 401
+    assert log.get_latest("51003")["es_apto"] is False
+
+    print("\n--- Testing Escritor con el archivo ya compactado por otro ---")
+    other.insert({"phone_number": "51800", "seq": 0})  # `other` tenía abierto el inode previo
+    fresh = AppendLog(path=path, legacy_path=None)
+    seen = fresh.get_latest("51800")
+    print(f"Lector nuevo ve la fila de la otra instancia: {seen is not None} (Expected True)")
+    assert seen is not None and len(fresh) == len(other) == len(log) == 402
+    assert other.get_latest("51003")["es_apto"] is False
+    fresh.close()
+
+    print("\n--- Testing Stats incrementales ---")
+    log.insert({"phone_number": "51900", "es_apto": True, "puesto_id": 8, "puesto_name": "Conductores",
+                "created_at": "2026-01-15T10:00:00"})
+    stats = log.stats()
+    print(f"Stats: total={stats['total']} aptos={stats['aptos']} (Expected 403, 2)")
+    assert stats["total"] == 403 and stats["aptos"] == 2 and stats["por_puesto"]["Conductores"] == 1
+    assert log.stats(start_date="2026-01-01", end_date="2026-01-31")["total"] == 1
+    assert log.stats(puesto_id=8)["por_puesto"] == {"Conductores": 1}
+    page = log.list_rows(limit=3, fields=["seq"])
+    assert [r["id"] for r in page] == [403, 402, 401] and set(page[1]) == {"id", "seq"}
+    assert [r["id"] for r in log.list_rows(limit=2, after=(400, 400))] == [399, 398]
+    assert [r["id"] for r in log.list_rows(puesto_id=8, start_date="2026-01-01", end_date="2026-01-31")] == [403]
+    log.close()
+    other.close()
+
+
+def test_sqlite_store():
+    tmp = tempfile.mkdtemp()
+    log = AppendLog(path=os.path.join(tmp, "postulantes.jsonl"), legacy_path=None)
+    log.insert({"phone_number": "51001", "es_apto": True, "puesto_name": "Cajeros"})
+
+    print("\n--- Testing SQLite (import + consultas indexadas) ---")
+    store = SQLiteStore(path=os.path.join(tmp, "postulantes.db"), import_from=log.rows)
+    print(f"Importadas: {len(store)} (Expected 1)")
+    assert len(store) == 1
+
+    def writer(n):
+        for i in range(25):
+            store.insert({
+                "phone_number": f"52{n:03d}",
+                "es_apto": i % 2 == 0,
+                "puesto_name": "Digitadores",
+                "confirmacion_asistencia": i == 0,
+                "fecha_entrevista": "2026-10-20T08:30:00" if i == 0 else None,
+            })
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latest = store.get_latest("52002")
+    print(f"Última de 52002: es_apto={latest['es_apto']} (Expected True, bool)")
+    assert latest["es_apto"] is True
+    assert store.count_confirmed_for_date("2026-10-20") == 4
+    assert len(store.list_rows(limit=10, es_apto=False)) == 10
+    stats = store.stats()
+    print(f"Stats: {stats}")
+    assert stats["total"] == 101 and stats["por_puesto"]["Cajeros"] == 1
+    assert store.stats(puesto_id=999)["total"] == 0
+    assert store.stats(start_date="2000-01-01", end_date="2999-12-31")["total"] == 101
+
+    print("\n--- Testing Paginación keyset + proyección ---")
+    seen, after = [], None
+    while True:
+        page = store.list_rows(limit=30, after=after, fields=["phone_number"])
+        seen += [r["id"] for r in page]
+        if len(page) < 30:
+            break
+        after = (page[-1]["id"], page[-1]["id"])
+    print(f"Páginas cubren {len(seen)} filas sin repetir (Expected 101)")
+    assert len(seen) == len(set(seen)) == 101 and seen == sorted(seen, reverse=True)
+    assert set(page[0]) == {"id", "phone_number"}
+    by_date = store.list_rows(limit=5, order_by="created_at", es_apto=False)
+    nxt = store.list_rows(limit=5, order_by="created_at", es_apto=False,
+                          after=(by_date[-1]["created_at"], by_date[-1]["id"]))
+    assert not {r["id"] for r in by_date} & {r["id"] for r in nxt}
+    plan = store._conn().execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM postulantes WHERE es_apto = ? AND id < ? ORDER BY id DESC LIMIT 5", (1, 50)
+    ).fetchall()
+    assert "idx_postulantes_es_apto" in str([tuple(r) for r in plan])
+    plan = store._conn().execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM postulantes WHERE phone_number = ? ORDER BY id DESC LIMIT 1", ("x",)
+    ).fetchall()
+    assert "idx_postulantes_phone" in str([tuple(r) for r in plan])
+
+    print("\n--- Testing Idempotencia (UNIQUE idempotency_key + INSERT OR IGNORE) ---")
+    first = store.insert({"phone_number": "53001", "idempotency_key": "k1", "es_apto": True})
+    again = store.insert({"phone_number": "53001", "idempotency_key": "k1", "es_apto": True})
+    added = store.insert_many([{"phone_number": "53002", "idempotency_key": "k1"},
+                               {"phone_number": "53003", "idempotency_key": "k2"}])
+    print(f"Total: {len(store)}, nuevas en el lote: {added} (Expected 103, 1)")
+    assert again["id"] == first["id"] and added == 1 and len(store) == 103
+    store.close()
+    log.close()
+
+
+if __name__ == "__main__":
+    test_local_log()
+    test_sqlite_store()
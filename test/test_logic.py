@@ -1,7 +1,7 @@
 import sys
 import os
 sys.path.append(os.getcwd())
-from bot.ai_bot import AIBot
+from bot.ai_bot import AIBot, PUESTOS_KEYWORDS, _puesto_from_text
 
 def test_logic():
     bot = AIBot(db=None, gemini=None)
@@ -55,6 +55,22 @@ def test_logic():
     valid, out, msg = bot._validate_and_extract_soft("trabajo_hermes", "hace tiempo trabajé allí", {})
     print(f"Complex Phrase: {valid} (Expected False to trigger AI) - Msg: {msg}")
 
+    print("\n--- Testing Puesto Index ---")
+    # Case 1: Keyword histórica (seguridad -> Bancos)
+    valid, out, msg = bot._validate_and_extract_soft("puesto", "seguridad", {})
+    print(f"'seguridad': {valid} (Expected True) - Val: {out.get('puesto_id')}")
+    assert valid and out.get("puesto_id") == 3
+
+    # Case 2: Typo (fuzzy)
+    valid, out, msg = bot._validate_and_extract_soft("puesto", "quiero ser cajro", {})
+    print(f"'cajro': {valid} (Expected True) - Val: {out.get('puesto_id')}")
+    assert valid and out.get("puesto_id") == 6
+
+    # Case 3: Ambiguo -> desambiguación con opciones numeradas
+    valid, out, msg = bot._validate_and_extract_soft("puesto", "tecnico", {})
+    print(f"'tecnico': {valid} (Expected False) - Opciones: {out.get('puesto_opciones')}")
+    assert not valid and out.get("puesto_opciones") == [14, 16]
+
     print("\n--- Testing Aptitude Logic ---")
     # Helper to test aptitude
     def check_apto(puesto_id, origen, expected_apto):
@@ -82,5 +98,39 @@ def test_logic():
     check_apto(4, "lima", False)
     check_apto(4, "provincia", True)
 
+
+# Entradas que la versión por keywords resolvía a un único puesto: el índice debe dar lo mismo
+BASELINE_PUESTOS = {
+    "supervisor mineria": 13, "supervisor de minería": 13, "quiero ser supervisor en mineria": 13,
+    "agente de seguridad": 3, "seguridad": 3, "conductor": 8, "chofer de camion": 8,
+    "motorizado": 9, "cajero": 6, "cajera": 6, "digitador": 17, "limpieza": 10, "operario de limpieza": 10,
+    "coordinador": 7, "minería arequipa": 12, "mineria": 12, "otros": 18, "quiero otro puesto": 18,
+}
+# Cambios deliberados del índice: el nombre oficial (o el término más específico) gana a la keyword genérica
+IMPROVED_PUESTOS = {
+    "encargado de caja": 7,               # antes 5: "carga" contenido en "encargado"
+    "seguridad provincia": 4,             # antes 3: la regla seguridad+provincia nunca se alcanzaba
+    "Agentes de Seguridad Chorrillos": 1,
+    "Agentes de Seguridad - Minería": 12,
+}
+
+
+def test_puesto_regression():
+    print("\n--- Testing Puestos: regresión contra la resolución por keywords ---")
+    cases = dict(BASELINE_PUESTOS)
+    cases.update({k: pid for k, pid in PUESTOS_KEYWORDS.items() if k != "encargado"})
+    cases.update(IMPROVED_PUESTOS)
+    wrong = {t: (_puesto_from_text(t) or {}).get("puesto_id") for t in cases}
+    wrong = {t: (got, cases[t]) for t, got in wrong.items() if got != cases[t]}
+    print(f"Distintos: {wrong} (Expected {{}})")
+    assert not wrong
+
+    bot = AIBot(db=None, gemini=None)
+    valid, out, msg = bot._validate_and_extract_soft("puesto", "agente", {})
+    print(f"'agente': opciones {out.get('puesto_opciones')} (Expected [1, 2, 3, 4, 12])")
+    assert not valid and out.get("puesto_opciones") == [1, 2, 3, 4, 12]
+
+
 if __name__ == "__main__":
     test_logic()
+    test_puesto_regression()
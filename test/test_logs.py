@@ -0,0 +1,70 @@
+import sys
+import os
+import io
+import json
+import time
+import logging
+sys.path.append(os.getcwd())
+from services.logs import redact, JsonFormatter, DebugSampler, _NonBlockingQueueHandler, LOG_DROPPED
+from logging.handlers import QueueListener
+import queue
+
+
+def _record(msg, *args, level=logging.INFO, name="bot.ai_bot", **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_logs():
+    print("\n--- Testing Logging estructurado ---")
+    # Redacción de PII
+    text = redact("Chat 51987654321@c.us, cel 987 654 321, DNI 45678912, correo ana.perez@gmail.com")
+    print(f"Redactado: {text}")
+    assert "51987654321" not in text and "***321@c.us" in text
+    assert "987 654" not in text and "***321," in text
+    assert "45678912" not in text and "********" in text
+    assert "ana.perez" not in text and "a***@gmail.com" in text
+    assert redact("Edad: 30, turno 2") == "Edad: 30, turno 2"
+
+    # Formato JSON: campos fijos + extra, redactado
+    line = JsonFormatter().format(_record("Mensaje de %s", "51911111111@c.us", chat_id="51911111111@c.us", event="turn"))
+    entry = json.loads(line)
+    print(f"JSON: {entry}")
+    assert entry["level"] == "INFO" and entry["logger"] == "bot.ai_bot" and entry["event"] == "turn"
+    assert entry["chat_id"] == "***111@c.us" and "51911111111" not in line
+
+    # Muestreo de DEBUG: 1 de cada N por plantilla; INFO siempre pasa
+    sampler = DebugSampler(every=10)
+    kept = sum(sampler.filter(_record("Respuesta IA para %s", i, level=logging.DEBUG)) for i in range(100))
+    print(f"DEBUG conservados: {kept}/100 (Expected 10)")
+    assert kept == 10
+    assert all(sampler.filter(_record("Guardado %s", i)) for i in range(20))
+
+    # Handler en cola: el hilo del request solo encola; el listener escribe
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    handler = _NonBlockingQueueHandler(queue.Queue(100))
+    listener = QueueListener(handler.queue, output)
+    listener.start()
+    for i in range(50):
+        handler.handle(_record("turno %s", i))
+    listener.stop()
+    lines = stream.getvalue().splitlines()
+    print(f"Líneas escritas por el listener: {len(lines)} (Expected 50)")
+    assert len(lines) == 50 and json.loads(lines[-1])["msg"] == "turno 49"
+
+    # Cola llena: se descarta y se cuenta, sin bloquear
+    full = _NonBlockingQueueHandler(queue.Queue(1))
+    dropped = LOG_DROPPED.value()
+    t0 = time.perf_counter()
+    for i in range(100):
+        full.handle(_record("turno %s", i))
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    print(f"Descartadas: {LOG_DROPPED.value() - dropped:.0f} en {elapsed_ms:.1f} ms (Expected 99)")
+    assert LOG_DROPPED.value() - dropped == 99
+
+
+if __name__ == "__main__":
+    test_logs()
@@ -0,0 +1,63 @@
+import sys
+import os
+import timeit
+sys.path.append(os.getcwd())
+from services.metrics import (Registry, REGISTRY, BOT_PROCESS_SECONDS, EXTRACTIONS, RETRIES,
+                              FALLBACKS, DB_SECONDS, timed)
+from bot.ai_bot import AIBot
+from bot.gemini_client import GeminiClient
+
+
+def test_metrics():
+    print("\n--- Testing Métricas estilo Prometheus ---")
+    reg = Registry()
+    hist = reg.histogram("demo_seconds", "Demo", ("op",), buckets=(0.1, 1.0))
+    hist.observe(0.05, "a")
+    hist.observe(0.5, "a")
+    hist.observe(3, "a")
+    counter = reg.counter("demo_total", "Demo", ("kind",))
+    counter.inc("x")
+    counter.inc("x", amount=2)
+    gauge = reg.gauge("demo_depth", "Demo", ("queue",))
+    gauge.set_function(lambda: {("outbox",): 4, ("apagada",): None})
+    text = reg.render()
+    print(text)
+    assert 'demo_seconds_bucket{op="a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{op="a",le="1"} 2' in text
+    assert 'demo_seconds_bucket{op="a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{op="a"} 3' in text and 'demo_seconds_sum{op="a"} 3.55' in text
+    assert 'demo_total{kind="x"} 3' in text
+    assert 'demo_depth{queue="outbox"} 4' in text and "apagada" not in text
+    assert "# TYPE demo_seconds histogram" in text
+
+    # El bot cuenta quién resolvió cada respuesta y la latencia por pregunta
+    bot = AIBot(db=False, gemini=GeminiClient(), intent=False)
+    chat_id = "51933333333@c.us"
+    det, retries, fallbacks = EXTRACTIONS.value("deterministic"), RETRIES.value("edad"), FALLBACKS.value("deterministic")
+    timed_nombre = BOT_PROCESS_SECONDS.count("nombre")
+    for text in ("empezar", "Sí, acepto", "Ana", "Pérez", "no sé"):
+        bot.process(chat_id, text)
+    print(f"Extracciones deterministas: +{EXTRACTIONS.value('deterministic') - det:.0f} (Expected +3)")
+    print(f"Re-preguntas en edad: +{RETRIES.value('edad') - retries:.0f} (Expected +1)")
+    assert EXTRACTIONS.value("deterministic") - det == 3
+    assert RETRIES.value("edad") - retries == 1
+    assert FALLBACKS.value("deterministic") - fallbacks == 1  # sin API key: fallback determinista
+    assert BOT_PROCESS_SECONDS.count("nombre") == timed_nombre + 1
+    assert 'bot_process_duration_seconds_count{question_key="edad"}' in REGISTRY.render()
+
+    # Operaciones de BD con el decorador
+    @timed(DB_SECONDS, "demo_op")
+    def op():
+        return 1
+    op()
+    assert DB_SECONDS.count("demo_op") == 1
+
+    # Overhead en el camino caliente
+    n = 20000
+    per_call_us = min(timeit.repeat(lambda: hist.observe(0.003, "a"), number=n, repeat=3)) / n * 1e6
+    print(f"Histogram.observe: {per_call_us:.2f} µs (Expected < 5)")
+    assert per_call_us < 5
+
+
+if __name__ == "__main__":
+    test_metrics()
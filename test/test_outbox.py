@@ -0,0 +1,65 @@
+import sys
+import os
+import tempfile
+sys.path.append(os.getcwd())
+from services.outbox import Outbox
+
+
+def test_outbox():
+    remote = {}
+    state = {"down": True}
+    calls = []
+
+    def push(payloads):
+        calls.append(len(payloads))
+        if state["down"]:
+            raise ConnectionError("supabase caído")
+        for p in payloads:
+            if p.get("bad"):
+                raise ValueError("fila inválida")
+            remote.setdefault(p["idempotency_key"], p)  # upsert on_conflict ignore
+
+    box = Outbox(push, path=os.path.join(tempfile.mkdtemp(), "outbox.db"), start=False)
+
+    print("\n--- Testing Outbox: encolar (idempotente) ---")
+    box.add([{"idempotency_key": "a", "phone_number": "51001"}, {"idempotency_key": "b", "phone_number": "51002"}])
+    box.add([{"idempotency_key": "a", "phone_number": "51001"}])  # reintento de la misma postulación
+    print(f"Backlog: {len(box)} (Expected 2)")
+    assert len(box) == 2
+
+    print("\n--- Testing Outbox: Supabase caído → backoff ---")
+    assert box.replay(force=True) == 0
+    stats = box.stats()
+    print(f"Stats: {stats}")
+    assert stats["backlog"] == 2 and stats["max_attempts"] == 1 and stats["last_error"]
+    print(f"Pushes con la conexión caída: {calls} (Expected [2], sin reintento fila por fila)")
+    assert calls == [2]
+    assert box.replay() == 0  # aún no vence el backoff
+
+    print("\n--- Testing Outbox: recuperación, fila mala no bloquea ---")
+    state["down"] = False
+    box.add([{"idempotency_key": "c", "bad": True}])
+    delivered = box.replay(force=True)
+    print(f"Entregadas: {delivered}, remoto={sorted(remote)} (Expected 2, ['a', 'b'])")
+    assert delivered == 2 and sorted(remote) == ["a", "b"]
+    assert [p["idempotency_key"] for p in box.pending()] == ["c"]
+
+    print("\n--- Testing Outbox: la conexión se cae a mitad del reintento fila por fila ---")
+    box.add([{"idempotency_key": "d", "bad": True}, {"idempotency_key": "e"}, {"idempotency_key": "f"}])
+    real_push = box.push
+
+    def flaky(payloads):
+        try:
+            real_push(payloads)
+        finally:
+            if len(payloads) == 1:
+                state["down"] = True  # tras el primer reintento individual la red deja de responder
+    box.push = flaky
+    del calls[:]
+    assert box.replay(force=True) == 0
+    print(f"Pushes: {calls} (Expected [4, 1, 1], corta tras el primer error de conexión)")
+    assert calls == [4, 1, 1] and len(box) == 4
+
+
+if __name__ == "__main__":
+    test_outbox()
@@ -0,0 +1,72 @@
+import sys
+import os
+import threading
+import time
+sys.path.append(os.getcwd())
+from services.phone_cache import PhoneCache, MISSING
+
+
+class FakeDB:
+    """Cuenta las lecturas que llegan a la BD a través de Database.get_postulante."""
+
+    def __init__(self):
+        from database import Database
+        self.db = Database.__new__(Database)
+        self.db.phones = PhoneCache(max_entries=3)
+        self.db.use_supabase = False
+        self.db.client = None
+        self.db.version, self.db._version_lock = 0, threading.Lock()
+        self.reads = 0
+        rows = {"51911111111": {"id": 1, "phone_number": "51911111111", "es_apto": True}}
+
+        class Local:
+            def get_latest(_, phone):
+                self.reads += 1
+                return rows.get(phone)
+
+        self.db.local = Local()
+        self.db._ensure_local_ready = lambda: None
+
+
+def test_phone_cache():
+    print("\n--- Testing Caché teléfono → postulación ---")
+    fake = FakeDB()
+    db = fake.db
+
+    first = db.get_postulante("51911111111@c.us")
+    again = db.get_postulante("51911111111@lid")
+    nobody = db.get_postulante("51922222222@c.us")
+    db.get_postulante("51922222222@c.us")
+    print(f"Lecturas a la BD: {fake.reads} (Expected 2)")
+    assert fake.reads == 2 and first == again and first["id"] == 1 and nobody is None
+
+    again["es_apto"] = False  # las copias no contaminan la caché
+    assert db.get_postulante("51911111111")["es_apto"] is True
+
+    db.remember_postulante({"phone_number": "51922222222", "es_apto": False})
+    print(f"Tras guardar: {db.peek_postulante('51922222222@c.us')} (Expected fila nueva)")
+    assert db.peek_postulante("51922222222@c.us")["es_apto"] is False and fake.reads == 2
+
+    gen = db.phones.generation
+    db.phones.invalidate()  # update_es_apto
+    db.phones.put("51933333333", {"id": 9}, gen)  # lectura iniciada antes de invalidar: se descarta
+    assert db.peek_postulante("51911111111") is MISSING and db.peek_postulante("51933333333") is MISSING
+
+    for phone in ("a", "b", "c", "d"):
+        db.phones.put(phone, None)
+    print(f"Entradas (LRU de 3): {len(db.phones)} (Expected 3)")
+    assert len(db.phones) == 3 and db.phones.get("a") is MISSING
+
+    cache = PhoneCache()
+    for i in range(5000):
+        cache.put(f"519{i:08d}", {"id": i, "phone_number": f"519{i:08d}"})
+    t0 = time.perf_counter()
+    for i in range(5000):
+        cache.get(f"519{i:08d}")
+    per_lookup_us = (time.perf_counter() - t0) / 5000 * 1e6
+    print(f"Lookup: {per_lookup_us:.1f} µs (Expected < 1000)")
+    assert per_lookup_us < 1000
+
+
+if __name__ == "__main__":
+    test_phone_cache()
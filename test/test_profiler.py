@@ -0,0 +1,74 @@
+import sys
+import os
+import time
+import tempfile
+sys.path.append(os.getcwd())
+from services.profiler import Profiler, tag
+
+
+def _cpu_hot_spot(seconds):
+    # Trabajo de CPU puro: debe aparecer como función más muestreada
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += sum(i * i for i in range(200))
+    return n
+
+
+def _turn(profiler, seconds, chat_id="51966666666@c.us", question_key="edad"):
+    with profiler.turn():
+        tag(chat_id=chat_id, question_key=question_key)
+        _cpu_hot_spot(seconds)
+
+
+def test_profiler():
+    print("\n--- Testing Profiler de turnos lentos ---")
+    directory = tempfile.mkdtemp()
+    profiler = Profiler(enabled=True, slow_ms=80, sample_n=0, interval_ms=1, directory=directory, keep=2)
+    _turn(profiler, 0.005)          # rápido: no se guarda
+    _turn(profiler, 0.15)           # lento: se guarda
+    profiler.flush()
+    slowest = profiler.slowest()
+    print(f"Perfiles: {[(p['ms'], p['reason'], p['question_key']) for p in slowest]} (Expected 1 lento, edad)")
+    assert len(slowest) == 1
+    entry = slowest[0]
+    assert entry["ms"] >= 80 and entry["reason"] == "slow" and entry["question_key"] == "edad"
+    assert entry["samples"] >= 5 and entry["chat"].startswith("chat-")
+    print(f"Top: {entry['top'][:2]}")
+    assert any("_cpu_hot_spot" in t["function"] or "<genexpr>" in t["function"] for t in entry["top"][:2])
+
+    folded = profiler.read(entry["id"])
+    first = folded.splitlines()[0]
+    print(f"Pila colapsada: {first[:120]}…")
+    assert first.startswith("_turn (test_profiler.py") and first.rsplit(" ", 1)[1].isdigit()
+    assert "51966666666" not in folded and "51966666666" not in entry["id"]
+    assert profiler.read("../index.jsonl") is None
+
+    # 1 de cada N: también turnos rápidos; solo se conservan los `keep` más recientes
+    sampled = Profiler(enabled=True, slow_ms=10_000, sample_n=2, interval_ms=1, directory=directory, keep=2)
+    for _ in range(6):
+        _turn(sampled, 0.01, question_key="nombre")
+    sampled.flush()
+    kept = sampled.slowest()
+    print(f"Muestreados conservados: {len(kept)} (Expected 2)")
+    assert len(kept) == 2 and all(p["reason"] == "sampled" for p in kept)
+    # La retención cuenta el directorio: el perfil del primer profiler también se borra
+    folded = sorted(f for f in os.listdir(directory) if f.endswith(".folded"))
+    print(f"Archivos .folded en disco: {len(folded)} (Expected 2)")
+    assert folded == sorted(p["id"] + ".folded" for p in kept) and profiler.read(entry["id"]) is None
+    with open(os.path.join(directory, "index.jsonl"), encoding="utf-8") as f:
+        assert len(f.readlines()) <= 4  # rotado al pasar de 2 × keep
+
+    # Reinicio: /profiles sigue listando lo guardado
+    restarted = Profiler(enabled=True, directory=directory, keep=2)
+    assert {p["id"] for p in restarted.slowest()} == {p["id"] for p in kept}
+
+    # Apagado (por defecto): sin hilo ni costo
+    off = Profiler(enabled=False, directory=tempfile.mkdtemp())
+    with off.turn():
+        tag(question_key="x")
+    assert off._thread is None and off.slowest() == []
+
+
+if __name__ == "__main__":
+    test_profiler()
@@ -0,0 +1,71 @@
+import sys
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+sys.path.append(os.getcwd())
+from bot.ai_bot import AIBot, COOLDOWN_HOURS, REHYDRATE_WAIT_MS
+from services.phone_cache import PhoneCache
+
+
+class SlowDB:
+    """get_postulante bloquea hasta que el test lo libera (simula la BD con caché fría)."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.phones = PhoneCache()
+        self.gate = threading.Event()
+
+    def peek_postulante(self, chat_id):
+        return self.phones.get(chat_id.replace("@c.us", ""))
+
+    def get_postulante(self, chat_id):
+        self.gate.wait(5)
+        phone = chat_id.replace("@c.us", "")
+        row = self.rows.get(phone)
+        self.phones.put(phone, row)
+        return row
+
+
+def test_rehydration():
+    print("\n--- Testing Rehidratación de sesiones ---")
+    hace_2h = (datetime.now() - timedelta(hours=2)).isoformat()
+    hace_mucho = (datetime.now() - timedelta(hours=COOLDOWN_HOURS + 1)).isoformat()
+    db = SlowDB({
+        "51911111111": {"es_apto": True, "confirmacion_asistencia": True,
+                        "fecha_entrevista": "2030-01-10T08:30:00", "fecha_postulacion": hace_2h},
+        "51922222222": {"es_apto": False, "fecha_postulacion": hace_mucho},
+    })
+    bot = AIBot(db=db, gemini=False, intent=False)
+
+    # Caché fría y BD lenta: el primer mensaje no espera a la consulta (REHYDRATE_WAIT_MS=0)
+    t0 = time.perf_counter()
+    resp = bot.process("51911111111@c.us", "hola")
+    waited = time.perf_counter() - t0
+    print(f"Primer mensaje en {waited * 1000:.0f} ms (Expected < 100, sin esperar a la BD)")
+    assert REHYDRATE_WAIT_MS == 0 and waited < 0.1 and "Hola" in resp and bot.sessions["51911111111@c.us"]["rehydrate_pending"]
+
+    db.gate.set()
+    for _ in range(100):
+        if db.peek_postulante("51911111111") is not None and not bot._lookups:
+            break
+        time.sleep(0.01)
+    resp = bot.process("51911111111@c.us", "empezar")
+    s = bot.sessions["51911111111@c.us"]
+    print(f"Tras la consulta: completed={s['completed']} (Expected True)")
+    assert s["completed"] and s["is_apto"] and "Ya completaste" in resp
+    assert "10/01 a las 08:30" in bot.process("51911111111@c.us", "estado")
+
+    # Caché caliente: sesión expulsada de memoria, se rehidrata en el mismo mensaje
+    bot.sessions.clear()
+    resp = bot.process("51911111111@c.us", "empezar")
+    print(f"Tras reinicio: {resp!r} (Expected cooldown)")
+    assert "Ya completaste" in resp
+
+    # Fuera del cooldown: flujo nuevo normal
+    resp = bot.process("51922222222@c.us", "empezar")
+    assert not bot.sessions["51922222222@c.us"]["completed"] and bot.sessions["51922222222@c.us"]["step"] == 1
+
+
+if __name__ == "__main__":
+    test_rehydration()
@@ -0,0 +1,94 @@
+import sys
+import os
+import tempfile
+sys.path.append(os.getcwd())
+from services.sqlite_store import SQLiteStore
+from services.rescoring import rescore, load_rules
+from bot.ai_bot import AIBot
+
+
+class StoreDB:
+    """Adaptador mínimo: lo que rescore usa de Database, sobre un SQLiteStore."""
+    def __init__(self, store):
+        self.store = store
+
+    def list_postulantes(self, limit, cursor=None, fields=None):
+        after = (int(cursor), int(cursor)) if cursor else None
+        rows = self.store.list_rows(limit=limit, after=after, fields=fields)
+        return rows, (str(rows[-1]["id"]) if len(rows) == limit else None)
+
+    def update_es_apto(self, ids, value):
+        return self.store.update_many(ids, {"es_apto": value})
+
+
+PUESTOS = [(1, "Agentes de Seguridad Chorrillos"), (4, "Agentes de Seguridad Provincia"), (8, "Conductores"),
+           (12, "Agentes de Seguridad - Minería Trujillo"), (6, "Cajeros")]
+# (sucursal, ciudad): coincide, sinónimo, "Otros", distinta (en vivo la decide Gemini), sin datos
+MINERIA = [("Trujillo", "Trujillo"), ("Trujillo", "La Libertad"), ("Otros", "Cusco"), ("Arequipa", "Iquitos"), (None, None)]
+
+
+def _row(i):
+    puesto_id, puesto_name = PUESTOS[i % len(PUESTOS)]
+    ce = i % 10 == 0
+    sucursal, ciudad = MINERIA[(i // len(PUESTOS)) % len(MINERIA)] if puesto_id == 12 else (None, None)
+    return {
+        "phone_number": f"51{i:04d}", "edad": 20 + i % 40, "origen": "provincia" if i % 3 == 0 else "lima",
+        "secundaria_completa": i % 13 != 0, "tipo_documento": "ce" if ce else "dni", "tiene_dni": not ce,
+        "puesto_id": puesto_id, "puesto_name": puesto_name, "puesto_otros_detalle": sucursal,
+        "ciudad_residencia": ciudad, "tiene_licencia": i % 4 == 1, "disponibilidad_inmediata": i % 17 != 0,
+    }
+
+
+def _live(bot, row):
+    """Veredicto en vivo (AIBot._evaluate_aptitud) para una fila guardada."""
+    return bot._evaluate_aptitud({
+        "edad": row["edad"], "origen": row["origen"], "puesto_id": row["puesto_id"],
+        "puesto_otros_detalle": row["puesto_otros_detalle"], "ciudad_residencia": row["ciudad_residencia"],
+        "secundaria": row["secundaria_completa"], "tipo_documento": row["tipo_documento"],
+        "licencia": row["tiene_licencia"], "disponibilidad": row["disponibilidad_inmediata"],
+    })
+
+
+def test_rescoring():
+    store = SQLiteStore(path=os.path.join(tempfile.mkdtemp(), "p.db"))
+    db = StoreDB(store)
+    defaults = load_rules(path="")
+    rows = [_row(i) for i in range(2500)]
+    # es_apto inicial = veredicto en vivo del bot (sin Gemini: la sucursal distinta queda no apta)
+    bot = AIBot(db=False, gemini=False, intent=False)
+    reasons = {}
+    for i, r in enumerate(rows):
+        r["es_apto"], why = _live(bot, r)
+        reasons[r["phone_number"]] = why
+        if len(why) == 1 and why[0].startswith("Ubicación (") and i % 2:
+            r["es_apto"] = True  # en vivo Gemini confirmó que la ciudad está en la región de la sucursal
+    store.insert_many(rows)
+    assert 0 < sum(r["es_apto"] for r in rows) < len(rows)
+
+    print("\n--- Testing Re-evaluación: reglas por defecto = evaluación en vivo ---")
+    same = rescore(db, defaults, page_size=700)
+    print(f"Cambios: {same['cambian_a_apto']}/{same['cambian_a_no_apto']} (Expected 0/0)")
+    assert same["revisados"] == 2500 and same["cambian_a_apto"] == same["cambian_a_no_apto"] == 0
+    assert same["incumplen_por_regla"]["documento"] == sum(1 for r in rows if r["tipo_documento"] == "ce")
+    assert same["incumplen_por_regla"]["ubicacion"] > 0 and same["incumplen_por_regla"]["mineria"] > 0
+
+    print("\n--- Testing Re-evaluación: acepta CE y edad máx 45 (dry-run + apply) ---")
+    rules = load_rules(path="", overrides={"acepta_ce": True, "edad_max": 45})
+    dry = rescore(db, rules, page_size=700)
+    only_ce = ["Carné de Extranjería no aceptado"]
+    to_apto = sum(1 for r in rows if reasons[r["phone_number"]] == only_ce and r["edad"] <= 45)
+    to_no_apto = sum(1 for r in rows if r["es_apto"] and r["edad"] > 45)
+    print(f"A apto: {dry['cambian_a_apto']} (Expected {to_apto}), a no apto: {dry['cambian_a_no_apto']} (Expected {to_no_apto})")
+    assert to_apto > 0 and dry["cambian_a_apto"] == to_apto and dry["cambian_a_no_apto"] == to_no_apto
+    assert store.stats()["aptos"] == sum(1 for r in rows if r["es_apto"])  # dry-run no escribe
+    applied = rescore(db, rules, apply=True, page_size=700)
+    assert applied["cambian_a_apto"] == to_apto and applied["cambian_a_no_apto"] == to_no_apto
+    again = rescore(db, rules)
+    assert again["cambian_a_apto"] == again["cambian_a_no_apto"] == 0
+    # Sucursal ≠ ciudad con todo lo demás en regla: decide la IA, se respeta lo guardado
+    assert again["requieren_ia"] > 0 and dry["requieren_ia"] == again["requieren_ia"]
+    assert store.stats()["aptos"] == sum(1 for r in rows if r["es_apto"]) + to_apto - to_no_apto
+
+
+if __name__ == "__main__":
+    test_rescoring()
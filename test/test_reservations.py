@@ -0,0 +1,81 @@
+import sys
+import os
+import tempfile
+import threading
+sys.path.append(os.getcwd())
+from services.reservations import InMemoryReservations, SQLiteReservations
+from services.local_log import AppendLog
+from bot.agenda import CapacityCalendar
+from bot.ai_bot import AIBot
+
+
+def _race(res, day, chats):
+    """Cada chat intenta retener y confirmar el mismo día al mismo tiempo."""
+    barrier = threading.Barrier(chats)
+    ok = []
+
+    def chat(n):
+        barrier.wait()
+        if res.hold(day, f"chat{n}") and res.confirm(day, f"chat{n}"):
+            ok.append(n)
+    threads = [threading.Thread(target=chat, args=(n,)) for n in range(chats)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return ok
+
+
+def test_reservations_cap():
+    tmp = tempfile.mkdtemp()
+    for res in (InMemoryReservations(capacity=5), SQLiteReservations(os.path.join(tmp, "r.db"), capacity=5)):
+        print(f"\n--- Testing {type(res).__name__}: 40 chats por 5 cupos ---")
+        ok = _race(res, "2026-10-20", 40)
+        print(f"Confirmados: {len(ok)} / {res.confirmed('2026-10-20')} (Expected 5)")
+        assert len(ok) == 5 and res.confirmed("2026-10-20") == 5
+
+        # Hold vencido: su cupo vuelve a estar disponible
+        assert res.hold("2026-10-21", "a", ttl_s=-1)
+        assert res.hold("2026-10-21", "b")
+        res.release("b")
+        assert res.confirm("2026-10-21", "a")  # sin hold vigente pero con aforo libre
+
+
+def test_in_memory_baseline():
+    print("\n--- Testing InMemoryReservations parte de los confirmados guardados ---")
+    log = AppendLog(path=os.path.join(tempfile.mkdtemp(), "postulantes.jsonl"), legacy_path=None)
+    for n in range(2):
+        log.insert({"phone_number": f"5100{n}", "confirmacion_asistencia": True,
+                    "fecha_entrevista": "2026-10-20T08:30:00"})
+    res = InMemoryReservations(capacity=3, baseline=log.count_confirmed_for_date)
+    assert res.hold("2026-10-20", "a")
+    blocked = not res.hold("2026-10-20", "b")
+    print(f"Segundo hold rechazado (2 confirmados + 1 hold = 3): {blocked} (Expected True)")
+    assert blocked and res.confirmed("2026-10-20") == 2
+    assert res.hold("2026-10-21", "b")  # otro día, sin confirmados previos
+    log.close()
+
+
+def test_bot_parallel_chats():
+    print("\n--- Testing AIBot: 60 chats en paralelo, aforo 10 ---")
+    bot = AIBot(db=False, gemini=False, intent=False)
+    bot.calendar = CapacityCalendar(None, capacity=10)
+    bot.reservations = InMemoryReservations(capacity=10)
+    proposed = []
+
+    def chat(n):
+        proposed.append(bot._get_next_valid_slot(f"c{n}")[0][:10])
+    threads = [threading.Thread(target=chat, args=(n,)) for n in range(60)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    per_day = {d: proposed.count(d) for d in set(proposed)}
+    print(f"Holds por día: {sorted(per_day.values())}")
+    assert len(proposed) == 60 and max(per_day.values()) <= 10
+
+
+if __name__ == "__main__":
+    test_reservations_cap()
+    test_in_memory_baseline()
+    test_bot_parallel_chats()
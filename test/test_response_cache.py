@@ -0,0 +1,50 @@
+import sys
+import os
+import time
+sys.path.append(os.getcwd())
+from services.response_cache import ResponseCache
+
+
+def test_response_cache():
+    state = {"version": 0, "calls": 0, "total": 10}
+
+    def compute():
+        state["calls"] += 1
+        return {"total_postulantes": state["total"]}
+
+    cache = ResponseCache(lambda: state["version"], ttl_s=60)
+
+    print("\n--- Testing Caché por versión ---")
+    first = cache.get("/postulantes/stats", compute)
+    again = cache.get("/postulantes/stats", compute)
+    print(f"Cálculos: {state['calls']} (Expected 1)")
+    assert state["calls"] == 1 and first["etag"] == again["etag"]
+
+    state["version"] += 1  # save_postulante
+    state["total"] = 11
+    changed = cache.get("/postulantes/stats", compute)
+    print(f"ETag nuevo tras escritura: {changed['etag'] != first['etag']} (Expected True)")
+    assert state["calls"] == 2 and changed["etag"] != first["etag"]
+    assert cache.get("/postulantes?limit=5", compute)["version"] == 1 and cache.stats()["entries"] == 2
+
+    print("\n--- Testing Last-Modified sigue al cuerpo, no a la BD ---")
+    time.sleep(0.01)
+    state["version"] += 1  # escritura que no cambia este resultado
+    same = cache.get("/postulantes/stats", compute)
+    print(f"Last-Modified conservado: {same['last_modified'] == changed['last_modified']} (Expected True)")
+    assert state["calls"] == 4 and same["etag"] == changed["etag"]
+    assert same["last_modified"] == changed["last_modified"] > first["last_modified"]
+
+    print("\n--- Testing Error de la BD no se cachea ---")
+    def failing():
+        raise ConnectionError("supabase caído")
+    try:
+        cache.get("/postulantes/51999", failing)
+        raise AssertionError("debía propagar el error")
+    except ConnectionError:
+        pass
+    assert cache.get("/postulantes/51999", compute)["body"] == changed["body"]
+
+
+if __name__ == "__main__":
+    test_response_cache()
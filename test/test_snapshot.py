@@ -0,0 +1,80 @@
+import sys
+import os
+import json
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+sys.path.append(os.getcwd())
+from services.snapshot import build_snapshot, snapshot_stats
+
+
+class FakeDB:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, n):
+        for _ in range(n):
+            i = len(self.rows) + 1
+            self.rows.append({
+                "id": i, "phone_number": f"51{i:04d}", "es_apto": i % 3 == 0,
+                "puesto_id": 8 if i % 2 else 1, "puesto_name": "Conductores" if i % 2 else "Cajeros",
+                "fecha_postulacion": f"2026-10-{10 + i % 5:02d}T09:00:00", "edad": "30",
+            })
+
+    def list_postulantes(self, limit, cursor=None, fields=None, **filters):
+        desc = self.rows[::-1]
+        start = int(cursor) if cursor else 0
+        page = desc[start:start + limit]
+        return page, (str(start + limit) if len(page) == limit else None)
+
+
+def test_snapshot():
+    out = tempfile.mkdtemp()
+    db = FakeDB()
+    db.add(30)
+
+    print("\n--- Testing Snapshot inicial ---")
+    first = build_snapshot(db, out_dir=out)
+    print(f"Filas: {first['rows']}, particiones: {len(first['parts'])} (Expected 30, 5)")
+    assert first["rows"] == 30 and len(first["parts"]) == 5
+    assert all(p.endswith(".parquet") and "fecha=2026-10-" in p for p in first["parts"])
+
+    print("\n--- Testing Parquet tipado (escaneo por columnas) ---")
+    schema = pq.read_schema(first["parts"][0])
+    print(f"Tipos: es_apto={schema.field('es_apto').type}, puesto_name={schema.field('puesto_name').type}")
+    assert schema.field("es_apto").type == pa.bool_() and schema.field("edad").type == pa.int32()
+    assert pa.types.is_dictionary(schema.field("puesto_name").type)
+    assert pa.types.is_timestamp(schema.field("fecha_postulacion").type)
+    column = pq.read_table(first["parts"][0], columns=["es_apto"])
+    assert column.column_names == ["es_apto"] and column.num_rows == 6
+    assert pq.read_table(first["parts"][0], columns=["edad"])["edad"].to_pylist() == [30] * 6
+
+    print("\n--- Testing Snapshot incremental ---")
+    db.add(6)
+    second = build_snapshot(db, out_dir=out)
+    print(f"Filas nuevas: {second['rows']} (Expected 6)")
+    assert second["rows"] == 6 and second["last_id"] == 36
+    assert build_snapshot(db, out_dir=out)["rows"] == 0
+
+    stats = snapshot_stats(out)
+    print(f"Stats: {stats}")
+    assert stats == {"total": 36, "aptos": 12, "por_puesto": {"Cajeros": 18, "Conductores": 18}}
+    assert snapshot_stats(out, start_date="2026-10-10", end_date="2026-10-10")["total"] == 7
+    assert snapshot_stats(out, puesto_id=8)["por_puesto"] == {"Conductores": 18}
+    assert build_snapshot(db, out_dir=out, full=True)["rows"] == 36 and snapshot_stats(out)["total"] == 36
+    assert snapshot_stats(tempfile.mkdtemp()) == {"total": 0, "aptos": 0, "por_puesto": {}}
+
+    print("\n--- Testing Snapshot de la versión anterior (.cols.gz) → reconstrucción ---")
+    old = tempfile.mkdtemp()
+    os.makedirs(os.path.join(old, "fecha=2026-10-10"))
+    open(os.path.join(old, "fecha=2026-10-10", "part-0000000030.cols.gz"), "wb").close()
+    with open(os.path.join(old, "_state.json"), "w", encoding="utf-8") as f:
+        json.dump({"last_id": 30, "format": "cols.gz"}, f)
+    rebuilt = build_snapshot(db, out_dir=old)
+    print(f"Filas: {rebuilt['rows']} (Expected 36)")
+    assert rebuilt["rows"] == 36 and not os.path.exists(os.path.join(old, "fecha=2026-10-10", "part-0000000030.cols.gz"))
+    assert snapshot_stats(old)["total"] == 36
+
+
+if __name__ == "__main__":
+    test_snapshot()
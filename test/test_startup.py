@@ -0,0 +1,43 @@
+import sys
+import os
+import json
+import subprocess
+sys.path.append(os.getcwd())
+
+# Presupuesto de arranque en frío: importar app.py (construye DB, bot y cliente WAHA)
+STARTUP_BUDGET_S = float(os.getenv("STARTUP_BUDGET_S", "1.5"))
+HEAVY_MODULES = ["google.generativeai", "supabase", "httpx"]
+
+_PROBE = (
+    "import json, sys, time\n"
+    "t0 = time.perf_counter()\n"
+    "import app\n"
+    "elapsed = time.perf_counter() - t0\n"
+    "print('STARTUP_PROBE ' + json.dumps({'seconds': elapsed, 'heavy': [m for m in %r if m in sys.modules],\n"
+    "                  'routes': sorted(r.rule for r in app.app.url_map.iter_rules())}), file=sys.stderr, flush=True)\n"
+) % (HEAVY_MODULES,)
+
+
+def test_startup():
+    print("\n--- Testing Arranque en frío de app.py ---")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, SUPABASE_URL="", SUPABASE_KEY="", GOOGLE_API_KEY="",
+               WAHA_URL="http://127.0.0.1:9", PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=root, env=env,
+                         capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    # Los logs van a stdout desde su propio hilo: la marca sale por stderr para no mezclarse
+    marked = [l.split("STARTUP_PROBE ", 1)[1] for l in out.stderr.splitlines() if "STARTUP_PROBE " in l]
+    assert marked, out.stderr
+    result = json.loads(marked[-1])
+    print(f"import app: {result['seconds']:.2f}s (Expected < {STARTUP_BUDGET_S}s)")
+    print(f"SDKs cargados al importar: {result['heavy']} (Expected [])")
+    assert result["heavy"] == []
+    assert "/ready" in result["routes"] and "/health" in result["routes"] and "/metrics" in result["routes"]
+    assert "/traces" in result["routes"] and "/traces/<trace_id>" in result["routes"]
+    assert "/profiles" in result["routes"] and "/profiles/<profile_id>" in result["routes"]
+    assert result["seconds"] < STARTUP_BUDGET_S
+
+
+if __name__ == "__main__":
+    test_startup()
@@ -0,0 +1,154 @@
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.getcwd())
+import database
+from services.outbox import Outbox
+
+
+class FakeSupabase:
+    """Cadena table().select()...execute() que falla mientras `down` sea True."""
+
+    def __init__(self):
+        self.down = True
+        self.upserts = []
+        self.rows = []    # lo que devuelve cualquier select
+        self.rpc_data = {}  # nombre de la RPC → data (por defecto True)
+        self.rpcs = []
+        self._rpc = None
+
+    def table(self, name):
+        return self
+
+    def select(self, *a):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def rpc(self, name, params):
+        if not self.down:
+            self.rpcs.append((name, params))
+        self._rpc = name
+        return self
+
+    def upsert(self, payloads, **kw):
+        self.upserts += payloads
+        return self
+
+    def execute(self):
+        rpc, self._rpc = self._rpc, None
+        if self.down:
+            raise ConnectionError("sin red")
+        data = self.rpc_data.get(rpc, True) if rpc else list(self.rows)
+        return type("Res", (), {"data": data})()
+
+
+def _wait(cond, timeout=3.0):
+    t0 = time.time()
+    while not cond() and time.time() - t0 < timeout:
+        time.sleep(0.02)
+    return cond()
+
+
+def test_supabase_health():
+    print("\n--- Testing Conexión perezosa a Supabase ---")
+    fake = FakeSupabase()
+    tmp = tempfile.mkdtemp()
+    patched = {
+        "SUPABASE_AVAILABLE": True,
+        "SUPABASE_SDK": True,
+        "SUPABASE_HEALTH_INTERVAL_S": 0.05,
+        "Outbox": lambda push: Outbox(push, path=os.path.join(tmp, "outbox.db"), start=False),
+    }
+    saved = {k: getattr(database, k) for k in patched}
+    create = database.Database._create_client
+
+    def slow_create():
+        time.sleep(0.3)  # handshake TLS / DNS lentos
+        return fake
+
+    try:
+        for k, v in patched.items():
+            setattr(database, k, v)
+        database.Database._create_client = staticmethod(slow_create)
+
+        t0 = time.perf_counter()
+        db = database.Database()
+        init_s = time.perf_counter() - t0
+        print(f"Database() en {init_s * 1000:.0f} ms (Expected < 100, sin red)")
+        assert init_s < 0.1 and db.supabase_state == "connecting"
+
+        # Escritura antes de la primera sonda: a la outbox, no al store local
+        version = db.version
+        assert db.save_postulante("51911111111@c.us", {"data": {"edad": 30}})
+        assert len(db.outbox) == 1
+        print(f"Versión tras encolar: {db.version} (Expected > {version}: invalida las respuestas cacheadas)")
+        assert db.version > version and db.get_postulante("51911111111")["edad"] == 30
+        version = db.version
+        assert db.save_postulantes_batch([db._build_payload("51922222222@c.us", {"data": {"edad": 40}})])
+        assert db.version > version and len(db.outbox) == 2
+
+        assert db.wait_ready(3) and _wait(lambda: db.supabase_state == "down")
+        print(f"Caído: backend={db.health()['backend']} (Expected local)")
+        assert not db.use_supabase
+
+        fake.down = False
+        assert _wait(lambda: db.use_supabase)
+        print(f"Recuperado: backend={db.health()['backend']} (Expected supabase)")
+        assert db.supabase_state == "up" and len(db.outbox) == 0 and len(fake.upserts) == 2
+
+        fake.down = True
+        assert _wait(lambda: not db.use_supabase)
+        db.close()
+    finally:
+        for k, v in saved.items():
+            setattr(database, k, v)
+        database.Database._create_client = create
+
+
+def test_reservations_failover():
+    print("\n--- Testing Aforo con Supabase caído ---")
+    fake = FakeSupabase()
+    fake.down = False
+    day = "2026-10-20"
+    fake.rpc_data["confirmed_counts_by_day"] = [{"day": day, "confirmed": 3}]  # 3 confirmados ya en Supabase
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())  # reservas locales en un data/postulantes.db nuevo
+    patched = {"SUPABASE_AVAILABLE": True, "SUPABASE_SDK": True, "SUPABASE_HEALTH_INTERVAL_S": 0.05,
+               "Outbox": lambda push: Outbox(push, path="outbox.db", start=False)}
+    saved = {k: getattr(database, k) for k in patched}
+    create = database.Database._create_client
+    try:
+        for k, v in patched.items():
+            setattr(database, k, v)
+        database.Database._create_client = staticmethod(lambda: fake)
+        db = database.Database()
+        res = db.make_reservations(4)
+        assert _wait(lambda: db.use_supabase)
+        assert db.get_confirmed_counts(day, day) == {day: 3}  # lo que ve el calendario al refrescar
+
+        fake.down = True
+        assert _wait(lambda: not db.use_supabase)
+        assert res.hold(day, "a") and res.confirm(day, "a")
+        full = not res.hold(day, "b")
+        print(f"Local parte de los 3 de Supabase: día lleno tras 1 confirmación = {full} (Expected True)")
+        assert full
+
+        fake.down = False
+        assert _wait(lambda: db.use_supabase)
+        replayed = [p["p_chat_id"] for name, p in fake.rpcs if name == "confirm_interview_slot"]
+        print(f"Confirmaciones reenviadas a Supabase: {replayed} (Expected ['a'])")
+        assert replayed == ["a"]
+        db.close()
+    finally:
+        for k, v in saved.items():
+            setattr(database, k, v)
+        database.Database._create_client = create
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_supabase_health()
+    test_reservations_failover()
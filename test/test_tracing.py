@@ -0,0 +1,108 @@
+import sys
+import os
+import json
+import tempfile
+import timeit
+sys.path.append(os.getcwd())
+from services.tracing import EXPORTER, trace, span, annotate, chat_ref, iter_file
+from services.write_behind import WriteBehindBuffer
+from services.outbox import Outbox
+from bot.ai_bot import AIBot
+from bot.gemini_client import GeminiClient
+
+
+class FakeModel:
+    def generate_content(self, prompt):
+        text = json.dumps({"is_valid": True, "extracted_data": {"genero": "F"}, "bot_response": None})
+        return type("Resp", (), {"text": text, "usage_metadata": None})()
+
+
+class FakeDB:
+    def __init__(self):
+        self.batches = []
+
+    def _build_payload(self, phone, s):
+        return {"phone_number": phone, "idempotency_key": f"k-{phone}"}
+
+    def save_postulantes_batch(self, payloads):
+        self.batches.append(list(payloads))
+        return True
+
+
+def _names(trace_id):
+    return [s["name"] for s in EXPORTER.get(trace_id)["spans"]]
+
+
+def test_tracing():
+    print("\n--- Testing Trazas por turno ---")
+    EXPORTER.clear()
+    client = GeminiClient()
+    client.model = FakeModel()
+    bot = AIBot(db=False, gemini=client, intent=False)
+    chat_id = "51944444444@c.us"
+    for text in ("empezar", "Sí, acepto", "Ana", "Pérez", "30"):
+        bot.process(chat_id, text)  # sin traza activa: spans no-op
+
+    with trace("webhook") as root:
+        annotate(chat=chat_ref(chat_id))
+        bot.process(chat_id, "pues la verdad soy dama jeje")  # va a Gemini
+        bot._get_next_valid_slot(chat_id)                      # agenda + hold del cupo
+    names = _names(root.trace_id)
+    print(f"Spans: {names}")
+    assert names[0] == "webhook"
+    for expected in ("bot.process", "gemini.generate", "gemini.attempt", "agenda.next_valid_slot", "agenda.hold_slot"):
+        assert expected in names
+    spans = {s["name"]: s for s in EXPORTER.get(root.trace_id)["spans"]}
+    assert spans["gemini.attempt"]["attrs"]["outcome"] == "ok"
+    assert spans["gemini.attempt"]["parent_id"] == spans["gemini.generate"]["span_id"]
+    assert spans["bot.process"]["parent_id"] == root.span_id
+
+    recent = EXPORTER.recent(chat=chat_ref(chat_id))
+    print(f"Desglose: {recent[0]['breakdown']}")
+    assert recent[0]["trace_id"] == root.trace_id and "bot.process" in recent[0]["breakdown"]
+    assert "51944444444" not in json.dumps(EXPORTER.get(root.trace_id))
+
+    # Webhook ignorado (sin spans hijos): no ocupa el buffer
+    with trace("webhook") as ignored:
+        pass
+    assert EXPORTER.get(ignored.trace_id) is None
+
+    print("\n--- Testing Contexto a través de colas (write-behind → outbox) ---")
+    tmp = tempfile.mkdtemp()
+    buf = WriteBehindBuffer(FakeDB(), journal_path=os.path.join(tmp, "wb.jsonl"), start=False)
+    box = Outbox(lambda payloads: None, path=os.path.join(tmp, "outbox.db"), start=False)
+    with trace("webhook") as root:
+        buf.enqueue("51955555555", {})
+        box.add([{"idempotency_key": "k-51955555555"}])
+    assert buf.flush() == 1 and box.replay(force=True) == 1  # hilos de fondo, después del turno
+    names = _names(root.trace_id)
+    print(f"Spans: {names}")
+    assert {"write_behind.enqueue", "write_behind.flush", "outbox.replay"} <= set(names)
+    flush = next(s for s in EXPORTER.get(root.trace_id)["spans"] if s["name"] == "write_behind.flush")
+    assert flush["attrs"]["rows"] == 1 and flush["attrs"]["queued_ms"] >= 0
+    buf.close()
+    box.close()
+
+    print("\n--- Testing Exportador a archivo ---")
+    path = os.path.join(tmp, "traces.jsonl")
+    EXPORTER.path = path
+    try:
+        with trace("webhook") as root:
+            with span("waha.post", path="/api/sendText"):
+                pass
+        EXPORTER.close()
+    finally:
+        EXPORTER.path = ""
+    lines = [s for s in iter_file(path) if s["trace_id"] == root.trace_id]
+    print(f"Spans en archivo: {[s['name'] for s in lines]} (Expected ['waha.post', 'webhook'])")
+    assert [s["name"] for s in lines] == ["waha.post", "webhook"]
+
+    # Overhead fuera de una traza (tests, hilos de fondo)
+    n = 20000
+    per_call_us = min(timeit.repeat(lambda: span("x").__enter__(), number=n, repeat=3)) / n * 1e6
+    print(f"span() sin traza: {per_call_us:.2f} µs (Expected < 2)")
+    assert per_call_us < 2
+
+
+if __name__ == "__main__":
+    test_tracing()
@@ -0,0 +1,111 @@
+import sys
+import os
+import json
+import tempfile
+import time
+sys.path.append(os.getcwd())
+from services.write_behind import WriteBehindBuffer
+from bot.ai_bot import AIBot
+
+
+class FakeDB:
+    def __init__(self):
+        self.batches = []
+        self.down = False
+
+    def _build_payload(self, phone, s):
+        return {"phone_number": phone, "n": s.get("n")}
+
+    def save_postulantes_batch(self, payloads):
+        if self.down:
+            raise ConnectionError("supabase caído")
+        self.batches.append(list(payloads))
+        return True
+
+
+def test_write_behind():
+    journal = os.path.join(tempfile.mkdtemp(), "wb.jsonl")
+
+    print("\n--- Testing Flush por tamaño ---")
+    db = FakeDB()
+    buf = WriteBehindBuffer(db, journal_path=journal, batch_size=10, interval_s=60)
+    for i in range(9):
+        assert buf.enqueue(f"51{i:03d}", {"n": i})
+    time.sleep(0.2)
+    print(f"Backlog bajo el umbral: {len(buf)} (Expected 9, sin flush)")
+    assert len(buf) == 9 and not db.batches
+    buf.enqueue("51009", {"n": 9})
+    deadline = time.time() + 5
+    while len(buf) and time.time() < deadline:
+        time.sleep(0.01)
+    print(f"Lotes: {[len(b) for b in db.batches]} (Expected [10])")
+    assert [len(b) for b in db.batches] == [10]
+
+    print("\n--- Testing Caída + reinicio desde journal ---")
+    db.down = True
+    for i in range(20, 25):
+        buf.enqueue(f"51{i:03d}", {"n": i})
+    assert buf.flush() == 0 and buf.stats()["failed_flushes"] == 1
+    buf._stop.set()  # simulamos un corte: no se vuelve a intentar
+    os.close(buf._fd)  # el proceso muere y suelta el lock del journal
+    db2 = FakeDB()
+    recovered = WriteBehindBuffer(db2, journal_path=journal, start=False)
+    print(f"Recuperadas: {len(recovered)} (Expected 5)")
+    assert len(recovered) == 5
+    assert recovered.flush() == 5 and [p["n"] for p in db2.batches[0]] == [20, 21, 22, 23, 24]
+    assert os.path.getsize(journal) == 0
+    stats = recovered.stats()
+    print(f"Stats: {stats}")
+    assert stats["backlog"] == 0 and stats["flushed_rows"] == 5
+    recovered.close()
+
+    print("\n--- Testing Dos workers con el mismo journal ---")
+    shared = os.path.join(tempfile.mkdtemp(), "wb.jsonl")
+    a = WriteBehindBuffer(FakeDB(), journal_path=shared, start=False)
+    b = WriteBehindBuffer(FakeDB(), journal_path=shared, start=False)
+    print(f"Journals: {os.path.basename(a.journal_path)}, {os.path.basename(b.journal_path)} (Expected distintos)")
+    assert a.journal_path == shared and b.journal_path != shared
+    b.enqueue("51030", {"n": 30})
+    a.enqueue("51031", {"n": 31})
+    assert a.flush() == 1 and os.path.getsize(shared) == 0  # truncar el suyo no toca el de b
+    b._stop.set()
+    os.close(b._fd)  # b muere con una postulación pendiente
+    db3 = FakeDB()
+    heir = WriteBehindBuffer(db3, journal_path=shared, start=False)  # a sigue vivo: heir no puede tomar wb.jsonl
+    print(f"Recuperadas del worker muerto: {len(heir)} (Expected 1)")
+    assert len(heir) == 1 and heir.journal_path != shared
+    assert heir.flush() == 1 and db3.batches[0][0]["n"] == 30
+    assert all(os.path.getsize(p) == 0 for p in (shared, heir.journal_path))
+    heir.close()
+    orphan = shared.replace(".jsonl", ".999999.jsonl")  # journal de un worker (otro pid) que ya no corre
+    with open(orphan, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"seq": 7, "payload": {"phone_number": "51050", "n": 50}}) + "\n")
+    db4 = FakeDB()
+    adopter = WriteBehindBuffer(db4, journal_path=shared, start=False)
+    print(f"Adoptadas de journals huérfanos: {len(adopter)} (Expected 1)")
+    assert len(adopter) == 1 and not os.path.exists(orphan)
+    assert adopter.flush() == 1 and db4.batches[0][0]["n"] == 50
+    adopter.close()
+    a.close()
+
+    print("\n--- Testing AIBot usa el buffer por defecto ---")
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())  # journal por defecto (data/write_behind.jsonl) fuera del repo
+    try:
+        db = FakeDB()
+        bot = AIBot(db=db, gemini=False, intent=False)
+        print(f"Writer: {type(bot.writer).__name__} (Expected WriteBehindBuffer)")
+        assert isinstance(bot.writer, WriteBehindBuffer) and len(bot.writer) == 0
+        enqueued = []
+        bot.writer.enqueue = lambda chat_id, s: enqueued.append(chat_id) or True
+        session = {"data": {"n": 1}, "completed": False}
+        bot._finalize_session("51040@c.us", session)
+        print(f"Encolados al cerrar la sesión: {enqueued} (Expected ['51040@c.us'])")
+        assert enqueued == ["51040@c.us"] and session["completed"] and not db.batches
+        bot.writer.close()
+    finally:
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    test_write_behind()